@@ -1,14 +1,25 @@
 import ast
+import json
 import pandas as pd
 
 
+def parse_record(line):
+    """
+    Parse a line written as JSON or as a Python dict repr.
+    """
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError:
+        return ast.literal_eval(line)
+
+
 # Enter file for human performance
 with open('data/human_agreement.txt', 'r', encoding='utf-8') as f:
-    human_data = [ast.literal_eval(line) for line in f if line.strip()]
+    human_data = [parse_record(line) for line in f if line.strip()]
 
 # Enter file for modelperformance
 with open('data/best_model_performance.txt', 'r', encoding='utf-8') as f:
-    model_data = [ast.literal_eval(line) for line in f if line.strip()]
+    model_data = [parse_record(line) for line in f if line.strip()]
 
 model_dict = {entry['prompt']: entry for entry in model_data}
 
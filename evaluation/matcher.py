@@ -0,0 +1,229 @@
+import re
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+
+
+def diacritics_table():
+    """Build a table that maps Latin letters with diacritics to their base letters."""
+    table = {}
+    for code in range(0xC0, 0x250):
+        char = chr(code)
+        # NFKD also decomposes the 'ĳ' ligature into 'ij'
+        base = "".join(c for c in unicodedata.normalize("NFKD", char) if not unicodedata.combining(c))
+        if base and base != char:
+            table[code] = base
+    return table
+
+
+DIACRITICS = diacritics_table()
+
+# the Latin-1 Supplement and Latin Extended-A/B blocks, the only letters in DIACRITICS
+LATIN = re.compile("[\u00c0-\u024f]")
+
+
+def accented_table():
+    """Build a table that maps base letters to the letters in DIACRITICS that normalise to them."""
+    table = {}
+    for code, base in DIACRITICS.items():
+        for letter in base:
+            table.setdefault(letter, set()).add(chr(code))
+    return {letter: frozenset(chars) for letter, chars in table.items()}
+
+
+# e.g. 'c' -> {'ç', 'ć', 'ĉ', 'ċ', 'č', ...} and 'i' -> {'ì', 'í', ..., 'ĳ'}
+ACCENTED = accented_table()
+
+# letters that normalise to a word boundary, e.g. 'ŀ' -> 'l·'
+SPLITTING = frozenset(chr(code) for code, base in DIACRITICS.items() if not base.isalnum())
+
+# plural and diminutive endings that may follow an answer, e.g. aanslag -> aanslagen, aanslagje
+SUFFIXES = ["en", "s", "'s", "es", "je", "jes", "tje", "tjes", "pje", "pjes", "kje", "kjes", "etje", "etjes"]
+
+VOWELS = "aeiouy"
+
+# the rest of the word that starts at a position
+WORD_TAIL = re.compile(r"\w*")
+
+
+def strip_diacritic(match):
+    """Replace a matched accented letter by its base letter."""
+    char = match.group()
+    return DIACRITICS.get(ord(char), char)
+
+
+@lru_cache(maxsize=None)
+def accented_letters(letters):
+    """
+    Return the letters that may change a match when normalised, once per answer and only when needed.
+
+    These are the letters that normalise to one of the letters of a match or
+    to a word boundary. A text without any of them normalises to itself
+    wherever the answer could occur, so it does not contain the answer after
+    normalisation unless it already does before. No pattern is compiled: the
+    character classes of accented letters take milliseconds per answer to compile.
+
+    Args:
+        letters (frozenset | str): The letters of the accepted forms of an answer (see
+                                   answer_forms), or of the first word only.
+
+    Returns:
+        frozenset: The letters, e.g. 'é' and 'ĳ' for 'ijs', but also 'ĳ' for 'bi'.
+    """
+    return SPLITTING.union(*(ACCENTED.get(char, ()) for char in letters))
+
+
+def normalise(text):
+    """
+    Normalise a text for matching: case-fold, strip diacritics and split the 'ĳ' ligature.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        str: The normalised text, e.g. 'Café IJsland' -> 'cafe ijsland'.
+    """
+    text = text.casefold()
+    if text.isascii():
+        return text
+    # a regex over the few accented letters is much faster than str.translate on long outputs
+    return LATIN.sub(strip_diacritic, text)
+
+
+@lru_cache(maxsize=None)
+def answer_forms(answer, stem=True):
+    """
+    Build the accepted forms of an answer in a normalised text, once per answer.
+
+    Args:
+        answer (str): The expected answer.
+        stem (bool): Also accept plural and diminutive forms of the answer,
+                     including a doubled final consonant (e.g. kat -> katten, katje).
+
+    Returns:
+        tuple: The first word of the normalised answer, which every match starts with;
+               the set of accepted words for a single-word answer, or None; for
+               other answers the pattern matching the answer on word boundaries, or None;
+               and the letters that may occur in a match, for accented_letters.
+    """
+    word = normalise(answer.strip())
+    suffixes = list(SUFFIXES) if stem else []
+    if stem and word and word[-1].isalpha() and word[-1] not in VOWELS:
+        suffixes += [word[-1] + "en", word[-1] + "etje", word[-1] + "etjes"]
+    letters = frozenset(word + "".join(suffixes))
+    if WORD_TAIL.fullmatch(word):
+        # "'s" is left out: the word before the apostrophe is accepted by itself
+        forms = frozenset([word] + [word + suffix for suffix in suffixes if suffix.isalpha()])
+        return word, forms, None, letters
+    ending = "(?:" + "|".join(re.escape(suffix) for suffix in sorted(suffixes, key=len, reverse=True)) + ")?" if suffixes else ""
+    # words may be separated by any whitespace or hyphen in the text
+    parts = re.split(r"[\s-]+", word)
+    body = r"[\s-]+".join(re.escape(part) for part in parts)
+    pattern = re.compile(r"(?<!\w)" + body + ending + r"(?!\w)")
+    return parts[0], None, pattern, letters
+
+
+def contains_answer(text, first, forms, pattern):
+    """
+    Check whether a normalised text contains an answer built by answer_forms.
+
+    Every occurrence of the first word that starts a word in the text is
+    checked: for a single-word answer, the word at that position has to be one
+    of the accepted forms; other answers are confirmed with their pattern. Only
+    the words at these few positions are looked at, not every word of the text.
+
+    Args:
+        text (str): The normalised text.
+        first (str): First word of the answer.
+        forms (frozenset): Accepted words of a single-word answer, or None.
+        pattern (re.Pattern): Pattern of another answer, or None.
+
+    Returns:
+        bool: Whether the answer occurs as a word.
+    """
+    i = text.find(first)
+    while i != -1:
+        if i == 0 or not (text[i - 1].isalnum() or text[i - 1] == "_"):
+            if forms is not None:
+                if text[i:WORD_TAIL.match(text, i).end()] in forms:
+                    return True
+            elif pattern.match(text, i) is not None:
+                return True
+        i = text.find(first, i + 1)
+    return False
+
+
+class Matcher:
+    """
+    Match expected answers on word boundaries in model outputs.
+
+    Unlike a substring check, 'ader' does not match 'aderlating' and 'aanslag'
+    does not match 'bomaanslag'. Case, diacritics and the 'ĳ' ligature are
+    ignored. The accepted forms of every answer are built once, and each
+    occurrence of the answer in an output is checked by looking up the word at
+    that position, so outputs without the answer, most of them, cost a single
+    substring search. Diacritics are only stripped from outputs that have
+    accented letters and no match without stripping.
+    """
+
+    def __init__(self, stem=True, first_line=False):
+        self.stem = stem
+        self.first_line = first_line
+
+    def name(self):
+        """Name of the matcher configuration, used as the version of cached scores."""
+        return "word-2" + ("-stem" if self.stem else "") + ("-first-line" if self.first_line else "")
+
+    def match(self, answer, result):
+        """
+        Check whether the answer occurs as a word in the model output.
+
+        Args:
+            answer (str): The expected answer.
+            result (str): The model output.
+
+        Returns:
+            bool: False if the answer is empty.
+        """
+        return bool(self.match_all([answer], [result])[0])
+
+    def match_all(self, answers, results):
+        """
+        Check every (answer, output) pair.
+
+        Stripping diacritics never removes a match, so a match in the
+        case-folded output is final. Otherwise the output is only normalised
+        if it has letters that normalise to a letter of the answer: of its
+        first word if that does not occur in the output at all, or else of
+        any accepted form.
+
+        Args:
+            answers (list[str]): Expected answers. Pass plain lists rather than
+                                 pandas Series, whose iteration is slower than the matching.
+            results (list[str]): Model outputs, in the same order.
+
+        Returns:
+            np.ndarray: Boolean array with one value per pair.
+        """
+        found = np.zeros(len(answers), dtype=bool)
+        stem = self.stem
+        first_line = self.first_line
+        for i, (answer, result) in enumerate(zip(answers, results)):
+            if not answer or answer.isspace():
+                continue
+            first, forms, pattern, letters = answer_forms(answer, stem)
+            if first_line:
+                result = next((line for line in result.splitlines() if line.strip()), "")
+            # lower() is the same for ASCII, and faster
+            ascii = result.isascii()
+            text = result.lower() if ascii else result.casefold()
+            if first in text:
+                if contains_answer(text, first, forms, pattern):
+                    found[i] = True
+                    continue
+            else:
+                letters = first
+            if not ascii and not accented_letters(letters).isdisjoint(LATIN.findall(text)):
+                found[i] = contains_answer(LATIN.sub(strip_diacritic, text), first, forms, pattern)
+        return found
@@ -1,18 +1,35 @@
 import ast
+import json
 from collections import defaultdict
 
+def parse_record(line):
+    """
+    Parse a line written as JSON or as a Python dict repr.
+
+    Args:
+        line (str): A line from a results file.
+
+    Returns:
+        dict: The parsed record.
+    """
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError:
+        return ast.literal_eval(line.strip())
+
+
 def load_data(file):
     """
     Read each line from a file as a Python dict.
 
     Args:
-        file (str): Path to the file containing one dict per line.
+        file (str): Path to the file containing one dict per line (JSON or Python repr).
 
     Returns:
         List[dict]: A list of dictionaries parsed from each line.
     """
     with open(file, 'r', encoding='utf-8') as f:
-        return [ast.literal_eval(line.strip()) for line in f]
+        return [parse_record(line) for line in f]
 
 
 def compare_with_expected(data):
@@ -30,7 +47,7 @@ def compare_with_expected(data):
     """
     correct_indices = set()
     for i, entry in enumerate(data):
-        predicted = entry.get('result').lower()
+        predicted = (entry.get('result') or '').lower()
         expected = entry.get('answer', '').lower()
         if expected and expected in predicted:
             correct_indices.add(i)
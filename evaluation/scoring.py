@@ -0,0 +1,315 @@
+import argparse
+import ast
+import base64
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from matcher import Matcher
+
+
+# the defaults are relative to this script, so it can be run from any directory
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# result files of the permutation grid (also from the sweep) and of the shot grid
+RESULT_PATTERNS = [
+    os.path.join(HERE, "data", "results_poss_*.txt"),
+    os.path.join(HERE, "..", "experiment", "data", "results_poss_*.txt"),
+    os.path.join(HERE, "..", "experiment", "data", "results_test_*.txt"),
+]
+
+SCORE_CACHE = os.path.join(HERE, "data", "score_cache.json")
+
+# version of the scoring logic; cached scores of another version are discarded
+SCORER = "substring-1"
+
+
+def parse_record(line):
+    """
+    Parse a line written as JSON or as a Python dict repr.
+
+    Args:
+        line (str): A line from a results file.
+
+    Returns:
+        dict: The parsed record.
+    """
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError:
+        return ast.literal_eval(line.strip())
+
+
+def parse_file_name(file):
+    """
+    Get the grid, model, shot and run of a result file from its name.
+
+    results_poss_<permutation>_<model>[_<shot>].txt is run <permutation> of the
+    permutation grid; ollama_sweep.py adds the shot. results_test_<model>_<shot>.txt
+    is run <shot> of the shot grid, whose shot is left empty as it is the run.
+
+    Args:
+        file (str): Path to the result file.
+
+    Returns:
+        tuple: The grid ('poss' or 'test'), model, shot and run, or None if the name does not match.
+    """
+    name = os.path.basename(file)
+    match = re.match(r"results_poss_(\d+)_(.+?)(?:_(zero|one|three))?\.txt$", name)
+    if match:
+        return "poss", match.group(2), match.group(3) or "", match.group(1)
+    match = re.match(r"results_test_(.+)_(zero|one|three)\.txt$", name)
+    if match:
+        return "test", match.group(1), "", match.group(2)
+    return None
+
+
+def find_result_files(patterns=RESULT_PATTERNS):
+    """Return the result files matching the glob patterns whose names can be parsed, sorted."""
+    files = sorted({file for pattern in patterns for file in glob.glob(pattern)})
+    return [file for file in files if parse_file_name(file) is not None]
+
+
+def read_file(file):
+    """
+    Read one result file into columns.
+
+    Args:
+        file (str): Path to the result file.
+
+    Returns:
+        dict: 'answer' and 'result' lists, with a missing result as an empty string.
+    """
+    answers = []
+    results = []
+    with open(file, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = parse_record(line)
+            answers.append(entry.get("answer") or "")
+            results.append(entry.get("result") or "")
+    return {"answer": answers, "result": results}
+
+
+def load_table(files):
+    """
+    Load result files into one table with one row per puzzle per file.
+
+    Args:
+        files (List[str]): Paths to the result files.
+
+    Returns:
+        pd.DataFrame: Columns grid, model, shot, run, file, index (puzzle number in the file), answer and result.
+    """
+    frames = []
+    for file in files:
+        grid, model, shot, run = parse_file_name(file)
+        columns = read_file(file)
+        frame = pd.DataFrame(columns)
+        frame.insert(0, "index", np.arange(len(frame)))
+        frame.insert(0, "file", file)
+        frame.insert(0, "run", run)
+        frame.insert(0, "shot", shot)
+        frame.insert(0, "model", model)
+        frame.insert(0, "grid", grid)
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def score(answers, results, matcher=None):
+    """
+    Check for every row whether the expected answer occurs in the result, case-insensitive.
+
+    Args:
+        answers (pd.Series): Expected answers.
+        results (pd.Series): Model outputs.
+        matcher (Matcher): Match the answers on word boundaries with this matcher
+                           instead of as plain substrings.
+
+    Returns:
+        np.ndarray: Boolean array, False for rows without an answer.
+    """
+    if matcher is not None:
+        return matcher.match_all(answers.tolist(), results.tolist())
+    answers = answers.str.lower()
+    results = results.str.lower()
+    # the containment check pairs two columns, which numpy can only do through
+    # fixed-width copies of all results; a single pass over both is faster
+    found = np.fromiter((answer in result for answer, result in zip(answers, results)), dtype=bool, count=len(answers))
+    return found & (answers.str.len() > 0).to_numpy()
+
+
+class ScoreCache:
+    """
+    Cache of per-file correctness bitsets for incremental evaluation.
+
+    Every file is fingerprinted by size, modification time and SHA-256. A file
+    with the same size and modification time is not read again, a touched file
+    with the same hash is not scored again, and only new or changed files are
+    parsed and scored. The bitsets are stored as packed bits in a JSON file,
+    separately per scorer, so switching between scorers does not rescore.
+    """
+
+    def __init__(self, file=SCORE_CACHE, matcher=None):
+        self.file = file
+        self.matcher = matcher
+        self.scorer = matcher.name() if matcher is not None else SCORER
+        self.scorers = {}
+        self.changed = False
+        self.rescored = 0
+        if os.path.exists(file):
+            with open(file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            # caches written before the scorers were kept apart hold a single scorer
+            self.scorers = data["scorers"] if "scorers" in data else {data["scorer"]: data["files"]}
+        self.entries = self.scorers.setdefault(self.scorer, {})
+
+    def scores(self, file):
+        """
+        Get the correctness of every puzzle of a result file, from the cache if unchanged.
+
+        Args:
+            file (str): Path to the result file.
+
+        Returns:
+            np.ndarray: Boolean array with one value per puzzle.
+        """
+        key = os.path.normpath(file)
+        stat = os.stat(file)
+        entry = self.entries.get(key)
+        if entry is not None and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+            return unpack_bits(entry)
+
+        with open(file, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        self.changed = True
+        if entry is not None and entry["sha256"] == digest:
+            entry["mtime"] = stat.st_mtime_ns
+            return unpack_bits(entry)
+
+        columns = read_file(file)
+        correct = score(pd.Series(columns["answer"], dtype=object), pd.Series(columns["result"], dtype=object), self.matcher)
+        self.entries[key] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "sha256": digest,
+            "count": len(correct),
+            "bits": base64.b64encode(np.packbits(correct).tobytes()).decode("ascii"),
+        }
+        self.rescored += 1
+        return correct
+
+    def save(self):
+        """Write the cache if anything changed."""
+        if not self.changed:
+            return
+        tmp = self.file + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"scorers": self.scorers}, f)
+        os.replace(tmp, self.file)
+
+
+def unpack_bits(entry):
+    """Unpack the correctness bitset of a cache entry."""
+    bits = np.frombuffer(base64.b64decode(entry["bits"]), dtype=np.uint8)
+    return np.unpackbits(bits, count=entry["count"]).astype(bool)
+
+
+def load_scores(files, cache):
+    """
+    Build the scored table of the result files from cached bitsets, rescoring only changed files.
+
+    Args:
+        files (List[str]): Paths to the result files.
+        cache (ScoreCache): The score cache.
+
+    Returns:
+        pd.DataFrame: Columns grid, model, shot, run, file, index and correct, as used by report.
+    """
+    names = [parse_file_name(file) for file in files]
+    scores = [cache.scores(file) for file in files]
+    counts = [len(correct) for correct in scores]
+    return pd.DataFrame({
+        "grid": np.repeat([name[0] for name in names], counts),
+        "model": np.repeat([name[1] for name in names], counts),
+        "shot": np.repeat([name[2] for name in names], counts),
+        "run": np.repeat([name[3] for name in names], counts),
+        "file": np.repeat(files, counts),
+        "index": np.concatenate([np.arange(count) for count in counts]),
+        "correct": np.concatenate(scores),
+    })
+
+
+def report(table):
+    """
+    Compute the accuracies of a scored table in one pass.
+
+    Args:
+        table (pd.DataFrame): Table of load_table with a boolean 'correct' column.
+
+    Returns:
+        tuple: Per run the correct count, total and accuracy, and per model and
+               shot the best run, average accuracy, union (correct in any run)
+               and intersection (correct in every run).
+    """
+    runs = table.groupby(["grid", "model", "shot", "run"])["correct"].agg(correct="sum", total="size")
+    runs["accuracy"] = runs["correct"] / runs["total"]
+
+    per_puzzle = table.groupby(["grid", "model", "shot", "index"])["correct"].agg(["any", "all"])
+    models = per_puzzle.groupby(["grid", "model", "shot"]).agg(union=("any", "sum"), intersection=("all", "sum"), puzzles=("any", "size"))
+    accuracies = runs["accuracy"].groupby(["grid", "model", "shot"])
+    models["best_run"] = accuracies.idxmax().map(lambda key: key[3])
+    models["best_accuracy"] = accuracies.max()
+    models["average_accuracy"] = accuracies.mean()
+    return runs, models
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Score all result files of all models and runs in one pass")
+    parser.add_argument("patterns", nargs="*", default=RESULT_PATTERNS, help="glob patterns of result files")
+    parser.add_argument("--incremental", action="store_true", help="only rescore new or changed files")
+    parser.add_argument("--cache", default=SCORE_CACHE, help="score cache of the incremental mode")
+    parser.add_argument("--matcher", choices=["substring", "word"], default="substring",
+                        help="match answers as substrings (as before) or as whole words")
+    parser.add_argument("--no-stem", action="store_true", help="word matcher: do not accept plural and diminutive forms")
+    parser.add_argument("--first-line", action="store_true", help="word matcher: only look at the first non-empty line of a result")
+    args = parser.parse_args()
+
+    matcher = None
+    if args.matcher == "word":
+        matcher = Matcher(stem=not args.no_stem, first_line=args.first_line)
+
+    start = time.perf_counter()
+    files = find_result_files(args.patterns)
+    if not files:
+        sys.exit(f"No result files match {' '.join(args.patterns)}")
+    if args.incremental:
+        cache = ScoreCache(args.cache, matcher)
+        table = load_scores(files, cache)
+        cache.save()
+    else:
+        table = load_table(files)
+        table["correct"] = score(table["answer"], table["result"], matcher)
+    runs, models = report(table)
+    elapsed = time.perf_counter() - start
+
+    pd.set_option("display.width", 200)
+    print("Number of correct instances and accuracy per run:")
+    print(runs.to_string(formatters={"accuracy": "{:.2%}".format}))
+    print("\nBest, average, total (union) and overlap (intersection) per model and shot:")
+    print(models.to_string(formatters={"best_accuracy": "{:.2%}".format, "average_accuracy": "{:.2%}".format}))
+    print(f"\nScored {len(table)} answers from {len(files)} files in {elapsed:.2f}s")
+    if args.incremental:
+        print(f"Rescored {cache.rescored} new or changed files, {len(files) - cache.rescored} from the cache")
+
+if __name__ == "__main__":
+    main()
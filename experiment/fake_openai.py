@@ -0,0 +1,160 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from llm_runner import load_puzzles
+
+
+def load_answers(file):
+    """
+    Map every puzzle of a puzzle file to its answer.
+
+    Args:
+        file (str): Path to the puzzle file.
+
+    Returns:
+        dict: Mapping of puzzle text to answer.
+    """
+    return {load["prompt"]: load["answer"] for load in load_puzzles(file)}
+
+
+class FakeServer(ThreadingHTTPServer):
+    """
+    Local OpenAI-compatible chat completions server for testing the runner.
+
+    Known puzzles are answered correctly, others with 'Geen idee.'. The first
+    'fail_first' requests are answered with HTTP 429 and a Retry-After header,
+    and after that a fraction 'error_rate' fails with HTTP 500, so retries can
+    be exercised. 'delay' adds latency to every response.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, answers, delay=0.0, fail_first=0, error_rate=0.0, retry_after=1):
+        super().__init__(address, FakeHandler)
+        self.answers = answers
+        self.delay = delay
+        self.fail_first = fail_first
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.prefixes = set()
+        self.lock = threading.Lock()
+
+    def enter(self):
+        with self.lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            return self.requests
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        server = self.server
+        number = server.enter()
+        try:
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            time.sleep(server.delay)
+            if self.path.rstrip("/") != "/v1/chat/completions":
+                self.reply(404, {"error": {"message": f"Unknown path {self.path}"}})
+            elif number <= server.fail_first:
+                self.reply(429, {"error": {"message": "Rate limit reached", "type": "requests"}}, retry_after=True)
+            elif random.random() < server.error_rate:
+                self.reply(500, {"error": {"message": "The server had an error", "type": "server_error"}})
+            elif re.match(r"o\d", body["model"]) and ("stop" in body or "max_tokens" in body):
+                # like OpenAI, reasoning models reject these parameters
+                self.reply(400, {"error": {"message": "Unsupported parameter for this model", "type": "invalid_request_error"}})
+            else:
+                self.reply(200, self.completion(body))
+        finally:
+            server.leave()
+
+    def completion(self, body):
+        prompt = body["messages"][-1]["content"]
+        puzzles = re.findall(r"Vraag: (.*)\. Wat is het\?", prompt)
+        answer = self.server.answers.get(puzzles[-1]) if puzzles else None
+        content = f"{answer}.\nDit woord past bij alle drie de aanwijzingen." if answer else "Geen idee."
+        # like the API, end the completion before the first stop sequence
+        for stop in body.get("stop") or []:
+            content = content.split(stop, 1)[0]
+        prompt_tokens = sum(len(message["content"]) // 4 + 1 for message in body["messages"])
+        completion_tokens = len(content) // 4 + 1
+        # like OpenAI, report everything up to the puzzle as cached once a prefix was seen before
+        prefix = prompt[:prompt.rfind("Vraag: ")] if puzzles else prompt
+        with self.server.lock:
+            cached = (len(prefix) // 4) if prefix in self.server.prefixes else 0
+            self.server.prefixes.add(prefix)
+        return {
+            "id": f"chatcmpl-{self.server.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached},
+            },
+        }
+
+    def reply(self, status, body, retry_after=False):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        if retry_after:
+            self.send_header("Retry-After", str(self.server.retry_after))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(answers, port=0, **kwargs):
+    """
+    Start a fake server in a background thread.
+
+    Args:
+        answers (dict): Mapping of puzzle text to answer (see load_answers).
+        port (int): Port to listen on, 0 for any free port.
+        **kwargs: Latency and fault injection options passed to FakeServer.
+
+    Returns:
+        FakeServer: The running server; its base URL is http://127.0.0.1:<port>/v1.
+    """
+    server = FakeServer(("127.0.0.1", port), answers, **kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible server that answers known puzzles")
+    parser.add_argument("--puzzles", default="data/test_puzzles.txt")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--delay", type=float, default=0.5)
+    parser.add_argument("--fail-first", type=int, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeServer(("127.0.0.1", args.port), load_answers(args.puzzles), args.delay, args.fail_first, args.error_rate)
+    print(f"Serving {len(server.answers)} puzzles at http://127.0.0.1:{args.port}/v1")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+import argparse
+import copy
+import json
+import time
+
+import torch
+from transformers import AutoTokenizer, AutoModelForCausalLM, StoppingCriteria, StoppingCriteriaList
+
+from llm_runner import load_puzzles
+from prompts import PROMPTS, PrefixCache, extract_answer
+from response_store import STORE_FILE, ResponseStore
+
+
+def common_prefix_length(sequences):
+    """
+    Count the leading tokens shared by all token sequences.
+
+    Args:
+        sequences (List[List[int]]): Token IDs per prompt.
+
+    Returns:
+        int: Length of the longest common prefix.
+    """
+    first = sequences[0]
+    length = min(len(sequence) for sequence in sequences)
+    for i in range(length):
+        if any(sequence[i] != first[i] for sequence in sequences):
+            return i
+    return length
+
+
+def make_batches(lengths, batch_size):
+    """
+    Group prompts of similar length into batches, longest first.
+
+    Args:
+        lengths (List[int]): Token length per prompt.
+        batch_size (int): Maximum number of prompts per batch.
+
+    Returns:
+        List[List[int]]: Prompt indices per batch.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+class AnswerStop(StoppingCriteria):
+    """
+    Stop every sequence of a batch at the first newline or period after the answer.
+
+    Whitespace before the answer does not stop the sequence, so a completion
+    that starts with a newline still gets its answer.
+    """
+
+    def __init__(self, tokenizer, start):
+        self.tokenizer = tokenizer
+        self.start = start
+
+    def __call__(self, input_ids, scores, **kwargs):
+        done = []
+        for row in input_ids[:, self.start:].tolist():
+            text = self.tokenizer.decode(row, skip_special_tokens=True).lstrip()
+            done.append("\n" in text or "." in text)
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+
+class BatchGenerator:
+    """
+    Batched text generation with a reusable cache of the shared prompt prefix.
+
+    Prompts are sorted by length and generated in batches, so batches need
+    little padding. The few-shot prompts of a shot category all start with the
+    same instruction and examples; the past key values of that prefix are
+    computed once, kept for later runs with the same prefix, and copied into
+    every batch, so only the puzzle part of each prompt is processed per batch.
+    With a response store, only prompts without a stored completion are generated.
+    In answer-first mode every sequence stops at the end of its answer.
+    """
+
+    def __init__(self, model, tokenizer, batch_size=8, prefix_cache=True, store=None, answer_first=False, **generate_kwargs):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.batch_size = batch_size
+        self.prefix_cache = prefix_cache
+        self.store = store
+        self.answer_first = answer_first
+        self.generate_kwargs = generate_kwargs
+        # stopping criteria are not part of generate_kwargs, so the mode is part of the store key
+        self.store_params = {**generate_kwargs, "answer_first": True} if answer_first else generate_kwargs
+        self.eos = tokenizer.eos_token_id
+        self.pad = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else self.eos
+        self.prefixes = {}
+        self.stats = {"stored": 0, "batches": 0, "prompt_tokens": 0, "cached_tokens": 0, "new_tokens": 0, "seconds": 0.0, "prefix_hits": 0}
+
+    def compute_prefix(self, input_ids):
+        """Compute the past key values of a token prefix, or reuse them from an earlier run."""
+        key = tuple(input_ids)
+        if key in self.prefixes:
+            self.stats["prefix_hits"] += 1
+            return self.prefixes[key]
+        with torch.no_grad():
+            output = self.model(torch.tensor([input_ids], device=self.model.device), use_cache=True)
+        self.prefixes[key] = output.past_key_values
+        return output.past_key_values
+
+    def generate(self, prompts):
+        """
+        Generate a completion for every prompt.
+
+        Args:
+            prompts (List[str] | List[List[int]]): The prompts, as text or as token IDs
+                                                   (e.g. from PrefixCache.encode).
+
+        Returns:
+            List[str]: The completions, without the prompts, in prompt order.
+        """
+        ids = [self.tokenizer(prompt)["input_ids"] if isinstance(prompt, str) else prompt for prompt in prompts]
+        completions = [None] * len(prompts)
+        model_name = self.model.name_or_path
+        if self.store is not None:
+            for i, sequence in enumerate(ids):
+                completions[i] = self.store.get(model_name, self.store_params, sequence)
+        missing = [i for i, completion in enumerate(completions) if completion is None]
+        self.stats["stored"] += len(prompts) - len(missing)
+        if not missing:
+            return completions
+        ids = {i: ids[i] for i in missing}
+
+        prefix, cache = 0, None
+        if self.prefix_cache and len(ids) > 1:
+            # keep at least one token per prompt outside the cache to start generating from
+            sequences = list(ids.values())
+            prefix = min(common_prefix_length(sequences), min(len(sequence) for sequence in sequences) - 1)
+            if prefix > 0:
+                cache = self.compute_prefix(sequences[0][:prefix])
+
+        lengths = [len(ids[i]) for i in missing]
+        batches = [[missing[j] for j in batch] for batch in make_batches(lengths, self.batch_size)]
+        for n, batch in enumerate(batches, 1):
+            start = time.perf_counter()
+            outputs = self.generate_batch([ids[i] for i in batch], prefix, cache)
+            elapsed = time.perf_counter() - start
+            new_tokens = sum(len(output) for output in outputs)
+            for i, output in zip(batch, outputs):
+                completions[i] = self.tokenizer.decode(output, skip_special_tokens=True)
+                if self.store is not None:
+                    self.store.put(model_name, self.store_params, ids[i], completions[i])
+
+            self.stats["batches"] += 1
+            self.stats["prompt_tokens"] += sum(len(ids[i]) for i in batch)
+            self.stats["cached_tokens"] += prefix * len(batch)
+            self.stats["new_tokens"] += new_tokens
+            self.stats["seconds"] += elapsed
+            print(f"Batch {n}/{len(batches)}: {len(batch)} prompts, {new_tokens} tokens in {elapsed:.2f}s ({new_tokens / elapsed:.1f} tokens/s)")
+        return completions
+
+    def generate_batch(self, ids, prefix, cache):
+        """
+        Generate the completions of one batch.
+
+        Args:
+            ids (List[List[int]]): Token IDs per prompt.
+            prefix (int): Number of leading tokens covered by 'cache'.
+            cache: Past key values of the prefix, or None.
+
+        Returns:
+            List[List[int]]: Generated token IDs per prompt, up to the end of sequence token.
+        """
+        length = max(len(sequence) - prefix for sequence in ids)
+        input_ids = []
+        attention_mask = []
+        for sequence in ids:
+            suffix = sequence[prefix:]
+            padding = length - len(suffix)
+            # pad between the prefix and the puzzle part, so the prefix stays aligned with the cache
+            input_ids.append(sequence[:prefix] + [self.pad] * padding + suffix)
+            attention_mask.append([1] * prefix + [0] * padding + [1] * len(suffix))
+
+        kwargs = dict(self.generate_kwargs)
+        if cache is not None:
+            past_key_values = copy.deepcopy(cache)
+            past_key_values.batch_repeat_interleave(len(ids))
+            kwargs["past_key_values"] = past_key_values
+        if self.answer_first:
+            kwargs["stopping_criteria"] = StoppingCriteriaList([AnswerStop(self.tokenizer, prefix + length)])
+
+        device = self.model.device
+        with torch.no_grad():
+            output = self.model.generate(
+                torch.tensor(input_ids, device=device),
+                attention_mask=torch.tensor(attention_mask, device=device),
+                pad_token_id=self.pad,
+                **kwargs,
+            )
+
+        outputs = []
+        for row in output[:, prefix + length:].tolist():
+            if self.eos in row:
+                row = row[:row.index(self.eos)]
+            outputs.append(row)
+        return outputs
+
+
+def run_file(generator, shot, infile, outfile, prefix_cache=None):
+    """
+    Solve all puzzles of a file with one shot category and write the results.
+
+    The records have the same keys as in the notebook: the full prompt, the
+    answer and the prompt followed by the generated text, plus the answer
+    extracted from the generated text under 'extracted'.
+
+    Args:
+        generator (BatchGenerator): The batched generator.
+        shot (str): Shot category: 'zero', 'one' or 'three'.
+        infile (str): Path to the puzzle file.
+        outfile (str): Path to the results file.
+        prefix_cache (PrefixCache): Tokenised prefixes shared between runs, a new one by default.
+
+    Returns:
+        dict: Number of puzzles and correct answers.
+    """
+    if prefix_cache is None:
+        prefix_cache = PrefixCache()
+    puzzles = load_puzzles(infile)
+    prompts = [PROMPTS[shot](load["prompt"]) for load in puzzles]
+    ids = [prefix_cache.encode(generator.tokenizer, shot, load["prompt"]) for load in puzzles]
+    completions = generator.generate(ids)
+    print(prefix_cache.report())
+
+    correct = 0
+    with open(outfile, "w", encoding="utf-8") as f:
+        for load, prompt, completion in zip(puzzles, prompts, completions):
+            answer = load["answer"]
+            result = prompt + completion
+            if answer.lower() in result.lower():
+                correct += 1
+            record = {"prompt": prompt, "answer": answer, "result": result, "extracted": extract_answer(completion)}
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return {"total": len(puzzles), "correct": correct}
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Solve puzzles with a Hugging Face model in batches")
+    parser.add_argument("--model", default="BramVanroy/fietje-2-chat")
+    parser.add_argument("--shot", default="zero", choices=sorted(PROMPTS))
+    parser.add_argument("--infile", default="data/test_puzzles.txt")
+    parser.add_argument("--outfile", default="data/results_test.txt")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--max-new-tokens", type=int, default=None, help="50 by default, 16 in answer-first mode")
+    parser.add_argument("--answer-first", action="store_true", help="stop at the end of the answer, without explanation")
+    parser.add_argument("--greedy", action="store_true", help="greedy decoding instead of top-k/top-p sampling")
+    parser.add_argument("--no-prefix-cache", action="store_true", help="process the shared prompt prefix in every batch")
+    parser.add_argument("--threads", type=int, default=None, help="number of CPU threads used by torch")
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--store", default=STORE_FILE, help="SQLite store of completions, reused across runs")
+    parser.add_argument("--no-store", action="store_true", help="always generate")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    # setup model
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    model = AutoModelForCausalLM.from_pretrained(args.model).to(args.device).eval()
+    sampling = {"do_sample": False} if args.greedy else {"do_sample": True, "top_k": 50, "top_p": 0.95}
+    store = None if args.no_store else ResponseStore(args.store)
+    max_new_tokens = args.max_new_tokens or (16 if args.answer_first else 50)
+    generator = BatchGenerator(model, tokenizer, args.batch_size, not args.no_prefix_cache, store, args.answer_first,
+                               max_new_tokens=max_new_tokens, **sampling)
+
+    summary = run_file(generator, args.shot, args.infile, args.outfile)
+    stats = generator.stats
+    print(f"Correct: {summary['correct']}/{summary['total']}")
+    if store is not None:
+        print(store.stats())
+    if not stats["batches"]:
+        return
+    print(f"{stats['new_tokens']} tokens in {stats['seconds']:.1f}s ({stats['new_tokens'] / stats['seconds']:.1f} tokens/s), "
+          f"{stats['seconds'] / stats['batches']:.2f}s per batch, "
+          f"{stats['cached_tokens']}/{stats['prompt_tokens']} prompt tokens served from the prefix cache")
+
+if __name__ == "__main__":
+    main()
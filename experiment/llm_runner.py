@@ -0,0 +1,414 @@
+import argparse
+import ast
+import asyncio
+import json
+import os
+import random
+import re
+import time
+
+import openai
+
+from prompts import ANSWER_STOP, PROMPTS, SYSTEM_PROMPT, chat_messages, extract_answer
+from response_store import STORE_FILE, NotStored, ResponseStore
+
+
+def parse_record(line):
+    """
+    Parse a line written as JSON or as a Python dict repr.
+
+    Args:
+        line (str): A line from a puzzle or results file.
+
+    Returns:
+        dict: The parsed record.
+    """
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError:
+        return ast.literal_eval(line.strip())
+
+
+def load_puzzles(file):
+    """
+    Read the puzzles of a puzzle file.
+
+    Args:
+        file (str): Path to a file with one {'prompt': ..., 'answer': ...} record per line.
+
+    Returns:
+        List[dict]: The puzzle records.
+    """
+    with open(file, "r", encoding="utf-8") as f:
+        return [parse_record(line) for line in f if line.strip()]
+
+
+def estimate_tokens(text):
+    """Roughly estimate the number of tokens of a text, about four characters per token."""
+    return len(text) // 4 + 1
+
+
+# completion tokens of the answer-first mode
+ANSWER_TOKENS = 16
+
+# extra completion tokens for the hidden reasoning of reasoning models
+REASONING_TOKENS = 2048
+
+
+def is_reasoning_model(model):
+    """Return whether a model is an OpenAI reasoning model (o-series), e.g. 'o4-mini'."""
+    return re.match(r"o\d", model) is not None
+
+
+def model_params(model, params):
+    """
+    Adapt the request parameters to a model.
+
+    Reasoning models reject 'stop' and 'max_tokens'. They get
+    'max_completion_tokens' instead, which also covers their reasoning, and
+    no stop sequences; the answer is cut from their completion afterwards.
+
+    Args:
+        model (str): Model name.
+        params (dict): Extra parameters of every request.
+
+    Returns:
+        dict: The parameters to send for this model.
+    """
+    if not is_reasoning_model(model):
+        return params
+    params = {key: value for key, value in params.items() if key != "stop"}
+    if "max_tokens" in params:
+        params["max_completion_tokens"] = params.pop("max_tokens") + REASONING_TOKENS
+    return params
+
+
+class Budget:
+    """
+    Requests and tokens per minute budget of one provider.
+
+    Both budgets refill continuously. A request reserves its estimated number
+    of tokens up front and the reservation is corrected with the reported
+    usage once the response arrives. A rate limit response pauses the whole
+    budget for the time the provider asked for.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self.requests = float(requests_per_minute or 0)
+        self.tokens = float(tokens_per_minute or 0)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated
+        self.updated = now
+        if self.rpm:
+            self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60)
+
+    async def acquire(self, tokens):
+        """
+        Wait until one request and 'tokens' tokens fit in the budget, then reserve them.
+
+        Args:
+            tokens (int): Estimated number of tokens of the request.
+        """
+        async with self.lock:
+            while True:
+                self.refill()
+                waits = [self.paused_until - time.monotonic()]
+                if self.rpm and self.requests < 1:
+                    waits.append((1 - self.requests) * 60 / self.rpm)
+                if self.tpm and self.tokens < min(tokens, self.tpm):
+                    waits.append((min(tokens, self.tpm) - self.tokens) * 60 / self.tpm)
+                wait = max(waits)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            if self.rpm:
+                self.requests -= 1
+            if self.tpm:
+                self.tokens -= tokens
+
+    def settle(self, reserved, used):
+        """
+        Correct a token reservation with the actual usage.
+
+        Args:
+            reserved (int): Tokens reserved by acquire.
+            used (int): Tokens used according to the response, 0 for a failed request.
+        """
+        if self.tpm:
+            self.tokens += reserved - used
+
+    def pause(self, seconds):
+        """Hold back all requests of this provider for the given number of seconds."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+def retry_delay(error, attempt, backoff):
+    """
+    Compute the wait before retrying a failed request.
+
+    Args:
+        error (Exception): The error of the failed request.
+        attempt (int): Number of the failed attempt, starting at 0.
+        backoff (float): Base delay in seconds.
+
+    Returns:
+        float: The Retry-After of the response if given, otherwise exponential
+               backoff, both with random jitter so retries do not arrive together.
+    """
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(retry_after) + random.uniform(0, backoff)
+    except (TypeError, ValueError):
+        return random.uniform(0, backoff * 2 ** attempt)
+
+
+class Runner:
+    """
+    Pool of concurrent chat completion requests to one OpenAI-compatible provider.
+
+    At most 'max_in_flight' requests are open at the same time and all requests
+    share the provider's budget. Rate limits (429), server errors (5xx),
+    timeouts and connection errors are retried with jittered backoff.
+    With a response store, stored completions are returned without a request
+    and new ones are added; in replay mode the model is never called.
+    """
+
+    def __init__(self, base_url=None, api_key=None, max_in_flight=8, budget=None, retries=5, backoff=1.0, timeout=120,
+                 store=None, replay=False, **params):
+        self.client = openai.AsyncOpenAI(
+            api_key=api_key or os.environ.get("OPENAI_API_KEY", "none"),
+            base_url=base_url,
+            max_retries=0,
+            timeout=timeout,
+        )
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.budget = budget or Budget()
+        self.retries = retries
+        self.backoff = backoff
+        self.store = store
+        self.replay = replay
+        self.params = params
+        self.stats = {"stored": 0, "requests": 0, "retries": 0, "errors": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+
+    async def complete(self, model, prompt):
+        """
+        Request the completion of a prompt.
+
+        The system prompt and the constant prefix of the user prompt come first,
+        so providers with prompt caching can reuse them across puzzles; the
+        cached tokens they report are counted in 'cached_tokens'.
+
+        Args:
+            model (str): Model name.
+            prompt (str): The user prompt; the system prompt is added.
+
+        Returns:
+            str: The stripped completion.
+
+        Raises:
+            openai.OpenAIError: If the request failed and could not be retried.
+            NotStored: In replay mode, if the completion is not in the store.
+        """
+        messages = chat_messages(prompt)
+        params = model_params(model, self.params)
+        if self.store is not None:
+            completion = self.store.get(model, params, messages)
+            if completion is not None:
+                self.stats["stored"] += 1
+                return completion
+        if self.replay:
+            raise NotStored(f"No stored completion of {model} for this prompt")
+        reserved = estimate_tokens(SYSTEM_PROMPT + prompt) + params.get("max_tokens", params.get("max_completion_tokens", 256))
+        attempt = 0
+        while True:
+            await self.budget.acquire(reserved)
+            try:
+                async with self.semaphore:
+                    self.stats["requests"] += 1
+                    response = await self.client.chat.completions.create(model=model, messages=messages, **params)
+            except (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError) as e:
+                self.budget.settle(reserved, 0)
+                if attempt == self.retries:
+                    self.stats["errors"] += 1
+                    raise
+                delay = retry_delay(e, attempt, self.backoff)
+                if isinstance(e, openai.RateLimitError):
+                    self.budget.pause(delay)
+                self.stats["retries"] += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            except openai.OpenAIError:
+                self.budget.settle(reserved, 0)
+                self.stats["errors"] += 1
+                raise
+            usage = response.usage
+            if usage is not None:
+                self.stats["prompt_tokens"] += usage.prompt_tokens
+                details = getattr(usage, "prompt_tokens_details", None)
+                if details is not None and details.cached_tokens:
+                    self.stats["cached_tokens"] += details.cached_tokens
+                self.stats["completion_tokens"] += usage.completion_tokens
+            self.budget.settle(reserved, usage.total_tokens if usage is not None else reserved)
+            completion = (response.choices[0].message.content or "").strip()
+            if "stop" in self.params:
+                # answer-first mode: the stop sequences leave out a newline and
+                # reasoning models get none, so the answer is cut here
+                completion = extract_answer(completion)
+            if self.store is not None:
+                self.store.put(model, params, messages, completion)
+            return completion
+
+
+class OrderedWriter:
+    """
+    Write results to a file in puzzle order while they complete in any order.
+
+    Results that arrive early are held back until all results before them
+    are written, and every written line is flushed, so the file is always a
+    valid prefix of the final results.
+    """
+
+    def __init__(self, file):
+        self.f = open(file, "w", encoding="utf-8")
+        self.pending = {}
+        self.next = 0
+        self.correct = 0
+        self.errors = 0
+
+    def add(self, index, record):
+        self.pending[index] = record
+        while self.next in self.pending:
+            record = self.pending.pop(self.next)
+            if record["result"] is None:
+                self.errors += 1
+            elif record["answer"] in record["result"].lower():
+                self.correct += 1
+            self.f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.next += 1
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+async def solve(runner, model, build, index, load):
+    """
+    Solve one puzzle.
+
+    Returns:
+        tuple: The index and the result record, with the answer extracted from the
+               result under 'extracted'. A failed request gives a result of None
+               and the error message under 'error'.
+    """
+    puzzle = load["prompt"]
+    answer = load["answer"].strip().lower()
+    try:
+        result = await runner.complete(model, build(puzzle))
+        return index, {"prompt": puzzle, "answer": answer, "result": result, "extracted": extract_answer(result)}
+    except (openai.OpenAIError, NotStored) as e:
+        print(f"Error at prompt {index}: {e}")
+        return index, {"prompt": puzzle, "answer": answer, "result": None, "error": str(e)}
+
+
+async def run_file(runner, model, shot, infile, outfile):
+    """
+    Solve all puzzles of a file with one model and shot category.
+
+    Args:
+        runner (Runner): The runner of the model's provider.
+        model (str): Model name.
+        shot (str): Shot category: 'zero', 'one' or 'three'.
+        infile (str): Path to the puzzle file.
+        outfile (str): Path to the results file, written as the results come in.
+
+    Returns:
+        dict: Number of puzzles, correct answers and errors.
+    """
+    puzzles = load_puzzles(infile)
+    build = PROMPTS[shot]
+    writer = OrderedWriter(outfile)
+    tasks = [asyncio.create_task(solve(runner, model, build, i, load)) for i, load in enumerate(puzzles)]
+    try:
+        for done, task in enumerate(asyncio.as_completed(tasks), 1):
+            index, record = await task
+            writer.add(index, record)
+            print(f"Processing {model} {shot}: {done}/{len(puzzles)}")
+    finally:
+        writer.close()
+    return {"total": len(puzzles), "correct": writer.correct, "errors": writer.errors}
+
+
+async def run_sweep(runner, models, shots, infile, outfile):
+    """
+    Run every model and shot category concurrently through the same runner.
+
+    Args:
+        runner (Runner): The runner of the models' provider.
+        models (List[str]): Model names.
+        shots (List[str]): Shot categories.
+        infile (str): Path to the puzzle file.
+        outfile (str): Results file name with {model} and {shot} placeholders.
+
+    Returns:
+        dict: Summary of run_file per (model, shot).
+    """
+    jobs = [(model, shot) for model in models for shot in shots]
+    summaries = await asyncio.gather(*(
+        run_file(runner, model, shot, infile, outfile.format(model=model, shot=shot)) for model, shot in jobs
+    ))
+    return dict(zip(jobs, summaries))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Solve puzzles with models behind an OpenAI-compatible API")
+    parser.add_argument("--models", nargs="+", default=["o4-mini"])
+    parser.add_argument("--shots", nargs="+", default=["three"], choices=sorted(PROMPTS))
+    parser.add_argument("--infile", default="data/test_puzzles.txt")
+    parser.add_argument("--outfile", default="data/results_test_{model}_{shot}.txt")
+    parser.add_argument("--base-url", default=None, help="API endpoint, e.g. http://127.0.0.1:8001/v1 for fake_openai.py")
+    parser.add_argument("--api-key", default=None, help="defaults to OPENAI_API_KEY")
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    parser.add_argument("--rpm", type=int, default=None, help="requests per minute budget")
+    parser.add_argument("--tpm", type=int, default=None, help="tokens per minute budget")
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument("--answer-first", action="store_true", help="stop at the end of the answer, without explanation")
+    parser.add_argument("--store", default=STORE_FILE, help="SQLite store of completions, reused across runs")
+    parser.add_argument("--no-store", action="store_true", help="always call the model")
+    parser.add_argument("--replay", action="store_true", help="only use stored completions, never call the model")
+    args = parser.parse_args()
+
+    # adapted per model by model_params, as reasoning models (o-series) do not accept these
+    params = {"stop": ANSWER_STOP, "max_tokens": ANSWER_TOKENS} if args.answer_first else {}
+    store = None if args.no_store else ResponseStore(args.store)
+    runner = Runner(args.base_url, args.api_key, args.max_in_flight, Budget(args.rpm, args.tpm), args.retries,
+                    store=store, replay=args.replay, **params)
+    start = time.monotonic()
+    summaries = asyncio.run(run_sweep(runner, args.models, args.shots, args.infile, args.outfile))
+    elapsed = time.monotonic() - start
+
+    for (model, shot), summary in summaries.items():
+        print(f"{model} {shot}: correct {summary['correct']}/{summary['total']}, errors {summary['errors']}")
+    stats = runner.stats
+    if store is not None:
+        print(store.stats())
+    print(f"{stats['requests']} requests ({stats['retries']} retries, {stats['errors']} failed) in {elapsed:.1f}s, "
+          f"{stats['requests'] / elapsed:.2f} requests/s, "
+          f"{stats['prompt_tokens']} prompt and {stats['completion_tokens']} completion tokens")
+    if stats["prompt_tokens"]:
+        print(f"Prompt cache: {stats['cached_tokens']}/{stats['prompt_tokens']} prompt tokens "
+              f"({stats['cached_tokens'] / stats['prompt_tokens'] * 100:.1f}%) served from the provider's cache")
+
+if __name__ == "__main__":
+    main()
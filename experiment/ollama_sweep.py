@@ -0,0 +1,222 @@
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+from llm_runner import OrderedWriter, load_puzzles
+from prompts import ANSWER_STOP, PROMPTS, extract_answer, ollama_messages
+from response_store import STORE_FILE, ResponseStore
+
+
+def ollama_url():
+    """Return the Ollama base URL from OLLAMA_HOST, as the Ollama CLI reads it."""
+    host = os.environ.get("OLLAMA_HOST", "127.0.0.1:11434")
+    return host if host.startswith("http") else "http://" + host
+
+
+def num_parallel():
+    """Return the number of parallel requests per model of the Ollama server (OLLAMA_NUM_PARALLEL)."""
+    # 4 is Ollama's default when there is enough memory
+    return int(os.environ.get("OLLAMA_NUM_PARALLEL", 4))
+
+
+def plan_sweep(models, shots, permutations):
+    """
+    Order a model x shot x permutation grid so every model is loaded only once.
+
+    Args:
+        models (List[str]): Model names, in the order to run them.
+        shots (List[str]): Shot categories.
+        permutations (List[int]): Numbers of the clue permutation files.
+
+    Returns:
+        List[tuple]: Per model, the model name and its (shot, permutation) jobs.
+    """
+    return [(model, [(shot, permutation) for shot in shots for permutation in permutations]) for model in models]
+
+
+class OllamaClient:
+    """
+    Minimal client of the Ollama HTTP API, safe to use from several threads.
+    """
+
+    def __init__(self, url=None, keep_alive="30m", timeout=600, options=None):
+        self.url = (url or ollama_url()).rstrip("/")
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.options = options or {}
+        self.local = threading.local()
+
+    def session(self):
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def post(self, body, path="/api/generate"):
+        r = self.session().post(f"{self.url}{path}", json=body, timeout=self.timeout)
+        r.raise_for_status()
+        return r.json()
+
+    def load(self, model):
+        """
+        Load a model into memory without generating.
+
+        Returns:
+            float: Wall time of the load in seconds.
+        """
+        start = time.monotonic()
+        self.post({"model": model, "keep_alive": self.keep_alive})
+        return time.monotonic() - start
+
+    def unload(self, model):
+        """Unload a model, freeing its memory for the next model."""
+        self.post({"model": model, "keep_alive": 0})
+
+    def chat(self, model, messages):
+        """
+        Generate the reply to chat messages.
+
+        Returns:
+            dict: The Ollama response, with 'message' and the eval counts and durations.
+        """
+        return self.post({
+            "model": model,
+            "messages": messages,
+            "stream": False,
+            "keep_alive": self.keep_alive,
+            "options": self.options,
+        }, "/api/chat")
+
+
+def solve(client, model, prompt, puzzle, answer, answer_first=False):
+    """
+    Solve one puzzle.
+
+    The prompt is sent as the chat message of the Ollama notebook (see
+    ollama_messages), so the results are comparable to the notebook's.
+    In answer-first mode the result is cut to the extracted answer, as the
+    stop sequences leave out a newline.
+
+    Returns:
+        tuple: The result record, with the extracted answer under 'extracted',
+               and the Ollama response (None on error).
+    """
+    try:
+        response = client.chat(model, ollama_messages(prompt))
+        result = response["message"]["content"].strip()
+        if answer_first:
+            result = extract_answer(result)
+        return {"prompt": puzzle, "answer": answer, "result": result, "extracted": extract_answer(result)}, response
+    except requests.RequestException as e:
+        return {"prompt": puzzle, "answer": answer, "result": None, "error": str(e)}, None
+
+
+def run_model(client, model, jobs, infile, outfile, parallel, store=None, answer_first=False):
+    """
+    Run all jobs of one model while it is loaded.
+
+    Stored completions are written without loading the model. The model is
+    loaded once for all remaining prompts, which are sent 'parallel' at a time,
+    and unloaded afterwards.
+
+    Args:
+        client (OllamaClient): The Ollama client.
+        model (str): Model name.
+        jobs (List[tuple]): (shot, permutation) jobs of the model.
+        infile (str): Puzzle file name with a {permutation} placeholder.
+        outfile (str): Results file name with {model}, {shot} and {permutation} placeholders.
+        parallel (int): Number of concurrent requests.
+        store (ResponseStore): Optional store of completions.
+        answer_first (bool): Cut the results to the extracted answer.
+
+    Returns:
+        dict: Load and inference times, token counts and correct answers per job.
+    """
+    stats = {"load_seconds": 0.0, "inference_seconds": 0.0, "requests": 0, "stored": 0, "errors": 0,
+             "prompt_tokens": 0, "eval_tokens": 0, "eval_seconds": 0.0, "jobs": {}}
+    writers = {}
+    missing = []
+    for shot, permutation in jobs:
+        writer = OrderedWriter(outfile.format(model=model, shot=shot, permutation=permutation))
+        writers[(shot, permutation)] = writer
+        for i, load in enumerate(load_puzzles(infile.format(permutation=permutation))):
+            puzzle = load["prompt"]
+            answer = load["answer"].strip().lower()
+            prompt = PROMPTS[shot](puzzle)
+            completion = store.get(model, client.options, ollama_messages(prompt)) if store is not None else None
+            if completion is not None:
+                stats["stored"] += 1
+                writer.add(i, {"prompt": puzzle, "answer": answer, "result": completion, "extracted": extract_answer(completion)})
+            else:
+                missing.append((writer, i, prompt, puzzle, answer))
+
+    if missing:
+        stats["load_seconds"] = client.load(model)
+        print(f"Loaded {model} in {stats['load_seconds']:.1f}s, {len(missing)} prompts to run")
+        start = time.monotonic()
+        with ThreadPoolExecutor(parallel) as pool:
+            futures = {pool.submit(solve, client, model, prompt, puzzle, answer, answer_first): (writer, i, prompt)
+                       for writer, i, prompt, puzzle, answer in missing}
+            for done, future in enumerate(as_completed(futures), 1):
+                writer, i, prompt = futures[future]
+                record, response = future.result()
+                stats["requests"] += 1
+                if response is None:
+                    stats["errors"] += 1
+                else:
+                    stats["prompt_tokens"] += response.get("prompt_eval_count", 0)
+                    stats["eval_tokens"] += response.get("eval_count", 0)
+                    stats["eval_seconds"] += response.get("eval_duration", 0) / 1e9
+                    if store is not None:
+                        store.put(model, client.options, ollama_messages(prompt), record["result"])
+                writer.add(i, record)
+                print(f"Processing {model}: {done}/{len(missing)}")
+        stats["inference_seconds"] = time.monotonic() - start
+        client.unload(model)
+
+    for job, writer in writers.items():
+        writer.close()
+        stats["jobs"][job] = {"correct": writer.correct, "errors": writer.errors, "total": writer.next}
+    return stats
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Run a model x shot x permutation grid on an Ollama server")
+    parser.add_argument("--models", nargs="+", default=["gemma3", "mistral", "llama3.2"])
+    parser.add_argument("--shots", nargs="+", default=["three"], choices=sorted(PROMPTS))
+    parser.add_argument("--permutations", nargs="+", type=int, default=[1, 2, 3, 4, 5, 6])
+    parser.add_argument("--infile", default="../pipeline/data/test_puzzles_{permutation}.txt")
+    parser.add_argument("--outfile", default="data/results_poss_{permutation}_{model}_{shot}.txt")
+    parser.add_argument("--url", default=None, help="Ollama server, OLLAMA_HOST by default")
+    parser.add_argument("--parallel", type=int, default=None, help="concurrent requests per model, OLLAMA_NUM_PARALLEL by default")
+    parser.add_argument("--options", type=json.loads, default={}, help='Ollama options as JSON, e.g. \'{"temperature": 0}\'')
+    parser.add_argument("--answer-first", action="store_true", help="stop at the end of the answer, without explanation")
+    parser.add_argument("--store", default=STORE_FILE, help="SQLite store of completions, reused across runs")
+    parser.add_argument("--no-store", action="store_true", help="always call the model")
+    args = parser.parse_args()
+
+    options = args.options
+    if args.answer_first:
+        options = {**options, "stop": ANSWER_STOP, "num_predict": 16}
+    client = OllamaClient(args.url, options=options)
+    parallel = args.parallel or num_parallel()
+    store = None if args.no_store else ResponseStore(args.store)
+
+    for model, jobs in plan_sweep(args.models, args.shots, args.permutations):
+        stats = run_model(client, model, jobs, args.infile, args.outfile, parallel, store, args.answer_first)
+        for (shot, permutation), job in stats["jobs"].items():
+            print(f"{model} {shot} permutation {permutation}: correct {job['correct']}/{job['total']}, errors {job['errors']}")
+        rate = stats["eval_tokens"] / stats["eval_seconds"] if stats["eval_seconds"] else 0
+        print(f"{model}: load {stats['load_seconds']:.1f}s, inference {stats['inference_seconds']:.1f}s, "
+              f"{stats['requests']} requests ({stats['errors']} failed), {stats['stored']} stored, "
+              f"{stats['eval_tokens']} tokens at {rate:.1f} tokens/s")
+    if store is not None:
+        print(store.stats())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import re
+
+
+SYSTEM_PROMPT = "Je bent een taalexpert die raadsels oplost."
+
+# instruction and examples per shot category, as used in the result file names;
+# every prompt of a shot category starts with the same prefix
+PREFIXES = {
+    "zero": """Los het volgende taalkundige raadsel op. Het bevat drie aanwijzingen en het antwoord is één woord dat op alle drie van toepassing is. Geef het antwoord op de eerste regel en daarna een korte uitleg.
+
+""",
+    "one": """Los het volgende taalkundige raadsel op. Het bevat drie aanwijzingen en het antwoord is één woord dat op alle drie van toepassing is. Geef het antwoord op de eerste regel en daarna een korte uitleg. Eerst een voorbeeld, daarna een nieuw raadsel.
+
+Voorbeeld:
+Vraag: Het is een onderdeel van een schip, een bevestigingsmiddel, en een gymnastiekoefening. Wat is het?
+Antwoord: Schroef.
+
+Nu het raadsel:
+""",
+    "three": """Los het volgende taalkundige raadsel op. Het bevat drie aanwijzingen en het antwoord is één woord dat op alle drie van toepassing is. Geef het antwoord op de eerste regel en daarna een korte uitleg. Eerst drie voorbeelden, dan een nieuw raadsel.
+
+Voorbeeld 1:
+Vraag: Het is een onderdeel van een schip, een bevestigingsmiddel, en een gymnastiekoefening. Wat is het?
+Antwoord: Schroef.
+
+Voorbeeld 2:
+Vraag: Het is een winkelketen, een beroep, en een onderdeel van een schip. Wat is het?
+Antwoord: Zeeman.
+
+Voorbeeld 3:
+Vraag: Het is seksuele anatomie, een beledigend woord, en een vrucht. Wat is het?
+Antwoord: Eikel.
+
+Raadsel:
+""",
+}
+
+# puzzle part that follows the prefix
+SUFFIX = """Vraag: {puzzle}. Wat is het?
+Antwoord:"""
+
+
+# stop sequences of the answer-first mode. A newline is left out, as completions
+# may start with one after 'Antwoord:'; extract_answer cuts the answer there.
+ANSWER_STOP = ["."]
+
+
+def extract_answer(text):
+    """
+    Extract the answer from a completion that starts with the answer.
+
+    Leading whitespace, a repeated 'Antwoord:' and markdown emphasis or quotes
+    around the answer are removed, and the answer ends at the first newline or
+    period.
+
+    Args:
+        text (str): The completion, without the prompt.
+
+    Returns:
+        str: The extracted answer, possibly empty.
+    """
+    text = text.strip()
+    if text.lower().startswith("antwoord:"):
+        text = text[len("antwoord:"):].strip()
+    answer = re.split(r"[\n.]", text, maxsplit=1)[0]
+    return answer.strip().strip("*_\"'`").strip()
+
+
+def split_prompt(shot, puzzle):
+    """
+    Build the prompt of a puzzle as its constant prefix and its puzzle part.
+
+    Args:
+        shot (str): Shot category: 'zero', 'one' or 'three'.
+        puzzle (str): The puzzle clues.
+
+    Returns:
+        tuple: The prefix and the puzzle part of the prompt.
+    """
+    return PREFIXES[shot], SUFFIX.format(puzzle=puzzle)
+
+
+def build_prompt(shot, puzzle):
+    """Build the prompt of a puzzle for a shot category."""
+    return "".join(split_prompt(shot, puzzle))
+
+
+def prompt_zero_shot(puzzle):
+    """Build the zero-shot prompt for a puzzle."""
+    return build_prompt("zero", puzzle)
+
+
+def prompt_one_shot(puzzle):
+    """Build the one-shot prompt for a puzzle."""
+    return build_prompt("one", puzzle)
+
+
+def prompt_three_shot(puzzle):
+    """Build the three-shot prompt for a puzzle."""
+    return build_prompt("three", puzzle)
+
+
+def chat_messages(prompt):
+    """Build the chat messages of a prompt: the system prompt followed by the prompt as user message."""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+
+
+# the Ollama notebook formats ChatPromptTemplate "Question: {question}" for
+# OllamaLLM, which sends the chat prompt as text with a 'Human: ' prefix
+OLLAMA_TEMPLATE = "Human: Question: {question}"
+
+
+def ollama_messages(prompt):
+    """Build the chat messages of a prompt as the Ollama notebook sends it: one user message, without system prompt."""
+    return [{"role": "user", "content": OLLAMA_TEMPLATE.format(question=prompt)}]
+
+
+# prompt builder per shot category
+PROMPTS = {
+    "zero": prompt_zero_shot,
+    "one": prompt_one_shot,
+    "three": prompt_three_shot,
+}
+
+
+class PrefixCache:
+    """
+    Tokenised prompt prefixes per tokenizer and shot category.
+
+    The prefix of a shot category is tokenised once per tokenizer. When the
+    tokenizer splits the prompt cleanly between the prefix and the puzzle part,
+    which is checked once, only the puzzle part of every prompt is tokenised;
+    otherwise the full prompt is tokenised and the prefix is only counted as
+    a hit when the prompt tokens start with it. Backends that cache the prefix
+    (e.g. its past key values) can reuse it for every hit.
+    """
+
+    def __init__(self):
+        self.prefixes = {}
+        self.clean_split = {}
+        self.stats = {"prompts": 0, "hits": 0, "prompt_tokens": 0, "saved_tokens": 0}
+
+    def cache_key(self, tokenizer, shot):
+        return (getattr(tokenizer, "name_or_path", None) or id(tokenizer), shot)
+
+    def prefix_ids(self, tokenizer, shot):
+        """
+        Get the token IDs of the prefix of a shot category.
+
+        Args:
+            tokenizer: A Hugging Face tokenizer.
+            shot (str): Shot category.
+
+        Returns:
+            List[int]: The prefix token IDs, including special tokens such as BOS.
+        """
+        key = self.cache_key(tokenizer, shot)
+        if key not in self.prefixes:
+            prefix, suffix = split_prompt(shot, "")
+            prefix_ids = tokenizer(prefix)["input_ids"]
+            suffix_ids = tokenizer(suffix, add_special_tokens=False)["input_ids"]
+            self.prefixes[key] = prefix_ids
+            self.clean_split[key] = tokenizer(prefix + suffix)["input_ids"] == prefix_ids + suffix_ids
+        return self.prefixes[key]
+
+    def encode(self, tokenizer, shot, puzzle):
+        """
+        Tokenise the prompt of a puzzle, reusing the tokenised prefix.
+
+        Args:
+            tokenizer: A Hugging Face tokenizer.
+            shot (str): Shot category.
+            puzzle (str): The puzzle clues.
+
+        Returns:
+            List[int]: The prompt token IDs, identical to tokenising the full prompt.
+        """
+        prefix_ids = self.prefix_ids(tokenizer, shot)
+        key = self.cache_key(tokenizer, shot)
+        prefix, suffix = split_prompt(shot, puzzle)
+        if self.clean_split[key]:
+            ids = prefix_ids + tokenizer(suffix, add_special_tokens=False)["input_ids"]
+        else:
+            ids = tokenizer(prefix + suffix)["input_ids"]
+        self.stats["prompts"] += 1
+        self.stats["prompt_tokens"] += len(ids)
+        if ids[:len(prefix_ids)] == prefix_ids:
+            self.stats["hits"] += 1
+            self.stats["saved_tokens"] += len(prefix_ids)
+        return ids
+
+    def report(self):
+        """Return a one-line summary of the hit rate and saved tokens."""
+        stats = self.stats
+        rate = stats["hits"] / stats["prompts"] if stats["prompts"] else 0
+        return (f"Prefix cache: {stats['hits']}/{stats['prompts']} hits ({rate * 100:.1f}%), "
+                f"{stats['saved_tokens']}/{stats['prompt_tokens']} prompt tokens from the cached prefix")
@@ -0,0 +1,262 @@
+import argparse
+import ast
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from prompts import PREFIXES, build_prompt, chat_messages, ollama_messages
+
+
+STORE_FILE = os.environ.get("RESPONSE_STORE", "data/responses.sqlite")
+
+# notebooks whose result files can be imported
+BACKENDS = ("api", "ollama", "huggingface")
+
+
+class NotStored(LookupError):
+    """Raised in replay mode when a completion is not in the store."""
+
+
+def prompt_hash(prompt):
+    """
+    Hash a full prompt: a string, a list of chat messages or a list of token IDs.
+
+    Args:
+        prompt: The prompt as sent to the model.
+
+    Returns:
+        str: SHA-256 hex digest of the canonical JSON of the prompt.
+    """
+    canonical = json.dumps(prompt, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def params_key(params):
+    """Canonical JSON of the decoding parameters."""
+    return json.dumps(params or {}, sort_keys=True)
+
+
+class ResponseStore:
+    """
+    Persistent SQLite store of model completions.
+
+    Completions are keyed on the model, the decoding parameters and the hash of
+    the full prompt, so a repeated request is answered from the store instead
+    of the model. With sampling, the first stored sample is replayed.
+    """
+
+    def __init__(self, file=STORE_FILE):
+        self.file = file
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(file, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            "model TEXT, params TEXT, prompt_hash TEXT, completion TEXT, created REAL, "
+            "PRIMARY KEY (model, params, prompt_hash))"
+        )
+        self.db.commit()
+
+    def get(self, model, params, prompt):
+        """
+        Look up a stored completion.
+
+        Args:
+            model (str): Model name.
+            params (dict): Decoding parameters.
+            prompt: The full prompt (string, chat messages or token IDs).
+
+        Returns:
+            str: The stored completion, or None if missing.
+        """
+        with self.lock:
+            row = self.db.execute(
+                "SELECT completion FROM completions WHERE model = ? AND params = ? AND prompt_hash = ?",
+                (model, params_key(params), prompt_hash(prompt)),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, model, params, prompt, completion):
+        """
+        Store a completion.
+
+        Args:
+            model (str): Model name.
+            params (dict): Decoding parameters.
+            prompt: The full prompt (string, chat messages or token IDs).
+            completion (str): The completion of the model.
+        """
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?, ?)",
+                (model, params_key(params), prompt_hash(prompt), completion, time.time()),
+            )
+            self.db.commit()
+
+    def stats(self):
+        """Return a one-line summary of hits and misses."""
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0
+        return f"Response store: {self.hits} hits, {self.misses} misses ({rate:.1%} hit rate)"
+
+
+def parse_record(line):
+    """
+    Parse a line written as JSON or as a Python dict repr.
+
+    Args:
+        line (str): A line from a results file.
+
+    Returns:
+        dict: The parsed record.
+    """
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError:
+        return ast.literal_eval(line.strip())
+
+
+def load_records(file):
+    """Read the records of a results file."""
+    with open(file, "r", encoding="utf-8") as f:
+        return [parse_record(line) for line in f if line.strip()]
+
+
+def parse_result_name(file):
+    """
+    Get the model and shot category from a result file name like results_test_gpt4o_three.txt.
+
+    Returns:
+        tuple: The model and shot category, or (None, None) if the name does not match.
+    """
+    match = re.match(r"results_\w+?_(.+)_(zero|one|three)\.txt$", os.path.basename(file))
+    return match.groups() if match else (None, None)
+
+
+def import_key(backend, prompt):
+    """
+    Get the decoding parameters and prompt that imported results of a notebook are stored under.
+
+    API notebook results are keyed as llm_runner requests them and Ollama
+    notebook results as ollama_sweep requests them with its default options,
+    so those runners replay them. Hugging Face notebook results were sampled
+    and are keyed on the prompt text with the backend as parameter, which no
+    runner requests; they are kept for rescoring only.
+
+    Args:
+        backend (str): The notebook the results come from, one of BACKENDS.
+        prompt (str): The full prompt.
+
+    Returns:
+        tuple: The parameters and the prompt to store the completion under.
+    """
+    if backend == "api":
+        return {}, chat_messages(prompt)
+    if backend == "ollama":
+        return {}, ollama_messages(prompt)
+    return {"backend": backend}, prompt
+
+
+def import_results(store, file, model, shot, puzzles, backend):
+    """
+    Add the completions of an existing results file to the store, keyed as its backend requests them (see import_key).
+
+    Records hold the puzzle (API notebook), the full prompt (Ollama and Hugging
+    Face notebooks) or no prompt at all, in which case the puzzle is taken from
+    the puzzle file at the same line. A result that repeats the full prompt is
+    stripped to the completion. Records without a result are skipped. Only
+    results of the prompts in prompts.py should be imported.
+
+    Args:
+        store (ResponseStore): The store.
+        file (str): Path to the results file.
+        model (str): Model name to store the completions under.
+        shot (str): Shot category of the results.
+        puzzles (List[dict]): Records of the puzzle file the results were made from.
+        backend (str): The notebook the results come from, one of BACKENDS.
+
+    Returns:
+        int: Number of imported completions.
+    """
+    imported = 0
+    for load, puzzle in zip(load_records(file), puzzles):
+        result = load.get("result")
+        if result is None:
+            continue
+        prompt = load.get("prompt", puzzle["prompt"])
+        if not prompt.startswith(PREFIXES[shot]):
+            prompt = build_prompt(shot, prompt)
+        if result.startswith(prompt):
+            result = result[len(prompt):]
+        store.put(model, *import_key(backend, prompt), result.strip())
+        imported += 1
+    return imported
+
+
+def replay(file):
+    """
+    Rescore an existing results file without any model calls.
+
+    Args:
+        file (str): Path to the results file.
+
+    Returns:
+        dict: Number of records, correct answers and records without a result.
+    """
+    summary = {"total": 0, "correct": 0, "errors": 0}
+    for load in load_records(file):
+        summary["total"] += 1
+        result = load.get("result")
+        if result is None:
+            summary["errors"] += 1
+        elif load["answer"].strip().lower() in result.lower():
+            summary["correct"] += 1
+    return summary
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Manage the store of model completions")
+    parser.add_argument("--store", default=STORE_FILE)
+    commands = parser.add_subparsers(dest="command", required=True)
+    importer = commands.add_parser("import", help="add existing result files to the store")
+    importer.add_argument("files", nargs="+")
+    importer.add_argument("--model", help="model name, taken from the file name by default")
+    importer.add_argument("--shot", help="shot category, taken from the file name by default")
+    importer.add_argument("--backend", required=True, choices=BACKENDS, help="notebook the results come from")
+    importer.add_argument("--puzzles", default="data/test_puzzles.txt", help="puzzle file the results were made from")
+    rescorer = commands.add_parser("replay", help="rescore result files without model calls")
+    rescorer.add_argument("files", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "replay":
+        for file in args.files:
+            summary = replay(file)
+            rate = summary["correct"] / summary["total"] if summary["total"] else 0
+            print(f"{file}: correct {summary['correct']}/{summary['total']} "
+                  f"({rate:.1%}), {summary['errors']} without result")
+        return
+
+    store = ResponseStore(args.store)
+    puzzles = load_records(args.puzzles)
+    for file in args.files:
+        model, shot = parse_result_name(file)
+        model = args.model or model
+        shot = args.shot or shot
+        if model is None or shot is None:
+            raise SystemExit(f"Cannot tell model and shot category of {file}, use --model and --shot")
+        imported = import_results(store, file, model, shot, puzzles, args.backend)
+        print(f"{file}: imported {imported} completions for {model} {shot} ({args.backend})")
+
+if __name__ == "__main__":
+    main()
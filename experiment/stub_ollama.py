@@ -0,0 +1,162 @@
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from llm_runner import load_puzzles
+
+
+class StubOllama(ThreadingHTTPServer):
+    """
+    Local server speaking the Ollama /api/generate, /api/chat and /api/ps API, for testing the sweep.
+
+    Like Ollama, it keeps at most 'max_loaded' models in memory, loading a
+    model takes 'load_delay' seconds and at most 'parallel' requests per model
+    are processed at the same time; others wait. Known puzzles are answered
+    correctly. Loads and the highest concurrency are counted.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, answers, load_delay=1.0, delay=0.1, parallel=4, max_loaded=1):
+        super().__init__(address, StubHandler)
+        self.answers = answers
+        self.load_delay = load_delay
+        self.delay = delay
+        self.parallel = parallel
+        self.max_loaded = max_loaded
+        self.loaded = []
+        self.slots = {}
+        self.loads = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def ensure_loaded(self, model):
+        """Load a model if needed, evicting the least recently used one; returns the load time."""
+        with self.lock:
+            if model in self.loaded:
+                self.loaded.remove(model)
+                self.loaded.append(model)
+                return 0.0
+            while len(self.loaded) >= self.max_loaded:
+                self.slots.pop(self.loaded.pop(0), None)
+            time.sleep(self.load_delay)
+            self.loaded.append(model)
+            self.slots[model] = threading.Semaphore(self.parallel)
+            self.loads.append(model)
+            return self.load_delay
+
+    def unload(self, model):
+        with self.lock:
+            if model in self.loaded:
+                self.loaded.remove(model)
+                self.slots.pop(model, None)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path == "/api/ps":
+            self.reply(200, {"models": [{"name": model, "model": model} for model in self.server.loaded]})
+        else:
+            self.reply(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        server = self.server
+        if self.path not in ("/api/generate", "/api/chat"):
+            self.reply(404, {"error": f"unknown path {self.path}"})
+            return
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        model = body["model"]
+        if body.get("keep_alive") == 0:
+            server.unload(model)
+            self.reply(200, {"model": model, "response": "", "done": True, "done_reason": "unload"})
+            return
+        load_seconds = server.ensure_loaded(model)
+        if "prompt" not in body and not body.get("messages"):
+            self.reply(200, {"model": model, "response": "", "done": True, "done_reason": "load", "load_duration": int(load_seconds * 1e9)})
+            return
+
+        slots = server.slots.get(model) or threading.Semaphore(server.parallel)
+        with slots:
+            with server.lock:
+                server.in_flight += 1
+                server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            time.sleep(server.delay)
+            with server.lock:
+                server.in_flight -= 1
+
+        prompt = body["prompt"] if "prompt" in body else body["messages"][-1]["content"]
+        puzzles = re.findall(r"Vraag: (.*)\. Wat is het\?", prompt)
+        answer = server.answers.get(puzzles[-1]) if puzzles else None
+        text = f"{answer}.\nDit woord past bij alle drie de aanwijzingen." if answer else "Geen idee."
+        for stop in body.get("options", {}).get("stop") or []:
+            text = text.split(stop, 1)[0]
+        reply = {"message": {"role": "assistant", "content": text}} if "messages" in body else {"response": text}
+        self.reply(200, {
+            "model": model,
+            **reply,
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int((load_seconds + server.delay) * 1e9),
+            "load_duration": int(load_seconds * 1e9),
+            "prompt_eval_count": len(prompt) // 4 + 1,
+            "prompt_eval_duration": int(server.delay / 2 * 1e9),
+            "eval_count": len(text) // 4 + 1,
+            "eval_duration": int(server.delay / 2 * 1e9),
+        })
+
+    def reply(self, status, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def load_answers(files):
+    """Map every puzzle of the puzzle files to its answer."""
+    return {load["prompt"]: load["answer"] for file in files for load in load_puzzles(file)}
+
+
+def start_server(answers, port=0, **kwargs):
+    """
+    Start a stub Ollama server in a background thread.
+
+    Args:
+        answers (dict): Mapping of puzzle text to answer (see load_answers).
+        port (int): Port to listen on, 0 for any free port.
+        **kwargs: Timing and capacity options passed to StubOllama.
+
+    Returns:
+        StubOllama: The running server; its URL is http://127.0.0.1:<port>.
+    """
+    server = StubOllama(("127.0.0.1", port), answers, **kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Stub Ollama server that answers known puzzles")
+    parser.add_argument("--puzzles", nargs="+", default=[f"../pipeline/data/test_puzzles_{i}.txt" for i in range(1, 7)])
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--load-delay", type=float, default=2.0)
+    parser.add_argument("--delay", type=float, default=0.2)
+    parser.add_argument("--parallel", type=int, default=4)
+    args = parser.parse_args()
+
+    server = StubOllama(("127.0.0.1", args.port), load_answers(args.puzzles), args.load_delay, args.delay, args.parallel)
+    print(f"Serving {len(server.answers)} puzzles at http://127.0.0.1:{args.port}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,40 @@
-import ast
 import csv
+import record_io
 
 
 def export_to_tsv(input_file, output_tsv):
     """
-    Converts a line-by-line text file with JSON-like dictionaries (containing 'title' and a list of 'links')
+    Converts a record file with dictionaries (containing 'title' and a list of 'links')
     into a tab-separated values (TSV) file for easy viewing/editing in spreadsheet applications.
 
     Each row will have the main title followed by the titles of each link.
 
     Args:
-        input_file (str): Path to the input .txt file containing stringified dictionaries per line.
+        input_file (str): Path to the input record file (JSON lines or legacy dict lines, see record_io).
         output_tsv (str): Path to the output .tsv file to be created.
     """
-    with open(input_file, "r", encoding='utf-8') as f:
-        lines = f.readlines()
+    write_tsv(record_io.readRecords(input_file), output_tsv)
 
+
+def write_tsv(records, output_tsv):
+    """
+    Writes page records to a TSV file with the main title followed by the titles of each link.
+
+    Only the titles are kept in memory, so 'records' can be a generator.
+
+    Args:
+        records (iterable): Dictionaries containing 'title' and a list of 'links'.
+        output_tsv (str): Path to the output .tsv file to be created.
+    """
     rows = []
     max_links = 0
 
-    for line in lines:
-        # Parse each line into a dict
-        data = ast.literal_eval(line)
-
+    # Stream the records one at a time
+    for data in records:
         # Main title field
         title = data.get("title")
         if title is None:
-            raise KeyError(f"Line missing 'title': {line}")
+            raise KeyError(f"Record missing 'title': {data}")
 
         # Extract list of links
         links = data.get("links", [])
@@ -0,0 +1,236 @@
+#!/usr/bin/python3
+
+import asyncio
+import json
+import random
+import threading
+import time
+import requests
+from collections import deque
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter shared by all concurrent requests.
+
+    Tokens are refilled at 'rate' per second up to 'capacity'. Each request
+    takes one token. A pause (e.g. from a Retry-After header) blocks all
+    requests until it has passed.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        """Block all requests for the given number of seconds."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class RetryableError(Exception):
+    """Raised for responses that should be retried after waiting."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+_local = threading.local()
+
+
+def getSession():
+    """
+    Return a requests session for the current worker thread.
+
+    Returns:
+        requests.Session: The thread-local session.
+    """
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def getJson(url, params, cache=None, timeout=60):
+    """
+    Perform a GET request and return the decoded JSON body.
+
+    Args:
+        url (str): API endpoint.
+        params (dict): Query parameters.
+        cache (http_cache.ResponseCache): Cache to store successful responses in, or None.
+        timeout (float): Request timeout in seconds.
+
+    Returns:
+        dict: The decoded JSON response.
+
+    Raises:
+        RetryableError: On HTTP 429/5xx or a MediaWiki maxlag error.
+    """
+    r = getSession().get(url=url, params=params, timeout=timeout)
+    retry_after = r.headers.get("Retry-After")
+    retry_after = float(retry_after) if retry_after and retry_after.isdigit() else None
+    if r.status_code == 429 or r.status_code >= 500:
+        raise RetryableError(f"HTTP {r.status_code}", retry_after)
+    data = r.json()
+    if data.get("error", {}).get("code") == "maxlag":
+        raise RetryableError(data["error"].get("info", "maxlag"), retry_after or 5)
+    if cache is not None and r.status_code == 200 and "error" not in data:
+        cache.put(url, params, r.text)
+    return data
+
+
+async def fetchJson(url, params, bucket, cache=None, retries=5, backoff=1.0):
+    """
+    Fetch a JSON response with rate limiting and retries with backoff.
+
+    Responses found in the cache are returned without taking a token.
+
+    Args:
+        url (str): API endpoint.
+        params (dict): Query parameters.
+        bucket (TokenBucket): Rate limiter shared by all requests.
+        cache (http_cache.ResponseCache): Response cache, or None.
+        retries (int): Maximum number of retries.
+        backoff (float): Base delay in seconds, doubled on every retry.
+
+    Returns:
+        dict: The decoded JSON response.
+    """
+    if cache is not None:
+        body = cache.get(url, params)
+        if body is not None:
+            return json.loads(body)
+    attempt = 0
+    while True:
+        await bucket.acquire()
+        try:
+            return await asyncio.to_thread(getJson, url, params, cache)
+        except (RetryableError, requests.RequestException, ValueError) as e:
+            if attempt >= retries:
+                raise
+            delay = backoff * 2 ** attempt + random.uniform(0, backoff)
+            if isinstance(e, RetryableError) and e.retry_after is not None:
+                # the server asks every client to slow down, so pause all requests
+                bucket.pause(e.retry_after)
+                delay = e.retry_after
+            attempt += 1
+            await asyncio.sleep(delay)
+
+
+async def fetchAllAsync(url, params_list, concurrency=8, rate=10, maxlag=5, cache=None, on_result=None):
+    """
+    Fetch JSON responses for a list of parameter sets concurrently.
+
+    When 'on_result' is given, it is called with the index and response of
+    each request as soon as it completes and the responses are not kept.
+
+    Args:
+        url (str): API endpoint.
+        params_list (list[dict]): Query parameters for each request.
+        concurrency (int): Maximum number of requests in flight.
+        rate (float): Maximum number of requests per second.
+        maxlag (int): MediaWiki maxlag value sent with each request, or None.
+        cache (http_cache.ResponseCache): Response cache, or None.
+        on_result (callable): Called as on_result(index, response), or None.
+
+    Returns:
+        list[dict]: The responses in the order of 'params_list', or None
+                    entries when 'on_result' is given.
+    """
+    bucket = TokenBucket(rate)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def worker(index, params):
+        if maxlag is not None:
+            params = {**params, "maxlag": maxlag}
+        async with semaphore:
+            response = await fetchJson(url, params, bucket, cache)
+        if on_result is None:
+            return response
+        on_result(index, response)
+
+    return await asyncio.gather(*(worker(index, params) for index, params in enumerate(params_list)))
+
+
+def fetchAll(url, params_list, concurrency=8, rate=10, maxlag=5, cache=None, on_result=None):
+    """
+    Synchronous wrapper around fetchAllAsync.
+
+    Args:
+        url (str): API endpoint.
+        params_list (list[dict]): Query parameters for each request.
+        concurrency (int): Maximum number of requests in flight.
+        rate (float): Maximum number of requests per second.
+        maxlag (int): MediaWiki maxlag value sent with each request, or None.
+        cache (http_cache.ResponseCache): Response cache, or None.
+        on_result (callable): Called as on_result(index, response), or None.
+
+    Returns:
+        list[dict]: The responses in the order of 'params_list', or None
+                    entries when 'on_result' is given.
+    """
+    return asyncio.run(fetchAllAsync(url, params_list, concurrency, rate, maxlag, cache, on_result))
+
+
+
+def iterFetch(url, params_iter, concurrency=8, rate=10, maxlag=5, cache=None):
+    """
+    Fetch JSON responses for a stream of parameter sets, yielding them in order.
+
+    All requests run on one event loop in a background thread and share one
+    TokenBucket, so the rate limit and any Retry-After or maxlag pause hold
+    for the whole stream. At most 'concurrency' requests are in flight or
+    waiting to be yielded, and a new one is started as soon as the oldest
+    response has been yielded, so a slow page does not hold up a whole batch.
+
+    Args:
+        url (str): API endpoint.
+        params_iter (iterable[dict]): Query parameters for each request, read lazily.
+        concurrency (int): Maximum number of requests in flight or buffered.
+        rate (float): Maximum number of requests per second.
+        maxlag (int): MediaWiki maxlag value sent with each request, or None.
+        cache (http_cache.ResponseCache): Response cache, or None.
+
+    Yields:
+        dict: The responses in the order of 'params_iter'.
+    """
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    bucket = TokenBucket(rate)
+    pending = deque()
+    try:
+        for params in params_iter:
+            if maxlag is not None:
+                params = {**params, "maxlag": maxlag}
+            pending.append(asyncio.run_coroutine_threadsafe(fetchJson(url, params, bucket, cache), loop))
+            if len(pending) == concurrency:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+        asyncio.run_coroutine_threadsafe(loop.shutdown_default_executor(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
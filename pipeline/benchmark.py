@@ -0,0 +1,514 @@
+#!/usr/bin/python3
+
+import argparse
+import gc
+import glob
+import html
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import requests
+import record_io
+import stub_api
+
+
+RESULTS_DIR = "data/benchmarks"
+SCALES = (1, 10, 100)
+
+# getInfo parses every page with BeautifulSoup, so its corpus starts from a sample
+HTML_PAGES = 500
+# output of get_contents.py; link extraction is also timed on it when present
+CONTENTS_FILE = "data/all_contents.txt"
+# pages requested from the stub server by the fetch benchmarks
+FETCH_PAGES = 200
+
+RESULT_PATTERNS = [
+    "../evaluation/data/results_poss_*.txt",
+    "../experiment/data/results_test_*.txt",
+]
+
+
+def scaleRecords(records, scale):
+    """
+    Build a synthetic corpus by repeating the records of a real one.
+
+    The records are shared, not copied, which is safe because no benchmarked
+    step modifies its input records.
+
+    Args:
+        records (list): The records of the real corpus.
+        scale (int): Number of times the corpus is repeated.
+
+    Returns:
+        list: 'scale' times as many records, in the same distribution.
+    """
+    return records * scale
+
+
+def pageHtml(load):
+    """
+    Render a disambiguation page with the links of a record, as returned by action=parse.
+
+    Args:
+        load (dict): Page record with 'title' and 'links'.
+
+    Returns:
+        str: HTML with one titled anchor per link, plus a file and a project
+             link that getInfo skips.
+    """
+    title = html.escape(load["title"])
+    items = "".join(
+        f'<li><a href="{html.escape(link["link"])}" title="{html.escape(link["title"])}">{html.escape(link["title"])}</a></li>'
+        for link in load["links"]
+    )
+    return (
+        f'<div class="mw-parser-output"><p><b>{title}</b> kan verwijzen naar:</p><ul>{items}</ul>'
+        f'<a href="/wiki/Bestand:Disambig.svg" title="Bestand:Disambig.svg"><img src="Disambig.svg"></a>'
+        f'<a href="/wiki/Wikipedia:Doorverwijspagina" title="Wikipedia:Doorverwijspagina">doorverwijspagina</a></div>'
+    )
+
+
+def contentFixtures(pages):
+    """
+    Build canned action=parse responses for the pages, in the format of stub_api.loadFixtures.
+
+    Args:
+        pages (list[dict]): Page records with 'title' and 'links'.
+
+    Returns:
+        list: {"params": {...}, "response": {...}} entries.
+    """
+    return [
+        {
+            "params": {"action": "parse", "page": load["title"], "format": "json"},
+            "response": {"parse": {"title": load["title"], "pageid": i, "text": {"*": pageHtml(load)}}},
+        }
+        for i, load in enumerate(pages)
+    ]
+
+
+def aspectFixtures(pages, days=30, batch_size=50):
+    """
+    Build canned query and wbgetentities responses for the related pages of get_aspects.getBatchInfo.
+
+    The responses are derived from the descriptions, categories and counts of
+    all_filtered2 records, with one Wikidata item per related page.
+
+    Args:
+        pages (list[dict]): Page records of all_filtered2.
+        days (int): Number of past days of the view counts.
+        batch_size (int): Maximum number of titles or IDs per request.
+
+    Returns:
+        tuple: The {"params", "response"} entries and the requested titles, in order.
+    """
+    info = {}
+    for load in pages:
+        for link in load["links"]:
+            info.setdefault(link["title"], link)
+    titles = list(info)
+
+    entries = []
+    ids = {title: f"Q{i + 1}" for i, title in enumerate(titles)}
+    for start in range(0, len(titles), batch_size):
+        batch = titles[start:start + batch_size]
+        found = {}
+        views = {}
+        for i, title in enumerate(batch, start=start):
+            link = info[title]
+            found[str(i + 1)] = {
+                "pageid": i + 1,
+                "title": title,
+                "pageprops": {"wikibase_item": ids[title]},
+                "categories": [{"title": "Categorie:" + category} for category in link["categories"]],
+            }
+            views[str(i + 1)] = {"pageid": i + 1, "title": title, "pageviews": {"2025-01-01": link["count"]}}
+        entries.append({
+            "params": {"action": "query", "titles": "|".join(batch), "format": "json",
+                       "prop": "pageprops|categories", "cllimit": "max"},
+            "response": {"query": {"pages": found}},
+        })
+        entries.append({
+            "params": {"action": "query", "titles": "|".join(batch), "format": "json",
+                       "prop": "pageviews", "pvipdays": days},
+            "response": {"query": {"pages": views}},
+        })
+        entries.append({
+            "params": {"action": "wbgetentities", "format": "json", "ids": "|".join(ids[title] for title in batch),
+                       "props": "descriptions", "languages": "nl"},
+            "response": {"entities": {ids[title]: {"descriptions": {"nl": {"value": info[title]["description"]}}} for title in batch}},
+        })
+    return entries, titles
+
+
+class ReplaySession:
+    """
+    Session that sends every GET request to a stub server, whatever its original endpoint.
+
+    The stub server answers on the query parameters alone, so the Wikipedia
+    and Wikidata requests of get_aspects are both replayed without changing
+    the hard-coded endpoints of that step.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.session = requests.Session()
+
+    def get(self, url=None, params=None, **kwargs):
+        return self.session.get(self.url, params=params, **kwargs)
+
+
+def timeBenchmark(function, rounds, max_time):
+    """
+    Time a benchmark function.
+
+    Rounds are repeated until 'rounds' rounds have run or 'max_time' seconds
+    have been spent, with at least one round, so large corpora stay affordable.
+
+    Args:
+        function (callable): The benchmark, called without arguments.
+        rounds (int): Maximum number of timed rounds.
+        max_time (float): Time budget in seconds after which no new round is started.
+
+    Returns:
+        list[float]: The duration of every round in seconds.
+    """
+    times = []
+    while len(times) < rounds and (not times or sum(times) < max_time):
+        gc.collect()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def pipelineBenchmarks(scale, tmp):
+    """
+    Define the benchmarks of the offline pipeline steps and scorers at one corpus scale.
+
+    Args:
+        scale (int): Number of times the corpora are repeated.
+        tmp (str): Directory for files written by the benchmarks.
+
+    Returns:
+        list: (name, items, function) tuples.
+    """
+    import annotations_out
+    import create_puzzles
+    import filter1
+    import filter2
+    import get_links
+
+    links = scaleRecords(list(record_io.readRecords("data/all_filtered1.txt")), scale)
+    aspects = scaleRecords(list(record_io.readRecords("data/all_filtered2.txt")), scale)
+    contents = scaleRecords([{"pageid": i, "title": load["title"], "text": pageHtml(load)} for i, load in enumerate(links[:HTML_PAGES])], scale)
+    with open("data/test_clues.txt", "r", encoding="utf-8") as f:
+        clues = scaleRecords(f.readlines(), scale)
+    wordnet_file = "dependencies/odwn-lemmas-unique.xml"
+
+    # export_to_tsv reads its input from a file
+    aspects_file = os.path.join(tmp, f"aspects_{scale}.txt")
+    record_io.writeRecords(aspects_file, aspects)
+    tsv_file = os.path.join(tmp, "annotations_out.tsv")
+
+    filtered = filter2.filterPages(aspects)
+    benchmarks = [
+        ("get_links.getInfo", len(contents), lambda: get_links.getInfo(contents)),
+        ("get_links.getInfo[lxml]", len(contents), lambda: get_links.getInfo(contents, "lxml")),
+        ("get_links.iterInfoParallel", len(contents), lambda: list(get_links.iterInfoParallel(contents))),
+        ("filter1.filterRelatedPagesCount", len(links), lambda: filter1.filterRelatedPagesCount(links)),
+        ("filter1.filterODWNAppearance", len(links), lambda: filter1.filterODWNAppearance(links, wordnet_file)),
+        ("filter1.filterMainPageTitleLenght", len(links), lambda: filter1.filterMainPageTitleLenght(links, 4)),
+        ("filter1.iterFilter", len(links), lambda: list(filter1.iterFilter(links, wordnet_file))),
+        ("filter2.filterRelatedPagesCount", len(aspects), lambda: filter2.filterRelatedPagesCount(aspects)),
+        ("filter2.filterRelatedPagesDescriptionExact", len(aspects), lambda: filter2.filterRelatedPagesDescriptionExact(aspects)),
+        ("filter2.filterRelatedPagesNoNumber", len(aspects), lambda: filter2.filterRelatedPagesNoNumber(aspects)),
+        ("filter2.filterRelatedPageCategory", len(aspects), lambda: filter2.filterRelatedPageCategory(aspects)),
+        ("filter2.filterAnswerInQuestion", len(aspects), lambda: filter2.filterAnswerInQuestion(aspects)),
+        ("filter2.filterSimilarAspects", len(aspects), lambda: filter2.filterSimilarAspects(aspects)),
+        ("filter2.filterSimilarAspects[fuzzy]", len(aspects), lambda: filter2.filterSimilarAspects(aspects, fuzzy=True)),
+        ("filter2.filterPersonRelevanceCountryDemonym", len(aspects), lambda: filter2.filterPersonRelevanceCountryDemonym(aspects, 3000)),
+        ("filter2.filterPersonRelevanceCountryName", len(aspects), lambda: filter2.filterPersonRelevanceCountryName(aspects, 3000)),
+        ("filter2.filterRelatedPagesDescriptionPartial", len(aspects), lambda: filter2.filterRelatedPagesDescriptionPartial(aspects)),
+        ("filter2.sortRelatedPages", len(filtered), lambda: filter2.sortRelatedPages(filtered)),
+        ("filter2.filterPages+sortRelatedPages", len(aspects), lambda: filter2.sortRelatedPages(filter2.filterPages(aspects))),
+        ("filter2.fusedFilter", len(aspects), lambda: list(filter2.fusedFilter(aspects))),
+        ("annotations_out.export_to_tsv", len(aspects), lambda: annotations_out.export_to_tsv(aspects_file, tsv_file)),
+        ("create_puzzles.generatePermutations", len(clues), lambda: create_puzzles.generatePermutations(clues)),
+    ]
+    return benchmarks + scorerBenchmarks(scale)
+
+
+def scorerBenchmarks(scale):
+    """
+    Define the benchmarks of the evaluation scorers on the result files, repeated 'scale' times.
+
+    Returns:
+        list: (name, items, function) tuples, empty if there are no result files.
+    """
+    # the evaluation scripts import each other by module name
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "evaluation"))
+    import pandas as pd
+    import matcher
+    import scoring
+
+    files = scoring.find_result_files(RESULT_PATTERNS)
+    if not files:
+        return []
+    table = pd.concat([scoring.load_table(files)] * scale, ignore_index=True)
+    answers = table["answer"].tolist()
+    results = table["result"].tolist()
+    word = matcher.Matcher()
+    scored = table.assign(correct=scoring.score(table["answer"], table["result"]))
+
+    def matchAll():
+        # a scoring run starts without the forms of any answer, so every round builds them again
+        matcher.answer_forms.cache_clear()
+        matcher.accented_letters.cache_clear()
+        return word.match_all(answers, results)
+
+    return [
+        ("scoring.score", len(table), lambda: scoring.score(table["answer"], table["result"])),
+        ("matcher.Matcher.match_all[cold]", len(table), matchAll),
+        ("scoring.report", len(table), lambda: scoring.report(scored)),
+    ]
+
+
+def contentsBenchmarks(file=CONTENTS_FILE):
+    """
+    Define the link extraction benchmarks on the full contents file, read from disk like the step itself.
+
+    Args:
+        file (str): Path to the output of get_contents.py.
+
+    Returns:
+        list: (name, items, function) tuples, empty if the file does not exist.
+    """
+    import get_links
+
+    if not os.path.exists(file):
+        return []
+    with record_io.openText(file, "r") as f:
+        pages = sum(1 for line in f if line.strip())
+    return [
+        ("get_links.iterInfo[all_contents]", pages, lambda: list(get_links.iterInfo(get_links.getData(file)))),
+        ("get_links.iterInfo[all_contents,lxml]", pages, lambda: list(get_links.iterInfo(get_links.getData(file), "lxml"))),
+        ("get_links.iterInfoParallel[all_contents]", pages, lambda: list(get_links.iterInfoParallel(get_links.getData(file)))),
+    ]
+
+
+def fetchBenchmarks(tmp):
+    """
+    Define the benchmarks of the fetch steps against a local stub server replaying canned responses.
+
+    Contents are fetched through async_fetch without a cache and from a warm
+    response cache; aspects through get_aspects.getBatchInfo, likewise.
+
+    Args:
+        tmp (str): Directory for the response caches.
+
+    Returns:
+        list: (name, items, function) tuples.
+    """
+    import async_fetch
+    import get_aspects
+    import http_cache
+
+    # measure the requests, not the local Wikidata and pageview indexes
+    os.environ["WIKIDATA_INDEX"] = os.path.join(tmp, "wikidata_nl.sqlite")
+    os.environ["PAGEVIEWS"] = os.path.join(tmp, "pageviews")
+
+    pages = list(record_io.readRecords("data/all_filtered1.txt"))[:FETCH_PAGES]
+    aspect_pages = list(record_io.readRecords("data/all_filtered2.txt"))[:FETCH_PAGES // 2]
+    entries, titles = aspectFixtures(aspect_pages)
+    fixtures = {stub_api.fixtureKey(entry["params"]): entry["response"] for entry in contentFixtures(pages) + entries}
+    server = stub_api.startServer(fixtures)
+    url = f"http://127.0.0.1:{server.server_address[1]}/w/api.php"
+
+    params_list = [{"action": "parse", "page": load["title"], "format": "json"} for load in pages]
+    content_cache = http_cache.ResponseCache(os.path.join(tmp, "contents.sqlite"))
+    async_fetch.fetchAll(url, params_list, rate=10000, cache=content_cache)
+    aspect_session = http_cache.CachedSession(http_cache.ResponseCache(os.path.join(tmp, "aspects.sqlite")), ReplaySession(url))
+    get_aspects.getBatchInfo(aspect_session, titles, 30)
+
+    return [
+        ("async_fetch.fetchAll[replay]", len(pages), lambda: async_fetch.fetchAll(url, params_list, rate=10000)),
+        ("async_fetch.fetchAll[cached]", len(pages), lambda: async_fetch.fetchAll(url, params_list, rate=10000, cache=content_cache)),
+        ("get_aspects.getBatchInfo[replay]", len(titles), lambda: get_aspects.getBatchInfo(ReplaySession(url), titles, 30)),
+        ("get_aspects.getBatchInfo[cached]", len(titles), lambda: get_aspects.getBatchInfo(aspect_session, titles, 30)),
+    ]
+
+
+def gitCommit():
+    """Return the short hash of the checked out commit, with '+' if the tree has changes, or 'unknown'."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("+" if dirty else "")
+
+
+def runBenchmarks(scales=SCALES, rounds=3, max_time=10.0, select=None, fetch=True):
+    """
+    Run all benchmarks and collect their timings.
+
+    Args:
+        scales (iterable[int]): Corpus scales of the offline benchmarks.
+        rounds (int): Maximum number of timed rounds per benchmark.
+        max_time (float): Time budget per benchmark in seconds, see timeBenchmark.
+        select (str): Only run benchmarks whose name contains this string, or None for all.
+        fetch (bool): Also run the fetch benchmarks against the stub server.
+
+    Returns:
+        dict: The run metadata and one entry per benchmark, as written by saveResults.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # the corpora of one scale are built only when its benchmarks run
+        groups = ((scale, lambda scale=scale: pipelineBenchmarks(scale, tmp)) for scale in scales)
+        groups = itertools.chain(groups, [(1, contentsBenchmarks)])
+        if fetch:
+            groups = itertools.chain(groups, [(1, lambda: fetchBenchmarks(tmp))])
+        for scale, define in groups:
+            benchmarks = define()
+            for name, items, function in benchmarks:
+                if select and select not in name:
+                    continue
+                times = timeBenchmark(function, rounds, max_time)
+                result = {
+                    "name": name,
+                    "scale": scale,
+                    "items": items,
+                    "rounds": len(times),
+                    "min": min(times),
+                    "median": statistics.median(times),
+                    "mean": statistics.mean(times),
+                }
+                results.append(result)
+                print(formatResult(result))
+    return {
+        "commit": gitCommit(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "benchmarks": results,
+    }
+
+
+def formatResult(result, previous=None):
+    """
+    Format one benchmark result as a table row, with the change against a previous run if given.
+
+    Args:
+        result (dict): Benchmark entry of runBenchmarks.
+        previous (dict): Entry of the same benchmark in an earlier run, or None.
+
+    Returns:
+        str: The table row.
+    """
+    key = f"{result['name']} [{result['scale']}x]"
+    rate = result["items"] / result["median"] if result["median"] > 0 else 0
+    row = f"{key:<52}{result['items']:>9}{result['median']:>11.4f}s{rate:>14.0f}/s"
+    if previous is not None:
+        row += f"{result['median'] / previous['median']:>9.2f}x"
+    return row
+
+
+def saveResults(run, directory=RESULTS_DIR):
+    """
+    Write the results of a run to a JSON file named after its date and commit.
+
+    Args:
+        run (dict): The results of runBenchmarks.
+        directory (str): Directory of the result files.
+
+    Returns:
+        str: Path of the written file.
+    """
+    os.makedirs(directory, exist_ok=True)
+    stamp = run["date"].replace(":", "").replace("-", "")
+    file = os.path.join(directory, f"{stamp}_{run['commit'].replace('+', '-dirty')}.json")
+    with open(file, "w", encoding="utf-8") as f:
+        json.dump(run, f, indent=2)
+    return file
+
+
+def latestResults(commit=None, directory=RESULTS_DIR):
+    """
+    Find the most recent result file, skipping those of a given commit.
+
+    Args:
+        commit (str): Commit whose results are skipped, e.g. the checked out one, or None.
+        directory (str): Directory of the result files.
+
+    Returns:
+        str: Path of the result file, or None.
+    """
+    for file in sorted(glob.glob(os.path.join(directory, "*.json")), reverse=True):
+        with open(file, "r", encoding="utf-8") as f:
+            if json.load(f)["commit"] != commit:
+                return file
+    return None
+
+
+def compareResults(run, baseline, threshold=1.2):
+    """
+    Print the results of a run next to those of an earlier run and list the regressions.
+
+    Args:
+        run (dict): The results of runBenchmarks.
+        baseline (dict): The results of an earlier run, e.g. of the previous commit.
+        threshold (float): Median slowdown from which a benchmark counts as a regression.
+
+    Returns:
+        list[str]: The benchmarks that regressed, as 'name [scale x]'.
+    """
+    previous = {(result["name"], result["scale"]): result for result in baseline["benchmarks"]}
+    print(f"\nCompared with {baseline['commit']} ({baseline['date']}), median time relative to then:")
+    regressions = []
+    for result in run["benchmarks"]:
+        old = previous.get((result["name"], result["scale"]))
+        print(formatResult(result, old))
+        if old is not None and result["median"] > old["median"] * threshold:
+            regressions.append(f"{result['name']} [{result['scale']}x]")
+    return regressions
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline steps and scorers on fixed fixtures")
+    parser.add_argument("--scales", type=int, nargs="+", default=list(SCALES), help="corpus scales, e.g. --scales 1 10")
+    parser.add_argument("--rounds", type=int, default=3, help="maximum number of timed rounds per benchmark")
+    parser.add_argument("--max-time", type=float, default=10.0, help="no new round after this many seconds per benchmark")
+    parser.add_argument("-k", dest="select", help="only run benchmarks whose name contains this string")
+    parser.add_argument("--no-fetch", action="store_true", help="skip the fetch benchmarks against the stub server")
+    parser.add_argument("--compare", nargs="?", const="latest", help="compare with a result file (default: the latest one of another commit)")
+    parser.add_argument("--threshold", type=float, default=1.2, help="slowdown that counts as a regression")
+    parser.add_argument("--fail", action="store_true", help="exit with status 1 if a benchmark regressed")
+    args = parser.parse_args()
+
+    baseline_file = latestResults(gitCommit()) if args.compare == "latest" else args.compare
+    print(f"{'benchmark':<52}{'items':>9}{'median':>12}{'throughput':>16}")
+    run = runBenchmarks(args.scales, args.rounds, args.max_time, args.select, not args.no_fetch)
+    print(f"\nResults written to {saveResults(run)}")
+
+    if args.compare:
+        if baseline_file is None:
+            print("No earlier results to compare with")
+            return
+        with open(baseline_file, "r", encoding="utf-8") as f:
+            regressions = compareResults(run, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.2f}x: " + ", ".join(regressions))
+            if args.fail:
+                sys.exit(1)
+
+if __name__ == "__main__":
+    main()
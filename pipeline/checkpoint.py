@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+
+import json
+import os
+import time
+
+
+class Journal:
+    """
+    Append-only checkpoint journal of completed page records.
+
+    Each completed record is written as one JSON line together with its key
+    (page ID or title) and flushed immediately, so a restarted run can skip
+    every page that was already completed. A partially written last line,
+    e.g. after a crash, is cut off before new records are appended.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.records = {}
+        if os.path.exists(file):
+            # offset after the last complete, newline-terminated line
+            end = 0
+            with open(file, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        entry = json.loads(line)
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        break
+                    self.records[entry["key"]] = entry["record"]
+                    end += len(line)
+            if end < os.path.getsize(file):
+                os.truncate(file, end)
+        self.f = open(file, "a", encoding="utf-8")
+
+    def __contains__(self, key):
+        return key in self.records
+
+    def __len__(self):
+        return len(self.records)
+
+    def append(self, key, record):
+        """
+        Record a completed page.
+
+        Args:
+            key: Page ID or title identifying the page.
+            record (dict): The completed page record.
+        """
+        self.records[key] = record
+        self.f.write(json.dumps({"key": key, "record": record}, ensure_ascii=False) + "\n")
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+    def remove(self):
+        """Close and delete the journal once its stage has written its output."""
+        self.close()
+        os.remove(self.file)
+
+
+class Progress:
+    """
+    Progress reporter with throughput and estimated time remaining.
+
+    Pages restored from a journal count towards the progress but not towards
+    the throughput, which only covers pages completed in this run.
+    """
+
+    def __init__(self, total, resumed=0, unit="pages"):
+        self.total = total
+        self.resumed = resumed
+        self.done = resumed
+        self.unit = unit
+        self.start = time.monotonic()
+        if resumed:
+            print(f"Resuming from {resumed}/{total} {unit} in journal")
+
+    def update(self, n=1):
+        """
+        Count completed items and print the progress.
+
+        Args:
+            n (int): Number of items completed since the last update.
+        """
+        self.done += n
+        elapsed = time.monotonic() - self.start
+        rate = (self.done - self.resumed) / elapsed if elapsed > 0 else 0
+        remaining = (self.total - self.done) / rate if rate > 0 else 0
+        eta = time.strftime("%H:%M:%S", time.gmtime(remaining))
+        print(f"{self.done}/{self.total} ({(self.done / self.total) * 100:.1f}%) {rate:.2f} {self.unit}/s, ETA {eta}")
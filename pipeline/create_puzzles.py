@@ -1,10 +1,10 @@
 #!/usr/bin/python3
 
 import requests
-import ast
 import json
 import os
 import random
+import record_io
 from dotenv import load_dotenv
 from itertools import permutations
 
@@ -61,7 +61,7 @@ def writePuzzle(data):
     """
     puzzles = []
     for page in data:
-        load = ast.literal_eval(page)
+        load = record_io.parseRecord(page)
         clues = (load["clue1"], load["clue2"], load["clue3"])
         answer = load["answer"]
         prompt = combineClues(*clues)
@@ -81,7 +81,7 @@ def generatePermutations(data):
     """
     permuted_sets = [[] for _ in range(6)]
     for page in data:
-        load = ast.literal_eval(page)
+        load = record_io.parseRecord(page)
         clues = (load["clue1"], load["clue2"], load["clue3"])
         answer = load["answer"]
         perms = list(permutations(clues))
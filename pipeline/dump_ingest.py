@@ -0,0 +1,509 @@
+#!/usr/bin/python3
+
+import argparse
+import bz2
+import glob
+import gzip
+import os
+import re
+import time
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import record_io
+from get_links import linkHref
+
+
+CATEGORY = "Wikipedia:Doorverwijspagina"
+CATEGORY_NAMESPACE = 14
+
+# one value of a row; quoted strings are matched as a whole, so commas inside them are skipped
+SQL_FIELD = re.compile(rb"'(?:[^'\\]|\\.)*'|[^,]+", re.DOTALL)
+# a quote escaped by an odd number of backslashes
+SQL_ESCAPED_QUOTE = re.compile(rb"(?<!\\)(?:\\\\)*\\'")
+SQL_ESCAPE = re.compile(rb"\\(.)", re.DOTALL)
+SQL_ESCAPES = {b"0": b"\0", b"b": b"\b", b"n": b"\n", b"r": b"\r", b"t": b"\t", b"Z": b"\x1a"}
+SQL_COLUMN = re.compile(rb"^\s+`(\w+)`")
+
+
+def findDumps(directory, date=None, wiki="nlwiki"):
+    """
+    Find the dump files of one dump date in a directory.
+
+    Args:
+        directory (str): Directory with the downloaded dump files.
+        date (str): Dump date, e.g. '20250601', or None for the latest date present.
+        wiki (str): Database name of the wiki.
+
+    Returns:
+        dict: Paths keyed on 'articles', 'index' (multistream index, or None),
+              'categorylinks', 'pagelinks' and 'linktarget' (or None).
+    """
+    if date is None:
+        dates = sorted(re.findall(rf"{wiki}-(\d{{8}})-", os.path.basename(file))[0]
+                       for file in glob.glob(os.path.join(directory, f"{wiki}-*-categorylinks.sql.gz")))
+        if not dates:
+            raise FileNotFoundError(f"No {wiki} categorylinks dump in {directory}")
+        date = dates[-1]
+
+    def dump(name, required=True):
+        file = os.path.join(directory, f"{wiki}-{date}-{name}")
+        if os.path.exists(file):
+            return file
+        if required:
+            raise FileNotFoundError(file)
+        return None
+
+    multistream = dump("pages-articles-multistream.xml.bz2", required=False)
+    return {
+        "date": date,
+        "articles": multistream or dump("pages-articles.xml.bz2"),
+        "index": dump("pages-articles-multistream-index.txt.bz2", required=False) if multistream else None,
+        "categorylinks": dump("categorylinks.sql.gz"),
+        "pagelinks": dump("pagelinks.sql.gz"),
+        "linktarget": dump("linktarget.sql.gz", required=False),
+    }
+
+
+def readColumns(file):
+    """
+    Read the column names of the table of an SQL dump from its CREATE TABLE statement.
+
+    Args:
+        file (str): Path to the .sql.gz dump.
+
+    Returns:
+        list[str]: The column names, in order.
+    """
+    columns = []
+    with gzip.open(file, "rb") as f:
+        for line in f:
+            if line.startswith(b"INSERT INTO"):
+                break
+            match = SQL_COLUMN.match(line)
+            if match:
+                columns.append(match.group(1).decode("ascii"))
+    return columns
+
+
+def iterInserts(file):
+    """
+    Yield the INSERT statements of an SQL dump, one line (thousands of rows) at a time.
+
+    Args:
+        file (str): Path to the .sql.gz dump.
+
+    Yields:
+        bytes: One INSERT statement.
+    """
+    with gzip.open(file, "rb") as f:
+        for line in f:
+            if line.startswith(b"INSERT INTO"):
+                yield line
+
+
+def sqlValue(token):
+    """Convert an SQL token to None, an int, a float or (unescaped) bytes."""
+    if token == b"NULL":
+        return None
+    if token[:1] == b"'":
+        return SQL_ESCAPE.sub(lambda match: SQL_ESCAPES.get(match.group(1), match.group(1)), token[1:-1])
+    try:
+        return int(token)
+    except ValueError:
+        return float(token)
+
+
+def iterRows(statement):
+    """
+    Yield the rows of an INSERT statement unparsed.
+
+    Args:
+        statement (bytes): An 'INSERT INTO `table` VALUES (...),(...);' line.
+
+    Yields:
+        bytes: The values of one row, e.g. b"12,0,'Aalborg'".
+    """
+    # splitting on the row separator is much faster than a regex over every
+    # character; a piece with an odd number of unescaped quotes was split
+    # inside a string and is joined with the next one
+    start = statement.index(b" VALUES (") + len(b" VALUES (")
+    end = statement.rindex(b")")
+    pending = None
+    for piece in statement[start:end].split(b"),("):
+        if pending is not None:
+            piece = pending + b"),(" + piece
+        quotes = piece.count(b"'")
+        if quotes and b"\\" in piece:
+            quotes -= len(SQL_ESCAPED_QUOTE.findall(piece))
+        if quotes % 2:
+            pending = piece
+            continue
+        pending = None
+        yield piece
+
+
+def parseRow(row):
+    """Parse the values of a row of iterRows, see sqlValue."""
+    return tuple(sqlValue(field) for field in SQL_FIELD.findall(row))
+
+
+# selection of the worker processes, set once per pool by startSelect
+_select = None
+
+
+def startSelect(key, values, output):
+    """Set the selection of selectRows in a worker process."""
+    global _select
+    needles = None
+    if len(values) <= 8 and all(isinstance(value, bytes) for value in values):
+        # a few strings: rows that do not contain any of them (escaped) are skipped unparsed
+        needles = [value.replace(b"\\", b"\\\\").replace(b"'", b"\\'") for value in values]
+    _select = (key, values, output, needles)
+
+
+def selectRows(statement):
+    """
+    Parse an INSERT statement and keep the rows whose key column is one of the selected values.
+
+    Only the selected rows are parsed completely. Rows are selected on their
+    first column without splitting the row, and on string columns after a
+    substring test.
+
+    Args:
+        statement (bytes): An INSERT statement.
+
+    Returns:
+        list[tuple]: The output columns of the selected rows.
+    """
+    key, values, output, needles = _select
+    selected = []
+    for row in iterRows(statement):
+        if needles is not None and not any(needle in row for needle in needles):
+            continue
+        if key == 0:
+            end = row.find(b",")
+            if sqlValue(row[:end] if end >= 0 else row) not in values:
+                continue
+        fields = parseRow(row)
+        if fields[key] in values:
+            selected.append(tuple(fields[i] for i in output))
+    return selected
+
+
+def parallelMap(function, items, workers, initializer=None, initargs=(), window=2):
+    """
+    Apply a function to items in a process pool and yield the results in order.
+
+    At most 'window' items per worker are in flight, so the input is streamed
+    with bounded memory.
+
+    Args:
+        function (callable): Picklable function of one item.
+        items (iterable): The items.
+        workers (int): Number of worker processes.
+        initializer (callable): Called with 'initargs' in every worker, or None.
+        initargs (tuple): Arguments of the initializer.
+        window (int): Number of items in flight per worker.
+
+    Yields:
+        The result of each item.
+    """
+    pending = deque()
+    with ProcessPoolExecutor(workers, initializer=initializer, initargs=initargs) as pool:
+        for item in items:
+            pending.append(pool.submit(function, item))
+            if len(pending) >= window * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def scanTable(file, key, values, output, workers):
+    """
+    Select rows of an SQL dump by the value of one column, parsing the statements in parallel.
+
+    Args:
+        file (str): Path to the .sql.gz dump.
+        key (str): Name of the column to select on.
+        values (iterable): Accepted values of the key column (ints or bytes).
+        output (list[str]): Names of the columns to return.
+        workers (int): Number of worker processes.
+
+    Yields:
+        tuple: The output columns of every selected row, in dump order.
+    """
+    columns = readColumns(file)
+    initargs = (columns.index(key), frozenset(values), [columns.index(name) for name in output])
+    for rows in parallelMap(selectRows, iterInserts(file), workers, startSelect, initargs):
+        yield from rows
+
+
+def categoryMembers(dumps, category=CATEGORY, workers=1):
+    """
+    Find the pages in a category from the categorylinks dump.
+
+    Both the schema with the category name in cl_to and the newer one with
+    cl_target_id pointing into the linktarget table are supported.
+
+    Args:
+        dumps (dict): Dump files, see findDumps.
+        category (str): Category name without the 'Categorie:' prefix.
+        workers (int): Number of worker processes.
+
+    Returns:
+        list[int]: Page IDs, in the order of the API (sort key, then page ID).
+    """
+    name = category.replace(" ", "_").encode("utf-8")
+    columns = readColumns(dumps["categorylinks"])
+    if "cl_to" in columns:
+        rows = scanTable(dumps["categorylinks"], "cl_to", [name], ["cl_from", "cl_sortkey"], workers)
+    else:
+        if dumps["linktarget"] is None:
+            raise FileNotFoundError("The categorylinks dump refers to the linktarget table, download its dump too")
+        targets = [lt_id for lt_id, namespace in scanTable(dumps["linktarget"], "lt_title", [name], ["lt_id", "lt_namespace"], workers)
+                   if namespace == CATEGORY_NAMESPACE]
+        rows = scanTable(dumps["categorylinks"], "cl_target_id", targets, ["cl_from", "cl_sortkey"], workers)
+    members = sorted((sortkey, page) for page, sortkey in rows)
+    return [page for _, page in members]
+
+
+def pageLinks(dumps, pages, workers=1):
+    """
+    Collect the links to articles (namespace 0) of pages from the pagelinks dump.
+
+    Both the schema with pl_namespace/pl_title and the newer one with
+    pl_target_id pointing into the linktarget table are supported.
+
+    Args:
+        dumps (dict): Dump files, see findDumps.
+        pages (iterable[int]): IDs of the pages whose links are needed.
+        workers (int): Number of worker processes.
+
+    Returns:
+        dict: Page ID to the sorted titles (with spaces) of the pages it links to.
+    """
+    columns = readColumns(dumps["pagelinks"])
+    links = {}
+    if "pl_title" in columns:
+        for page, namespace, title in scanTable(dumps["pagelinks"], "pl_from", pages, ["pl_from", "pl_namespace", "pl_title"], workers):
+            if namespace == 0:
+                links.setdefault(page, []).append(title)
+    else:
+        if dumps["linktarget"] is None:
+            raise FileNotFoundError("The pagelinks dump refers to the linktarget table, download its dump too")
+        targets = {}
+        for page, target in scanTable(dumps["pagelinks"], "pl_from", pages, ["pl_from", "pl_target_id"], workers):
+            targets.setdefault(page, []).append(target)
+        titles = {}
+        wanted = {target for page_targets in targets.values() for target in page_targets}
+        for target, namespace, title in scanTable(dumps["linktarget"], "lt_id", wanted, ["lt_id", "lt_namespace", "lt_title"], workers):
+            if namespace == 0:
+                titles[target] = title
+        for page, page_targets in targets.items():
+            links[page] = [titles[target] for target in page_targets if target in titles]
+    # the API lists the links of a page sorted by title
+    return {page: [title.decode("utf-8").replace("_", " ") for title in sorted(set(titles))] for page, titles in links.items()}
+
+
+def parsePages(xml, wanted):
+    """
+    Parse the <page> elements of a piece of the articles dump and keep the wanted pages.
+
+    Args:
+        xml (bytes): One or more complete <page> elements.
+        wanted (set[int]): IDs of the pages to keep.
+
+    Returns:
+        list[dict]: Records with 'pageid', 'ns', 'title' and 'text' (wikitext).
+    """
+    pages = []
+    for page in ET.fromstring(b"<pages>" + xml + b"</pages>").iter("page"):
+        pageid = int(page.findtext("id"))
+        if pageid in wanted:
+            text = page.findtext("revision/text") or ""
+            pages.append({"pageid": pageid, "ns": int(page.findtext("ns")), "title": page.findtext("title"), "text": text})
+    return pages
+
+
+# articles dump and wanted page IDs of the worker processes, set once per pool by startArticles
+_articles = None
+
+
+def startArticles(file, wanted):
+    """Set the articles dump and the wanted pages of readStreams in a worker process."""
+    global _articles
+    _articles = (file, wanted)
+
+
+def readStreams(offsets):
+    """
+    Decompress a range of streams of the multistream articles dump and parse the wanted pages.
+
+    Args:
+        offsets (tuple): Start offset of the first stream and end offset of the
+                         last, None for the end of the dump.
+
+    Returns:
+        list[dict]: Records of parsePages.
+    """
+    file, wanted = _articles
+    start, end = offsets
+    with open(file, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start if end is not None else -1)
+    xml = bz2.decompress(data)
+    if end is None:
+        # the last stream closes the dump
+        xml = xml.replace(b"</mediawiki>", b"")
+    return parsePages(xml, wanted)
+
+
+def readIndex(file, pages):
+    """
+    Find the streams of the multistream articles dump that contain the given pages.
+
+    Args:
+        file (str): Path to the multistream index (offset:pageid:title per line).
+        pages (set[int]): Page IDs to look for.
+
+    Returns:
+        list[tuple]: Sorted (start, end) offsets of the streams, end None for the last stream.
+    """
+    offsets = []
+    needed = set()
+    with bz2.open(file, "rt", encoding="utf-8") as f:
+        for line in f:
+            offset, pageid, _ = line.split(":", 2)
+            offset = int(offset)
+            if not offsets or offsets[-1] != offset:
+                offsets.append(offset)
+            if int(pageid) in pages:
+                needed.add(offset)
+    ends = dict(zip(offsets, offsets[1:]))
+    return [(offset, ends.get(offset)) for offset in sorted(needed)]
+
+
+def iterArticles(dumps, pages, workers=1, batch=8):
+    """
+    Yield the wikitext of the given pages from the articles dump.
+
+    With a multistream dump and its index, only the streams that contain the
+    pages are read and they are decompressed and parsed in parallel, 'batch'
+    streams per task. Otherwise the dump is decompressed and parsed in one pass.
+
+    Args:
+        dumps (dict): Dump files, see findDumps.
+        pages (set[int]): Page IDs to look for.
+        workers (int): Number of worker processes.
+        batch (int): Number of consecutive streams per task.
+
+    Yields:
+        dict: Records with 'pageid', 'ns', 'title' and 'text', in dump order.
+    """
+    pages = frozenset(pages)
+    file = dumps["articles"]
+    if dumps["index"] is None:
+        with bz2.open(file, "rb") as f:
+            for _, element in ET.iterparse(f, events=("end",)):
+                if element.tag.rsplit("}", 1)[-1] != "page":
+                    continue
+                # the dump uses the MediaWiki export namespace on every element
+                namespace = element.tag[:-len("page")]
+                pageid = int(element.findtext(f"{namespace}id"))
+                if pageid in pages:
+                    text = element.findtext(f"{namespace}revision/{namespace}text") or ""
+                    yield {"pageid": pageid, "ns": int(element.findtext(f"{namespace}ns")), "title": element.findtext(f"{namespace}title"), "text": text}
+                element.clear()
+        return
+
+    # merge runs of adjacent streams into one task
+    tasks = []
+    for start, end in readIndex(dumps["index"], pages):
+        if tasks and tasks[-1][1] == start and tasks[-1][2] < batch:
+            tasks[-1][1] = end
+            tasks[-1][2] += 1
+        else:
+            tasks.append([start, end, 1])
+    offsets = ((start, end) for start, end, _ in tasks)
+    for records in parallelMap(readStreams, offsets, workers, startArticles, (file, pages)):
+        yield from records
+
+
+def ingestDumps(dumps, category=CATEGORY, workers=1, wikitext=None):
+    """
+    Build the records of get_pages and get_links for the pages of a category from local dumps.
+
+    The members come from the categorylinks dump, their titles from the
+    articles dump and their links to articles from the pagelinks dump, so the
+    result only depends on the dump date. The links are sorted by title, like
+    those of get_links.iterApiLinks.
+
+    Args:
+        dumps (dict): Dump files, see findDumps.
+        category (str): Category name without the 'Categorie:' prefix.
+        workers (int): Number of worker processes.
+        wikitext (str): Also write the wikitext of every member to this file, in dump order, or None.
+
+    Returns:
+        tuple: The page records ('pageid', 'ns', 'title') in category order and
+               the link records ('pageid', 'title', 'links') of the pages with links.
+    """
+    start = time.time()
+    members = categoryMembers(dumps, category, workers)
+    print(f"{len(members)} pages in Categorie:{category} ({time.time() - start:.0f}s)")
+
+    titles = {}
+
+    def articles():
+        for page in iterArticles(dumps, members, workers):
+            titles[page["pageid"]] = (page["ns"], page["title"])
+            yield page
+
+    if wikitext is None:
+        for _ in articles():
+            pass
+    else:
+        record_io.writeRecords(wikitext, articles())
+    missing = len(members) - len(titles)
+    print(f"{len(titles)} pages found in the articles dump, {missing} missing ({time.time() - start:.0f}s)")
+
+    links = pageLinks(dumps, titles, workers)
+    print(f"{sum(len(page_links) for page_links in links.values())} links ({time.time() - start:.0f}s)")
+
+    pages = []
+    info = []
+    for pageid in members:
+        if pageid not in titles:
+            continue
+        ns, title = titles[pageid]
+        pages.append({"pageid": pageid, "ns": ns, "title": title})
+        if links.get(pageid):
+            info.append({"pageid": pageid, "title": title, "links": [{"title": link, "link": linkHref(link)} for link in links[pageid]]})
+    return pages, info
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Build all_pages.txt and all_links.txt from local Wikipedia dumps")
+    parser.add_argument("--dumps", default="dumps", help="directory with the nlwiki dump files")
+    parser.add_argument("--date", help="dump date, e.g. 20250601 (default: the latest in the directory)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--wikitext", action="store_true", help="also write the wikitext of the pages to data/all_wikitext.txt")
+    args = parser.parse_args()
+
+    # define in- and output
+    dumps = findDumps(args.dumps, args.date)
+    pages_file = "data/all_pages.txt"
+    links_file = "data/all_links.txt"
+    print(f"Reading the nlwiki dumps of {dumps['date']}")
+
+    # get the pages of the disambiguation category and their links
+    pages, info = ingestDumps(dumps, workers=args.workers, wikitext="data/all_wikitext.txt" if args.wikitext else None)
+
+    # write data to file
+    record_io.writeRecords(pages_file, pages)
+    record_io.writeRecords(links_file, info)
+
+if __name__ == "__main__":
+    main()
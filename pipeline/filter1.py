@@ -1,72 +1,31 @@
 #!/usr/bin/python3
 
-import requests
-import ast
-import json
-import os
-from dotenv import load_dotenv
-from bs4 import BeautifulSoup
-
-
-def startSession(username, password):
-    """
-    Log in to the MediaWiki API using a session.
-
-    Args:
-        username: Wiki username.
-        password: Wiki password.
-
-    Raises:
-        AssertionError: If login does not succeed.
-    """
-    s = requests.Session()
-    url = "https://www.mediawiki.org/w/api.php"
-    params_token = {
-        'action':"query",
-        'meta':"tokens",
-        'type':"login",
-        'format':"json"
-    }
-    r = s.get(url=url, params=params_token)
-    data = r.json()
-    login_token = data['query']['tokens']['logintoken']
-    params_login = {
-        'action': "login",
-        'lgname': username,
-        'lgpassword': password,
-        'lgtoken': login_token,
-        'format': "json"
-    }
-    r = s.post(url, data=params_login)
-    data = r.json()
+import lemma_index
+import record_io
 
 
 def getData(file):
     """
-    Read lines from a file and return them as a list of strings.
+    Lazily read the records of a file written by the previous step.
 
     Args:
-        file: Path to the input file.
+        file: Path to the input file (JSON lines, legacy dict lines, .zst, .parquet or .arrow).
 
     Returns:
-        A list of strings, each representing a line from the file.
+        A generator of record dicts.
     """
-    f = open(file, "r")
-    pages = f.readlines()
-    return pages
+    return record_io.readRecords(file)
 
 
 def writeData(file, data):
     """
-    Write each item in a list to a new line in a file.
+    Write each record in a list to a file, as JSON lines unless the extension says otherwise.
 
     Args:
-        file: Path to the output file.
-        data: List of items to write (will be stringified).
+        file: Path to the output file (.txt/.jsonl, .zst, .parquet or .arrow).
+        data: Iterable of record dicts to write.
     """
-    with open(file, 'w') as f:
-        for line in data:
-            f.write(f"{line}\n")
+    record_io.writeRecords(file, data)
 
 
 def filterRelatedPagesCount(data):
@@ -74,7 +33,7 @@ def filterRelatedPagesCount(data):
     Filter pages that have at least a minimum number of related links.
 
     Args:
-        data (list): List of stringified dicts, each containing a "links" key
+        data (iterable): Page records, each containing a "links" key
                      which is a list of related link dicts.
 
     Returns:
@@ -83,7 +42,7 @@ def filterRelatedPagesCount(data):
     """
     filtered = []
     for page in data:
-        load = ast.literal_eval(page)
+        load = record_io.parseRecord(page)
         links = load["links"]
         page_count = len(links)
         if page_count >= 3:
@@ -96,8 +55,8 @@ def filterODWNAppearance(data, file):
     """
     Retain only pages whose titles appear in the Open Dutch WordNet.
 
-    This function loads an ODWNet XML file, extracts all lemma "writtenForm"
-    values, and filters 'data' (a list of page dicts) to those whose titles
+    This function loads the (cached) index of all lemma "writtenForm" values
+    of an ODWNet XML file, and filters 'data' (a list of page dicts) to those whose titles
     match a lemma in the wordnet (case-insensitive).
 
     Args:
@@ -107,22 +66,7 @@ def filterODWNAppearance(data, file):
     Returns:
         list: Subset of 'data' where page titles appear in the wordnet.
     """
-    # open Open Dutch WordNet XML file and get all Lemma elements
-    with open(file, 'r') as f:
-        text = f.read()
-    soup = BeautifulSoup(text, "xml")
-    elements = soup.find_all('Lemma')
-
-    # get value from attribute writtenForm from all Lemma tags
-    all_words = []
-    for item in elements:
-        info = item.attrs
-        if "writtenForm" in info:      
-            word = info["writtenForm"]
-            all_words.append(word.lower())
-    
-    # only save unique words
-    all_words = list(set(all_words))
+    all_words = loadWordnet(file)
 
     # filter all filtered pages on appearance within Open Dutch WordNet
     filtered = []
@@ -133,6 +77,21 @@ def filterODWNAppearance(data, file):
     return filtered
 
 
+def loadWordnet(file):
+    """
+    Load the index of lowercased lemma "writtenForm" values of an Open Dutch WordNet XML file.
+
+    The index is built once and cached in data/ (see lemma_index).
+
+    Args:
+        file (str): Path to the Open Dutch WordNet XML file.
+
+    Returns:
+        lemma_index.LemmaIndex: Set-like index of the lemmas.
+    """
+    return lemma_index.loadIndex(file)
+
+
 def filterMainPageTitleLenght(data, length):
     """
     Filter pages whose titles meet a minimum length requirement.
@@ -152,23 +111,38 @@ def filterMainPageTitleLenght(data, length):
     return filtered
 
 
-def main():
+def iterFilter(data, wordnet_file, length=4):
+    """
+    Yield the pages that pass all filters of this step, one page at a time.
+
+    Applies the same conditions as filterRelatedPagesCount, filterODWNAppearance
+    and filterMainPageTitleLenght, in that order.
+
+    Args:
+        data (iterable): Page records with "title" and "links".
+        wordnet_file (str): Path to the Open Dutch WordNet XML file.
+        length (int): Minimum number of characters required in the title.
 
-    # define API credentials
-    load_dotenv()
-    username = os.getenv("USERNAME")
-    password = os.getenv("PASSWORD")
+    Yields:
+        dict: Page records with keys "title" and "links".
+    """
+    all_words = loadWordnet(wordnet_file)
+    for page in data:
+        load = record_io.parseRecord(page)
+        if len(load["links"]) < 3:
+            continue
+        if load["title"].lower() not in all_words:
+            continue
+        if len(load["title"]) >= length:
+            yield {"title": load["title"], "links": load["links"]}
 
-    if not username or not password:
-        raise EnvironmentError("USERNAME and PASSWORD must be set in .env file")
+
+def main():
 
     # define in- and output
     infile = 'data/all_links.txt'
     outfile = 'data/all_filtered1.txt'
 
-    # start session
-    startSession(username, password)
-
     # get data from file
     data = getData(infile)
 
@@ -1,71 +1,34 @@
 #!/usr/bin/python3
 
-import requests
-import ast
-import json
-import os
-from dotenv import load_dotenv
-
-
-def startSession(username, password):
-    """
-    Log in to the MediaWiki API using a session.
-
-    Args:
-        username: Wiki username.
-        password: Wiki password.
-
-    Raises:
-        AssertionError: If login does not succeed.
-    """
-    s = requests.Session()
-    url = "https://www.mediawiki.org/w/api.php"
-    params_token = {
-        'action':"query",
-        'meta':"tokens",
-        'type':"login",
-        'format':"json"
-    }
-    r = s.get(url=url, params=params_token)
-    data = r.json()
-    login_token = data['query']['tokens']['logintoken']
-    params_login = {
-        'action': "login",
-        'lgname': username,
-        'lgpassword': password,
-        'lgtoken': login_token,
-        'format': "json"
-    }
-    r = s.post(url, data=params_login)
-    data = r.json()
+import re
+import time
+from collections import Counter
+import record_io
+from rules import loadRules
 
 
 def getData(file):
     """
-    Read lines from a file and return them as a list of strings.
+    Lazily read the records of a file written by the previous step.
 
     Args:
-        file: Path to the input file.
+        file: Path to the input file (JSON lines, legacy dict lines, .zst, .parquet or .arrow).
 
     Returns:
-        A list of strings, each representing a line from the file.
+        A generator of record dicts.
     """
-    f = open(file, "r")
-    pages = f.readlines()
-    return pages
+    return record_io.readRecords(file)
 
 
 def writeData(file, data):
     """
-    Write each item in a list to a new line in a file.
+    Write each record in a list to a file, as JSON lines unless the extension says otherwise.
 
     Args:
-        file: Path to the output file.
-        data: List of items to write (will be stringified).
+        file: Path to the output file (.txt/.jsonl, .zst, .parquet or .arrow).
+        data: Iterable of record dicts to write.
     """
-    with open(file, 'w') as f:
-        for line in data:
-            f.write(f"{line}\n")
+    record_io.writeRecords(file, data)
 
 
 def filterRelatedPagesCount(data):
@@ -73,14 +36,14 @@ def filterRelatedPagesCount(data):
     Filters pages that have at least 3 related links.
 
     Args:
-        data (list): List of pages as stringified dictionaries with 'title' and 'links'.
+        data (iterable): Page records with 'title' and 'links'.
 
     Returns:
         list: Filtered list of dictionaries with 'title' and 'links' keys.
     """
     filtered = []
     for page in data:
-        load = ast.literal_eval(page)
+        load = record_io.parseRecord(page)
         links = load["links"]
         page_count = len(links)
         if page_count >= 3:
@@ -120,41 +83,24 @@ def filterRelatedPagesDescriptionExact(data):
     Returns:
         list: Updated list with filtered links.
     """
-    exact = [
-        None,
-        "Wikimedia-lijst",
-        "gemeenschappelijk project om een \u200b\u200bmeertalig woordenboek te maken",
-        "Wikimedia-doorverwijspagina",
-        "algemeen",
-        "Nederland",
-        "jaar",
-        "rivier",
-        "gemeente",
-        "nummer",
-        "stad",
-        "regio",
-        "provincie",
-        "historisch land",
-        "streek",
-        "gebied",
-        "taxon",
-        "kalenderjaar",
-        "decennium",
-        "Londen"
-    ]
+    rules = loadRules()
     filtered = []
     for page in data:
         load = page
         links = load["links"]
         new_links = []
         for link in links:
-            aspect = link["description"]
-            if all(word != aspect for word in exact):
+            if keepDescriptionExact(link, rules):
                 new_links.append(link)
         filtered.append({"title": load["title"], "links": new_links})
     return filtered
 
 
+def keepDescriptionExact(link, rules):
+    """Link predicate of filterRelatedPagesDescriptionExact."""
+    return not rules.isExactDescription(link["description"])
+
+
 def filterRelatedPagesDescriptionPartial(data):
     """
     Removes links whose descriptions partially match predefined patterns.
@@ -165,73 +111,24 @@ def filterRelatedPagesDescriptionPartial(data):
     Returns:
         list: Updated list with filtered links.
     """
-    part = [
-        "soort uit ",
-        "buurtschap ",
-        "gemeente ",
-        "schip uit ",
-        "geslacht uit ",
-        "familie uit ",
-        "stad in ",
-        "provincie van ",
-        "provincie in ",
-        "plein in ",
-        "boek van ",
-        "eiland van ",
-        "straat in ",
-        "geslacht van ",
-        "plaats in ",
-        "gebouw in ",
-        "stadsdeel in ",
-        "land in ",
-        "park in ",
-        "hoofdstad van ",
-        "museum in ",
-        "familie van ",
-        "orde van ",
-        "deelstaat van ",
-        "district van ",
-        "wijk in ",
-        "regio in ",
-        "buurt in ",
-        "regio van ",
-        "SI-prefix ",
-        "kanaal in ",
-        "streek in ",
-        "departement in ",
-        "staat in ",
-        "haven in ",
-        "gebied in ",
-        "meer in ",
-        "rivier in ",
-        "staat van ",
-        "gebied van ",
-        "woonbuurt in ",
-        "metrolijn in ",
-        "heuvel in ",
-        "windmolen in ",
-        "bouwwerk in ",
-        "politieke partij uit ",
-        "wijk van ",
-        "beek in ",
-        "dierentuin in ",
-        "politieke partij in ",
-        "taal.",
-        "familienaam"
-    ]
+    rules = loadRules()
     filtered = []
     for page in data:
         load = page
         links = load["links"]
         new_links = []
         for link in links:
-            aspect = link["description"] + "."
-            if all(word not in aspect.lower() for word in part):
+            if keepDescriptionPartial(link, rules):
                 new_links.append(link)  
         filtered.append({"title": load["title"], "links": new_links})
     return filtered
 
 
+def keepDescriptionPartial(link, rules):
+    """Link predicate of filterRelatedPagesDescriptionPartial."""
+    return not rules.hasPartialDescription(link["description"])
+
+
 def filterPersonRelevanceCountryDemonym(data, threshold):
     """
     Keeps links with a demonym mention if their count is above a threshold.
@@ -243,58 +140,26 @@ def filterPersonRelevanceCountryDemonym(data, threshold):
     Returns:
         list: Filtered data with links related to nationalities if relevant.
     """
-    list = [
-        "nederlands",
-        "belgisch",
-        "duits",
-        "amerikaans",
-        "portugees",
-        "indiaas",
-        "brits",
-        "spaans",
-        "frans",
-        "turks",
-        "mexicaans",
-        "vlaams",
-        "italiaans",
-        "deens",
-        "zweeds",
-        "hongaars",
-        "engels",
-        "fries",
-        "zuid-afrikaans",
-        "braziliaans",
-        "canadees",
-        "iraans",
-        "oostenrijks",
-        "luxemburgs",
-        "surinaams",
-        "russisch",
-        "iers",
-        "zwitsers",
-        "romeins",
-        "portuges",
-        "surinaams",
-        "ivoriaans",
-        "kazachstaans"
-    ]
+    rules = loadRules()
     filtered = []
     for page in data:
         load = page
         links = load["links"]
         new_links = []
         for link in links:
-            aspect = link["description"]
-            aspect_low = aspect.lower()
-            if any(word in aspect_low for word in list):
-                count = link["count"]
-                if count >= threshold:
-                    new_links.append(link)
-            else:
-                new_links.append(link)      
+            if keepDemonym(link, rules, threshold):
+                new_links.append(link)
         filtered.append({"title": load["title"], "links": new_links})
     return filtered
-    
+
+
+def keepDemonym(link, rules, threshold):
+    """Link predicate of filterPersonRelevanceCountryDemonym."""
+    if rules.hasDemonym(link["description"]):
+        return link["count"] >= threshold
+    return True
+
+
 def filterPersonRelevanceCountryName(data, threshold):
     """
     Filters links based on whether a country name is mentioned in a specific format.
@@ -306,36 +171,36 @@ def filterPersonRelevanceCountryName(data, threshold):
     Returns:
         list: Filtered list of dictionaries.
     """
-    countries_file = "dependencies/dutch_country_names.txt"
-    f = open(countries_file, "r")
-    countries = f.read().splitlines()
-    
+    countries = loadRules().countries
+
     filtered = []
     for page in data:
         load = page
         links = load["links"]
         new_links = []
         for link in links:
-            aspect = link["description"]
-            aspect_split = aspect.split()
-            if len(aspect_split) >= 3:
-                if aspect_split[1] == "uit" and aspect_split[2] in countries and len(aspect_split) >= 3 and "(" in aspect and ")" in aspect:
-                    count = link["count"]
-                    if count >= threshold:
-                        new_links.append(link)
-                else:
-                    if aspect_split[1] == "uit" and aspect_split[2] in countries and len(aspect_split) >= 3:
-                        count = link["count"]
-                        if count >= 350:
-                            new_links.append(link)
-                    else:
-                        new_links.append(link)
-            else:
-                new_links.append(link)      
+            if keepCountryName(link, countries, threshold):
+                new_links.append(link)
         filtered.append({"title": load["title"], "links": new_links})
     return filtered
 
 
+def keepCountryName(link, countries, threshold):
+    """
+    Link predicate of filterPersonRelevanceCountryName.
+
+    Descriptions of the form '<x> uit <country> ...' need a count of at least
+    'threshold' when they contain parentheses (e.g. years), and at least 350 otherwise.
+    """
+    aspect = link["description"]
+    aspect_split = aspect.split()
+    if len(aspect_split) < 3 or aspect_split[1] != "uit" or aspect_split[2] not in countries:
+        return True
+    if "(" in aspect and ")" in aspect:
+        return link["count"] >= threshold
+    return link["count"] >= 350
+
+
 def filterRelatedPagesNoNumber(data):
     """
     Removes links where the description consists only of digits.
@@ -352,14 +217,18 @@ def filterRelatedPagesNoNumber(data):
         links = load["links"]
         new_links = []
         for link in links:
-            aspect = link["description"]
-            aspect = aspect.replace("-", "")
-            if str(aspect).isdigit() != True:
+            if keepNoNumber(link):
                 new_links.append(link)
         filtered.append({"title": load["title"], "links": new_links})
     return filtered
 
 
+def keepNoNumber(link):
+    """Link predicate of filterRelatedPagesNoNumber."""
+    aspect = link["description"].replace("-", "")
+    return str(aspect).isdigit() != True
+
+
 def filterRelatedPageCategory(data):
     """
     Filters out links belonging to certain undesired Wikipedia categories.
@@ -370,33 +239,32 @@ def filterRelatedPageCategory(data):
     Returns:
         list: Filtered pages excluding specified categories.
     """
+    rules = loadRules()
     filtered = []
     for page in data:
         load = page
-        links = load["links"]
-        excluded = [
-            "Muziekalbum ",
-            "Film ",
-            "Plaats ",
-            "Gemeente ",
-            "County ",
-            "Wijk ",
-            "Parochie "
-        ]
-        present = 0
-        new_links = []
-        for link in links:
-            categories = link["categories"]
-            for exclude in excluded:
-                for category in categories:
-                    if exclude.lower() in category.lower():
-                        present = 1
-            if present != 1:
-                new_links.append(link)
+        new_links = dropExcludedCategory(load["links"], rules)
         filtered.append({"title": load["title"], "links": new_links})
     return filtered
 
 
+def dropExcludedCategory(links, rules):
+    """
+    Links function of filterRelatedPageCategory.
+
+    Once a link with an excluded category is found, it and the remaining links
+    of the page are dropped.
+    """
+    present = 0
+    new_links = []
+    for link in links:
+        if rules.hasExcludedCategory(link["categories"]):
+            present = 1
+        if present != 1:
+            new_links.append(link)
+    return new_links
+
+
 def sortRelatedPages(data):
     """
     Sorts links for each page in descending order by 'count'.
@@ -418,12 +286,13 @@ def sortRelatedPages(data):
     return filtered
 
 
-def filterSimilarAspects(data):
+def filterSimilarAspects(data, fuzzy=False):
     """
     Removes duplicate descriptions from the same page's links (case-insensitive).
 
     Args:
         data (list): List of page dictionaries with 'title' and 'links'.
+        fuzzy (bool): Also treat near-duplicates as duplicates, see fuzzyAspectKey.
 
     Returns:
         list: Filtered list without duplicated aspect descriptions.
@@ -431,28 +300,48 @@ def filterSimilarAspects(data):
     filtered = []
     for page in data:
         load = page
-        links = load["links"]
-        aspects = []
-        compare = []
-        for link in links:
-            aspect = link["description"]
-            aspects.append(aspect)
-            compare.append(aspect)
-        new_links = []
-        i = 0
-        for aspect in aspects:
-            present = 0
-            for comp in compare:
-                if aspect.lower() == comp.lower():
-                    present += 1
-            if present == 1:
-                new_links.append(links[i])
-            compare[i] = ""
-            i += 1
+        new_links = dropSimilarAspects(load["links"], fuzzy)
         filtered.append({"title": load["title"], "links": new_links})
     return filtered
 
 
+def fuzzyAspectKey(aspect):
+    """
+    Reduce a description to the set of its lightly stemmed words.
+
+    Word order, case, punctuation and the inflected adjective ending -e are
+    ignored, so "Nederlands voetballer" and "Nederlandse voetballer" get the same key.
+
+    Args:
+        aspect (str): The description.
+
+    Returns:
+        frozenset: The stemmed words of the description.
+    """
+    words = re.findall(r"\w+", aspect.lower())
+    return frozenset(word[:-1] if len(word) > 3 and word.endswith("e") else word for word in words)
+
+
+def dropSimilarAspects(links, fuzzy=False):
+    """
+    Links function of filterSimilarAspects.
+
+    Of every group of duplicate descriptions only the last link is kept, as
+    in the original pairwise comparison. The remaining occurrences of every
+    description are counted in a hash map, so a page takes linear time.
+    """
+    key = fuzzyAspectKey if fuzzy else str.lower
+    keys = [key(link["description"]) for link in links]
+    remaining = Counter(keys)
+    new_links = []
+    for i, link in enumerate(links):
+        remaining[keys[i]] -= 1
+        # empty descriptions also matched the descriptions that were already compared
+        if remaining[keys[i]] == 0 and (link["description"] != "" or i == 0):
+            new_links.append(link)
+    return new_links
+
+
 def filterAnswerInQuestion(data):
     """
     Removes links that contain the answer (page title) in their description.
@@ -470,33 +359,27 @@ def filterAnswerInQuestion(data):
         answer = load["title"]
         new_links = []
         for link in links:
-            aspect = link["description"]
-            if answer.lower() not in aspect.lower():
+            if keepAnswerNotInQuestion(link, answer):
                 new_links.append(link)
         filtered.append({"title": load["title"], "links": new_links})
     return filtered
 
 
-def main():
-
-    # define API credentials
-    load_dotenv()
-    username = os.getenv("USERNAME")
-    password = os.getenv("PASSWORD")
-
-    if not username or not password:
-        raise EnvironmentError("USERNAME and PASSWORD must be set in .env file")
+def keepAnswerNotInQuestion(link, answer):
+    """Link predicate of filterAnswerInQuestion."""
+    return answer.lower() not in link["description"].lower()
 
-    # start session
-    startSession(username, password)
 
-    # define in- and output
-    infile = "data/all_aspects.txt"
-    outfile = 'data/all_filtered2.txt'
+def filterPages(data):
+    """
+    Apply all filters of this step, in order, without sorting.
 
-    # get data from file
-    data = getData(infile)
+    Args:
+        data (iterable): Page records with 'title' and 'links'.
 
+    Returns:
+        list: Filtered list of dictionaries with 'title' and 'links' keys.
+    """
     # filter by related page count
     filtered = filterRelatedPagesCount(data)
 
@@ -526,12 +409,176 @@ def main():
 
     # filter by related page count
     filtered = filterRelatedPagesCountParsed(filtered)
+    return filtered
+
+
+def filterStages(threshold=3000, min_links=3, fuzzy=False):
+    """
+    Describe the filters of filterPages and sortRelatedPages as stages of the fused executor.
+
+    A "link" stage is a predicate fn(link, page) that returns whether a link is kept.
+    A "links" stage is a function fn(links, page) that returns the new list of links,
+    or None to drop the whole page.
+
+    Args:
+        threshold (int): Page view threshold of the person relevance filters.
+        min_links (int): Minimum number of related links of a page.
+        fuzzy (bool): Also drop near-duplicate descriptions, see fuzzyAspectKey.
+
+    Returns:
+        list: (name, kind, function) tuples, in the order of filterPages.
+    """
+    rules = loadRules()
+
+    def enoughLinks(links, load):
+        return links if len(links) >= min_links else None
+
+    return [
+        ("related page count", "links", enoughLinks),
+        ("description exact", "link", lambda link, load: keepDescriptionExact(link, rules)),
+        ("description number", "link", lambda link, load: keepNoNumber(link)),
+        ("category", "links", lambda links, load: dropExcludedCategory(links, rules)),
+        ("answer in question", "link", lambda link, load: keepAnswerNotInQuestion(link, load["title"])),
+        ("similar aspects", "links", lambda links, load: dropSimilarAspects(links, fuzzy)),
+        ("country demonym", "link", lambda link, load: keepDemonym(link, rules, threshold)),
+        ("country name", "link", lambda link, load: keepCountryName(link, rules.countries, threshold)),
+        ("description partial", "link", lambda link, load: keepDescriptionPartial(link, rules)),
+        ("related page count parsed", "links", enoughLinks),
+        ("sort by count", "links", lambda links, load: sorted(links, key=lambda d: d['count'], reverse=True)),
+    ]
+
+
+def fuseStages(stages):
+    """
+    Group consecutive link predicates, so each link passes through them in one go.
+
+    Args:
+        stages (list): (name, kind, function) tuples, see filterStages.
+
+    Returns:
+        list: ("link", [(name, predicate), ...]) and ("links", name, function) segments.
+    """
+    segments = []
+    for name, kind, function in stages:
+        if kind == "link":
+            if segments and segments[-1][0] == "link":
+                segments[-1][1].append((name, function))
+            else:
+                segments.append(("link", [(name, function)]))
+        else:
+            segments.append(("links", name, function))
+    return segments
+
+
+def fusedFilter(data, stages=None, stats=None, profile=False):
+    """
+    Apply all filters and the sort in a single pass over the pages.
 
-    # sort related pages by page view count
-    filtered = sortRelatedPages(filtered)
+    Consecutive link predicates are fused, so every link is tested once per
+    segment and dropped at the first predicate that rejects it, without
+    building an intermediate list of pages per filter.
+
+    Args:
+        data (iterable): Page records with 'title' and 'links'.
+        stages (list): (name, kind, function) tuples, filterStages() by default.
+        stats (dict): Optional dict that collects per stage the dropped links,
+                      dropped pages and time spent.
+        profile (bool): Also time every link predicate call; "links" stages are always timed.
+
+    Yields:
+        dict: The same records as filterPages followed by sortRelatedPages.
+    """
+    if stages is None:
+        stages = filterStages()
+    if stats is None:
+        stats = {}
+    for name, _, _ in stages:
+        stats.setdefault(name, {"links": 0, "pages": 0, "seconds": 0.0})
+    segments = fuseStages(stages)
+    clock = time.perf_counter
+
+    number = 0
+    for page in data:
+        load = record_io.parseRecord(page)
+        links = load["links"]
+        for segment in segments:
+            if segment[0] == "link":
+                predicates = segment[1]
+                kept = []
+                for link in links:
+                    for name, predicate in predicates:
+                        if profile:
+                            start = clock()
+                            keep = predicate(link, load)
+                            stats[name]["seconds"] += clock() - start
+                        else:
+                            keep = predicate(link, load)
+                        if not keep:
+                            stats[name]["links"] += 1
+                            break
+                    else:
+                        kept.append(link)
+                links = kept
+            else:
+                _, name, function = segment
+                start = clock()
+                result = function(links, load)
+                stats[name]["seconds"] += clock() - start
+                if result is None:
+                    stats[name]["pages"] += 1
+                    links = None
+                    break
+                stats[name]["links"] += len(links) - len(result)
+                links = result
+        if links is None:
+            continue
+        number += 1
+        yield {"number": number, "title": load["title"], "links": links}
+
+
+def printFilterStats(stats):
+    """
+    Print the dropped links, dropped pages and time spent per filter stage.
+
+    Args:
+        stats (dict): Stats collected by fusedFilter.
+    """
+    print(f"{'filter':<28}{'links':>10}{'pages':>10}{'seconds':>10}")
+    for name, stat in stats.items():
+        print(f"{name:<28}{stat['links']:>10}{stat['pages']:>10}{stat['seconds']:>10.3f}")
+
+
+def iterFilter(data):
+    """
+    Yield the filtered and sorted pages one at a time.
+
+    Args:
+        data (iterable): Page records with 'title' and 'links'.
+
+    Yields:
+        dict: The same records as filterPages followed by sortRelatedPages.
+    """
+    yield from fusedFilter(data)
+
+
+def main():
+
+    # define in- and output
+    infile = "data/all_aspects.txt"
+    outfile = 'data/all_filtered2.txt'
+
+    # get data from file
+    data = getData(infile)
+
+    # apply all filters and sort related pages by page view count in a single pass
+    stats = {}
+    filtered = fusedFilter(data, stats=stats, profile=True)
 
     # write data to file
     writeData(outfile, filtered)
 
+    # report what each filter dropped
+    printFilterStats(stats)
+
 if __name__ == "__main__":
     main()
@@ -1,9 +1,14 @@
 #!/usr/bin/python3
 
 import requests
-import ast
 import json
 import os
+import argparse
+import checkpoint
+import http_cache
+import pageview_index
+import record_io
+import wikidata_index
 from dotenv import load_dotenv
 
 
@@ -42,30 +47,26 @@ def startSession(username, password):
 
 def getData(file):
     """
-    Read lines from a file and return them as a list of strings.
+    Read the records of a file written by the previous step.
 
     Args:
-        file: Path to the input file.
+        file: Path to the input file (JSON lines, legacy dict lines, .zst, .parquet or .arrow).
 
     Returns:
-        A list of strings, each representing a line from the file.
+        A list of record dicts.
     """
-    f = open(file, "r")
-    pages = f.readlines()
-    return pages
+    return list(record_io.readRecords(file))
 
 
 def writeData(file, data):
     """
-    Write each item in a list to a new line in a file.
+    Write each record in a list to a file, as JSON lines unless the extension says otherwise.
 
     Args:
-        file: Path to the output file.
-        data: List of items to write (will be stringified).
+        file: Path to the output file (.txt/.jsonl, .zst, .parquet or .arrow).
+        data: Iterable of record dicts to write.
     """
-    with open(file, 'w') as f:
-        for line in data:
-            f.write(f"{line}\n")
+    record_io.writeRecords(file, data)
 
 
 def displayInfo(link, load, result_desc, result_cats, new_links):
@@ -101,6 +102,8 @@ def getDescription(page):
     This function queries the Wikipedia API for page properties to find the
     Wikibase item ID, then retrieves the nl-language description from the
     Wikidata API. If no description is available, returns 'No description'.
+    When a Wikidata index has been built with wikidata_index.py, the
+    description is looked up there instead, without any request.
 
     Args:
         page (dict): A dict with keys 'title' and 'link' representing a related page.
@@ -111,6 +114,10 @@ def getDescription(page):
     title = page["title"]
     links = page["link"]
 
+    index = wikidata_index.getIndex()
+    if index is not None:
+        return index.description(title)
+
     URL_NL = 'https://nl.wikipedia.org/w/api.php'
     PARAMS_NL = {
     "action": "query",
@@ -119,7 +126,7 @@ def getDescription(page):
     "prop": "pageprops"
     }
 
-    s = requests.Session()
+    s = http_cache.getSession()
     r = s.get(url=URL_NL, params=PARAMS_NL)
     data = r.json()
     page = next(iter(data['query']['pages'].values()))
@@ -136,7 +143,7 @@ def getDescription(page):
             "languages": "nl"
             }
 
-            response = requests.get(wikidata_url, params=params).json()
+            response = s.get(wikidata_url, params=params).json()
             description = response['entities'][id]['descriptions']
 
             if "nl" in description:
@@ -172,27 +179,41 @@ def getCategory(page):
     "format": "json",
     "prop": "categories"
     }
-    s = requests.Session()
+    s = http_cache.getSession()
     r = s.get(url=URL_NL, params=PARAMS_NL)
     data = r.json()
     page = next(iter(data['query']['pages'].values()))
-    cats = []
     if "categories" in page:
-        for item in page["categories"]:
-            if not item["title"].startswith("Categorie:Wikipedia") or item["title"].startswith("Categorie:Wikimedia"):
-                cats.append(item["title"].replace('Categorie:', ''))
-        return cats
+        return cleanCategories(page["categories"])
     else:
         return []
 
 
+def cleanCategories(categories):
+    """
+    Strip the 'Categorie:' prefix from category records, skipping Wikipedia categories.
+
+    Args:
+        categories (list[dict]): Category records as returned by prop=categories.
+
+    Returns:
+        list[str]: The remaining category names.
+    """
+    cats = []
+    for item in categories:
+        if not item["title"].startswith("Categorie:Wikipedia") or item["title"].startswith("Categorie:Wikimedia"):
+            cats.append(item["title"].replace('Categorie:', ''))
+    return cats
+
+
 def getRelatedPageViewCount(title, days):
     """
     Sum the page views for a Wikipedia page over a given number of days.
 
     This function queries the Wikipedia API for the pageviews property and
     returns the total views over the past 'days' days. If data is missing,
-    returns 0.
+    returns 0. When hourly pageview dumps have been ingested with
+    pageview_index.py, the views are counted there instead, without any request.
 
     Args:
         title (str): The title of the Wikipedia page.
@@ -201,6 +222,10 @@ def getRelatedPageViewCount(title, days):
     Returns:
         int: Total pageview count over the specified period, or 0 on error.
     """
+    index = pageview_index.getIndex()
+    if index is not None:
+        return index.count(title, days)
+
     URL_NL = 'https://nl.wikipedia.org/w/api.php'
     PARAMS_NL = {
     "action": "query",
@@ -210,7 +235,7 @@ def getRelatedPageViewCount(title, days):
     "pvipdays": days
     }
 
-    s = requests.Session()
+    s = http_cache.getSession()
     r = s.get(url=URL_NL, params=PARAMS_NL)
     data = r.json()
     try:
@@ -232,14 +257,14 @@ def getInfo(data):
     Process a list of pages, retrieving descriptions, categories, and view counts
     for each linked page, and assemble the enriched data.
 
-    For each page in data (stringified dict with 'title' and 'links'), this function:
-      - Evaluates the string to a dict record
+    For each page in data (record with 'title' and 'links'), this function:
+      - Parses the record line if it is not parsed yet
       - For each related link, fetches its description, categories, and 30-day view count
       - Includes only links with both a description and at least one category
       - Appends the processed links to the parent page record
 
     Args:
-        data (list[str]): List of stringified dicts, each containing 'title' and 'links'.
+        data (list[dict]): List of page records, each containing 'title' and 'links'.
 
     Returns:
         list[dict]: List of dicts with keys 'title' and 'links', where 'links' is a list
@@ -248,7 +273,7 @@ def getInfo(data):
     i = 0
     full_pages = []
     for page in data:
-        load = ast.literal_eval(page)
+        load = record_io.parseRecord(page)
         # get information for each related page
         new_links = []
         for link in load["links"]:
@@ -269,8 +294,268 @@ def getInfo(data):
     return full_pages
 
 
+def queryPages(session, url, params):
+    """
+    Run a query for several pages at once and follow all continuation tokens.
+
+    Results of continued requests are merged into the page record they belong
+    to: lists (e.g. categories) are extended and dicts (e.g. pageprops,
+    pageviews) are updated.
+
+    Args:
+        session (http_cache.CachedSession): Session used for the requests.
+        url (str): API endpoint.
+        params (dict): Query parameters, including 'titles'.
+
+    Returns:
+        tuple: A dict of page records keyed by page title, and a dict mapping
+               requested titles to their normalized form.
+    """
+    params = dict(params)
+    pages = {}
+    normalized = {}
+    while True:
+        r = session.get(url=url, params=params)
+        data = r.json()
+        query = data.get("query", {})
+        for item in query.get("normalized", []):
+            normalized[item["from"]] = item["to"]
+        for page in query.get("pages", {}).values():
+            merged = pages.setdefault(page["title"], {})
+            for key, value in page.items():
+                if isinstance(value, list):
+                    merged.setdefault(key, []).extend(value)
+                elif isinstance(value, dict):
+                    merged.setdefault(key, {}).update(value)
+                else:
+                    merged[key] = value
+        if "continue" not in data:
+            break
+        params.update(data["continue"])
+    return pages, normalized
+
+
+def getBatchDescriptions(session, ids, batch_size=50):
+    """
+    Retrieve the Dutch Wikidata descriptions for several items at once.
+
+    When a Wikidata index has been built with wikidata_index.py, the
+    descriptions are looked up there instead of requested.
+
+    Args:
+        session (http_cache.CachedSession): Session used for the requests.
+        ids (list[str]): Wikidata item IDs.
+        batch_size (int): Maximum number of IDs per wbgetentities call.
+
+    Returns:
+        dict: Mapping of item ID to its Dutch description. Items without one are left out.
+    """
+    index = wikidata_index.getIndex()
+    if index is not None:
+        return index.descriptions(ids)
+
+    wikidata_url = "https://www.wikidata.org/w/api.php"
+    descriptions = {}
+    for start in range(0, len(ids), batch_size):
+        params = {
+        "action": "wbgetentities",
+        "format": "json",
+        "ids": "|".join(ids[start:start + batch_size]),
+        "props": "descriptions",
+        "languages": "nl"
+        }
+        response = session.get(wikidata_url, params=params).json()
+        for id, entity in response.get("entities", {}).items():
+            description = entity.get("descriptions", {})
+            if "nl" in description:
+                descriptions[id] = description["nl"]["value"]
+    return descriptions
+
+
+def getBatchInfo(session, titles, days, batch_size=50):
+    """
+    Retrieve description, categories and view count for several related pages at once.
+
+    Page properties and categories are requested together in one query per
+    'batch_size' titles and page views in another, so that the response
+    cache can keep the former for a week and the latter for a day. After
+    that, all Wikidata descriptions are requested per 'batch_size' item IDs. The results match those of
+    getDescription, getCategory and getRelatedPageViewCount for each title.
+    When hourly pageview dumps have been ingested with pageview_index.py,
+    page views are not requested but counted there.
+
+    Args:
+        session (http_cache.CachedSession): Session used for the requests.
+        titles (list[str]): Titles of the related pages.
+        days (int): Number of past days to include in the view count.
+        batch_size (int): Maximum number of titles or IDs per request.
+
+    Returns:
+        dict: Mapping of title to a dict with keys 'description', 'categories' and 'count'.
+    """
+    URL_NL = 'https://nl.wikipedia.org/w/api.php'
+    views = pageview_index.getIndex()
+    found = {}
+    for start in range(0, len(titles), batch_size):
+        batch = titles[start:start + batch_size]
+        PARAMS_NL = {
+        "action": "query",
+        "titles": "|".join(batch),
+        "format": "json",
+        "prop": "pageprops|categories",
+        "cllimit": "max"
+        }
+        pages, normalized = queryPages(session, URL_NL, PARAMS_NL)
+        if views is None:
+            PARAMS_PV = {
+            "action": "query",
+            "titles": "|".join(batch),
+            "format": "json",
+            "prop": "pageviews",
+            "pvipdays": days
+            }
+            counts, _ = queryPages(session, URL_NL, PARAMS_PV)
+            for title, page in counts.items():
+                pages.setdefault(title, {})["pageviews"] = page.get("pageviews", {})
+        for title in batch:
+            found[title] = pages.get(normalized.get(title, title), {})
+
+    ids = []
+    for page in found.values():
+        id = page.get("pageprops", {}).get("wikibase_item")
+        if id and id not in ids:
+            ids.append(id)
+    descriptions = getBatchDescriptions(session, ids, batch_size)
+
+    info = {}
+    for title, page in found.items():
+        # mirror getDescription, which returns None for pages that have
+        # page properties but no Wikidata item
+        if "pageprops" in page:
+            if "wikibase_item" in page["pageprops"]:
+                desc = descriptions.get(page["pageprops"]["wikibase_item"], "No description")
+            else:
+                desc = None
+        else:
+            desc = "No description"
+
+        # a single prop=categories request only returns the first 10 categories
+        cats = cleanCategories(page.get("categories", [])[:10])
+
+        if views is not None:
+            count = views.count(page.get("title", title), days)
+        else:
+            count = 0
+            for item in page.get("pageviews", {}).values():
+                if item is not None:
+                    count = count + item
+
+        info[title] = {"description": desc, "categories": cats, "count": count}
+    return info
+
+
+def enrichPages(data, batch_size=50, days=30):
+    """
+    Yield enriched page records, retrieving the related page info in batches.
+
+    Pages are buffered until their related pages add up to at least
+    'batch_size' unseen titles, so that requests are filled across pages.
+    Titles shared between pages are only requested once. The yielded records
+    are identical to those produced by getInfo.
+
+    Args:
+        data (iterable[dict]): Page records, each containing 'title' and 'links'.
+        batch_size (int): Maximum number of titles or IDs per request.
+        days (int): Number of past days to include in the view count.
+
+    Yields:
+        dict: Page record with keys 'title' and 'links', where 'links' is a list
+              of dicts with 'title', 'link', 'description', 'categories', and 'count'.
+    """
+    s = http_cache.getSession()
+    info = {}
+    pending = []
+    queued = []
+    for page in data:
+        load = record_io.parseRecord(page)
+        pending.append(load)
+        for link in load["links"]:
+            if link["title"] not in info and link["title"] not in queued:
+                queued.append(link["title"])
+        if len(queued) < batch_size:
+            continue
+
+        info.update(getBatchInfo(s, queued, days, batch_size))
+        queued = []
+        for load in pending:
+            yield buildPage(load, info)
+        pending = []
+
+    if queued:
+        info.update(getBatchInfo(s, queued, days, batch_size))
+    for load in pending:
+        yield buildPage(load, info)
+
+
+def buildPage(load, info):
+    """
+    Assemble a page record from its related links and their retrieved info.
+
+    Args:
+        load (dict): The parent page record with 'title' and 'links'.
+        info (dict): Mapping of related page title to its retrieved info.
+
+    Returns:
+        dict: Page record with keys 'title' and 'links'. Only links with both a
+              description and at least one category are included.
+    """
+    new_links = []
+    for link in load["links"]:
+        result = info[link["title"]]
+        if result["description"] != "No description" and result["categories"] != []:
+            new_row = {"title": link["title"], "link": link["link"], "description": result["description"], "categories": result["categories"], "count": result["count"]}
+            new_links.append(new_row)
+    return {"title": load["title"], "links": new_links}
+
+
+def getInfoBatched(data, batch_size=50, journal=None, days=30):
+    """
+    Batched variant of getInfo that needs far fewer API requests.
+
+    When a journal is given, every completed page is added to it and pages
+    already in the journal are not requested again.
+
+    Args:
+        data (list[dict]): List of page records, each containing 'title' and 'links'.
+        batch_size (int): Maximum number of titles or IDs per request.
+        journal (checkpoint.Journal): Journal of completed pages keyed on title, or None.
+        days (int): Number of past days to include in the view count.
+
+    Returns:
+        list[dict]: The same records as getInfo.
+    """
+    done = {} if journal is None else journal.records
+    titles = [record_io.parseRecord(page)["title"] for page in data]
+    todo = [page for page, title in zip(data, titles) if title not in done]
+    progress = checkpoint.Progress(len(data), len(data) - len(todo))
+
+    for page in enrichPages(todo, batch_size, days):
+        if journal is None:
+            done[page["title"]] = page
+        else:
+            journal.append(page["title"], page)
+        # update and display progress
+        progress.update()
+
+    return [done[title] for title in titles]
+
+
 def main():
 
+    parser = argparse.ArgumentParser(description="Get the description, categories and view count of the related pages")
+    parser.add_argument("--days", type=int, default=30, help="number of past days of the view count")
+    args = parser.parse_args()
+
     # define API credentials
     load_dotenv()
     username = os.getenv("USERNAME")
@@ -289,11 +574,15 @@ def main():
     # get data from file
     data = getData(infile)
 
-    # get description and category for each related page for each main page
-    info = getInfo(data)
+    # get description and category for each related page for each main page,
+    # resuming from the journal of an interrupted run
+    journal = checkpoint.Journal(outfile + ".journal")
+    info = getInfoBatched(data, journal=journal, days=args.days)
 
     # write data to file
     writeData(outfile, info)
+    journal.remove()
+    http_cache.printStats()
 
 if __name__ == "__main__":
     main()
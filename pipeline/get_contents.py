@@ -1,10 +1,14 @@
 #!/usr/bin/python3
 
 import requests
-import ast
 import json
 import os
+import checkpoint
+import http_cache
+import record_io
+from collections import deque
 from dotenv import load_dotenv
+from async_fetch import fetchAll, iterFetch
 
 
 def startSession(username, password):
@@ -42,30 +46,26 @@ def startSession(username, password):
 
 def getData(file):
     """
-    Read lines from a file and return them as a list of strings.
+    Read the records of a file written by the previous step.
 
     Args:
-        file: Path to the input file.
+        file: Path to the input file (JSON lines, legacy dict lines, .zst, .parquet or .arrow).
 
     Returns:
-        A list of strings, each representing a line from the file.
+        A list of record dicts.
     """
-    f = open(file, "r")
-    pages = f.readlines()
-    return pages
+    return list(record_io.readRecords(file))
 
 
 def writeData(file, data):
     """
-    Write each item in a list to a new line in a file.
+    Write each record in a list to a file, as JSON lines unless the extension says otherwise.
 
     Args:
-        file: Path to the output file.
-        data: List of items to write (will be stringified).
+        file: Path to the output file (.txt/.jsonl, .zst, .parquet or .arrow).
+        data: Iterable of record dicts to write.
     """
-    with open(file, 'w') as f:
-        for line in data:
-            f.write(f"{line}\n")
+    record_io.writeRecords(file, data)
 
 
 def getContent(data):
@@ -73,7 +73,7 @@ def getContent(data):
     Fetch and parse the full HTML content of each Wikipedia page in data.
 
     Args:
-        data: List of page records as dictionaries (with keys 'pageid' and 'title').
+        data: List of page records (with keys 'pageid' and 'title').
 
     Returns:
         A list of dictionaries, each containing:
@@ -81,12 +81,12 @@ def getContent(data):
             'title': The page title.
             'text': The raw HTML content of the page.
     """
-    s = requests.Session()
+    s = http_cache.getSession()
     URL_NL = 'https://nl.wikipedia.org/w/api.php'
     i = 0
     full_list = []
     for page in data:
-        load = ast.literal_eval(page)
+        load = record_io.parseRecord(page)
         page_id = load["pageid"]
         title = load["title"]
         
@@ -105,6 +105,77 @@ def getContent(data):
     return full_list
 
 
+def getContentConcurrent(data, concurrency=8, rate=10, url='https://nl.wikipedia.org/w/api.php', journal=None):
+    """
+    Fetch the HTML content of each Wikipedia page in data using concurrent requests.
+
+    Requests are rate limited, honour maxlag and Retry-After, and are retried
+    with backoff. The results are returned in the order of the input. When a
+    journal is given, every completed page is added to it and pages already
+    in the journal are not requested again.
+
+    Args:
+        data: List of page records as dictionaries (with keys 'pageid' and 'title').
+        concurrency: Maximum number of requests in flight.
+        rate: Maximum number of requests per second.
+        url: API endpoint, e.g. a local stub server.
+        journal: Journal of completed pages keyed on page ID (checkpoint.Journal), or None.
+
+    Returns:
+        The same list of dictionaries as getContent.
+    """
+    pages = [record_io.parseRecord(page) for page in data]
+    done = {} if journal is None else journal.records
+    todo = [load for load in pages if load["pageid"] not in done]
+    progress = checkpoint.Progress(len(pages), len(pages) - len(todo))
+
+    def onResult(index, response):
+        load = todo[index]
+        text = response["parse"]["text"]["*"]
+        record = {"pageid": load["pageid"], "title": load["title"], "text": text}
+        if journal is None:
+            done[load["pageid"]] = record
+        else:
+            journal.append(load["pageid"], record)
+        progress.update()
+
+    params_list = [{"action": "parse", "page": load["title"], "format": "json"} for load in todo]
+    fetchAll(url, params_list, concurrency, rate, cache=http_cache.getCache(), on_result=onResult)
+
+    return [done[load["pageid"]] for load in pages]
+
+
+def iterContent(data, window=8, rate=10, url='https://nl.wikipedia.org/w/api.php'):
+    """
+    Yield the HTML content of each Wikipedia page in data, one page at a time.
+
+    Pages are fetched concurrently, at most 'window' at a time, so at most
+    that many HTML documents are held in memory. The rate limit holds for the
+    whole stream (see async_fetch.iterFetch).
+
+    Args:
+        data: Iterable of page records (with keys 'pageid' and 'title').
+        window: Maximum number of pages fetched concurrently.
+        rate: Maximum number of requests per second.
+        url: API endpoint, e.g. a local stub server.
+
+    Yields:
+        The same dictionaries as getContent, in input order.
+    """
+    # the pages whose requests have been started, in order
+    loads = deque()
+
+    def paramsIter():
+        for page in data:
+            load = record_io.parseRecord(page)
+            loads.append(load)
+            yield {"action": "parse", "page": load["title"], "format": "json"}
+
+    for response in iterFetch(url, paramsIter(), window, rate, cache=http_cache.getCache()):
+        load = loads.popleft()
+        yield {"pageid": load["pageid"], "title": load["title"], "text": response["parse"]["text"]["*"]}
+
+
 def main():
 
     # define API credentials
@@ -125,11 +196,14 @@ def main():
     # get data from file
     data = getData(infile)
 
-    # get contents (HTML) from Wikipedia pages
-    content = getContent(data)
+    # get contents (HTML) from Wikipedia pages, resuming from the journal of an interrupted run
+    journal = checkpoint.Journal(outfile + ".journal")
+    content = getContentConcurrent(data, journal=journal)
 
     # write data to file
     writeData(outfile, content)
+    journal.remove()
+    http_cache.printStats()
 
 if __name__ == "__main__":
     main()
@@ -1,90 +1,371 @@
 #!/usr/bin/python3
 
+import argparse
+import os
 import requests
-import ast
+import lxml.etree
+import lxml.html
+import http_cache
+import record_io
 from bs4 import BeautifulSoup
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from urllib.parse import quote, unquote
 
 
 def getData(file):
     """
-    Read lines from a file and return them as a list of strings.
+    Lazily read the records of a file written by the previous step.
 
     Args:
-        file: Path to the input file.
+        file: Path to the input file (JSON lines, legacy dict lines, .zst, .parquet or .arrow).
 
     Returns:
-        A list of strings, each representing a line from the file.
+        A generator of record dicts.
     """
-    f = open(file, "r")
-    pages = f.readlines()
-    return pages
+    return record_io.readRecords(file)
 
 
 def writeData(file, data):
     """
-    Write each item in a list to a new line in a file.
+    Write each record in a list to a file, as JSON lines unless the extension says otherwise.
 
     Args:
-        file: Path to the output file.
-        data: List of items to write (will be stringified).
+        file: Path to the output file (.txt/.jsonl, .zst, .parquet or .arrow).
+        data: Iterable of record dicts to write.
     """
-    with open(file, 'w') as f:
-        for line in data:
-            f.write(f"{line}\n")
+    record_io.writeRecords(file, data)
 
 
-def getInfo(data):
+def getInfo(data, parser="bs4"):
     """
     Extract valid internal Wikipedia links from page HTML content.
 
     Args:
-        data: List of stringified dict records. Each record must contain
+        data: Iterable of page records. Each record must contain
               the keys 'pageid', 'title', and 'text' (HTML content).
+        parser: "bs4" for BeautifulSoup or "lxml" for the faster lxml.html path,
+                see extractLinks.
 
     Returns:
         list: A list of dicts, each with:
               - 'title': Title of the page.
               - 'links': List of dicts with 'title' and 'link' for each found link.
     """
-    final_list = []
-    for txt in data:
-        load = ast.literal_eval(txt)
-        page_id = load["pageid"]
-        text = load["text"]
-        identifiers = ("/wiki/Bestand", "/wiki/Speciaal", "/wiki/Wikipedia", "/wiki/Wikimedia")
+    return list(iterInfo(data, parser))
+
+
+IDENTIFIERS = ("/wiki/Bestand", "/wiki/Speciaal", "/wiki/Wikipedia", "/wiki/Wikimedia")
+
+
+def linkTitle(info):
+    """
+    Get the title of a link from its attributes.
 
+    Anchors without a title attribute, e.g. in some templates, get the title
+    of the page they link to, taken from the href.
+
+    Args:
+        info: Attributes of the anchor, with at least 'href'.
+
+    Returns:
+        str: The link title.
+    """
+    if "title" in info:
+        return info["title"]
+    page = info["href"][len("/wiki/"):].split("#")[0]
+    return unquote(page).replace("_", " ")
+
+
+def extractLinks(text, parser="bs4"):
+    """
+    Extract the internal Wikipedia links of an HTML document, in document order.
+
+    Both parsers give the same links. "bs4" builds a BeautifulSoup tree;
+    "lxml" parses with lxml.html directly and only visits the anchors,
+    which is several times faster. Pages that lxml.html rejects, such as
+    comment-only text or text with an XML encoding declaration, are parsed
+    with BeautifulSoup instead.
+
+    Args:
+        text: HTML content of a page.
+        parser: "bs4" or "lxml".
+
+    Returns:
+        list: Dicts with 'title' and 'link' for each found link.
+    """
+    if parser == "lxml":
+        if not text.strip():
+            return []
+        try:
+            anchors = (element.attrib for element in lxml.html.document_fromstring(text).iter("a"))
+        except (lxml.etree.ParserError, ValueError):
+            return extractLinks(text, "bs4")
+    else:
         soup = BeautifulSoup(text, 'lxml')
-        a_elements = soup.find_all('a')
+        anchors = (item.attrs for item in soup.find_all('a'))
+
+    finals = []
+    for info in anchors:
+        if "href" in info:
+            if info["href"].startswith("/wiki") and not info["href"].startswith(IDENTIFIERS):
+                link = info["href"]
+                title = linkTitle(info)
+                finals.append({"title": title, "link": link})
+    return finals
 
-        finals = []
-        for item in a_elements:
-            info = item.attrs
-            if "href" in info: 
-                if info["href"].startswith("/wiki") and not info["href"].startswith(identifiers):
-                    link = info["href"]
-                    title = info["title"]
-                    finals.append({"title": title, "link": link})
 
-        title = load["title"]
-        if finals != []:
-            final_list.append({"title": title, "links": finals})
-    return final_list
+def pageInfo(txt, parser="bs4"):
+    """
+    Extract the links of one page record.
+
+    Args:
+        txt: Page record with the keys 'pageid', 'title', and 'text', or its line.
+        parser: "bs4" or "lxml", see extractLinks.
+
+    Returns:
+        dict: Record with 'title' and 'links', or None if the page has no links.
+    """
+    load = record_io.parseRecord(txt)
+    finals = extractLinks(load["text"], parser)
+    if finals != []:
+        return {"title": load["title"], "links": finals}
+    return None
+
+
+def iterInfo(data, parser="bs4"):
+    """
+    Yield the valid internal Wikipedia links of each page, one page at a time.
+
+    Args:
+        data: Iterable of page records with the keys 'pageid', 'title', and 'text'.
+        parser: "bs4" or "lxml", see extractLinks.
+
+    Yields:
+        dict: The same records as getInfo, skipping pages without links.
+    """
+    for txt in data:
+        record = pageInfo(txt, parser)
+        if record is not None:
+            yield record
+
+
+def shardInfo(shard, parser):
+    """Extract the links of a shard of page records in a worker process."""
+    return [pageInfo(txt, parser) for txt in shard]
+
+
+def iterInfoParallel(data, workers=None, shard_size=64, parser="lxml"):
+    """
+    Yield the same records as iterInfo, extracting the links in a process pool.
+
+    The pages are sent to the workers in shards of 'shard_size' pages. At most
+    two shards per worker are in flight, so the input is streamed and only a
+    few shards are held in memory, and the records are yielded in input order.
+
+    Args:
+        data: Iterable of page records (or their lines) with 'pageid', 'title', and 'text'.
+        workers: Number of worker processes, the number of CPUs by default.
+        shard_size: Number of pages per task.
+        parser: "lxml" or "bs4", see extractLinks.
+
+    Yields:
+        dict: The same records as getInfo, skipping pages without links.
+    """
+    workers = workers or os.cpu_count() or 1
+    pending = deque()
+    data = iter(data)
+    shards = iter(lambda: list(islice(data, shard_size)), [])
+    with ProcessPoolExecutor(workers) as pool:
+        for shard in shards:
+            pending.append(pool.submit(shardInfo, shard, parser))
+            if len(pending) < 2 * workers:
+                continue
+            for record in pending.popleft().result():
+                if record is not None:
+                    yield record
+        while pending:
+            for record in pending.popleft().result():
+                if record is not None:
+                    yield record
+
+
+URL_NL = 'https://nl.wikipedia.org/w/api.php'
+CATEGORY = "Categorie:Wikipedia:Doorverwijspagina"
+
+
+def linkHref(title):
+    """
+    Build the href of a link to a page as it appears in rendered HTML.
+
+    Spaces become underscores and the title is percent-encoded like
+    MediaWiki does, e.g. 'Kaïn en Abel' -> '/wiki/Ka%C3%AFn_en_Abel'.
+
+    Args:
+        title (str): Title of the linked page.
+
+    Returns:
+        str: The href, e.g. '/wiki/Aalborg_(stad)'.
+    """
+    return "/wiki/" + quote(title.replace(" ", "_"), safe=";@$!*(),/~:")
+
+
+def iterApiLinks(url=URL_NL, category=CATEGORY, limit="max"):
+    """
+    Yield the links of every page in a category straight from the API, one page at a time.
+
+    Replaces get_pages, get_contents and getInfo: the category members and their
+    links to articles (namespace 0) are requested together with
+    generator=categorymembers and prop=links, so no HTML is downloaded or parsed.
+    A page is yielded once all continuations of its batch are merged.
+
+    Args:
+        url (str): API endpoint, e.g. a local stub server.
+        category (str): Title of the category.
+        limit: Number of pages and links per request.
+
+    Yields:
+        dict: Records with 'pageid', 'title' and 'links', each link a dict with
+              'title' and 'link' like getInfo, skipping pages without links.
+              Links are in alphabetical order instead of document order.
+    """
+    params = {
+        "action": "query",
+        "format": "json",
+        "generator": "categorymembers",
+        "gcmtitle": category,
+        "gcmnamespace": 0,
+        "gcmlimit": limit,
+        "prop": "links",
+        "plnamespace": 0,
+        "pllimit": limit,
+    }
+    session = http_cache.getSession()
+    batch = {}
+    while True:
+        data = session.get(url=url, params=params).json()
+        for page in data.get("query", {}).get("pages", {}).values():
+            merged = batch.setdefault(page["pageid"], {"pageid": page["pageid"], "title": page["title"], "links": []})
+            for link in page.get("links", []):
+                merged["links"].append({"title": link["title"], "link": linkHref(link["title"])})
+        cont = data.get("continue", {})
+        # links of the current batch of pages are continued with plcontinue;
+        # without it the next request starts a new batch of pages
+        if "plcontinue" not in cont:
+            for page in batch.values():
+                if page["links"]:
+                    yield page
+            batch = {}
+        if not cont:
+            break
+        params = {**params, **cont}
+        if "plcontinue" not in cont:
+            params.pop("plcontinue", None)
+
+
+def diffLinks(html_records, api_records):
+    """
+    Compare the links of the HTML path (getInfo) with those of the API path (iterApiLinks).
+
+    Links are compared by title per page title.
+
+    Args:
+        html_records (iterable[dict]): Records with 'title' and 'links' from the HTML path.
+        api_records (iterable[dict]): Records with 'title' and 'links' from the API path.
+
+    Returns:
+        tuple: A summary dict with page and link counts, and a list of per-page
+               differences with 'title', 'html_only' (link dicts) and 'api_only' (titles).
+    """
+    api = {}
+    for record in api_records:
+        load = record_io.parseRecord(record)
+        api[load["title"]] = {link["title"] for link in load["links"]}
+
+    summary = {"pages": 0, "html_only_pages": 0, "api_only_pages": 0,
+               "html_links": 0, "api_links": 0, "html_only_links": 0, "api_only_links": 0}
+    differences = []
+    for record in html_records:
+        load = record_io.parseRecord(record)
+        titles = api.pop(load["title"], None)
+        summary["html_links"] += len(load["links"])
+        if titles is None:
+            summary["html_only_pages"] += 1
+            summary["html_only_links"] += len(load["links"])
+            differences.append({"title": load["title"], "html_only": load["links"], "api_only": []})
+            continue
+        summary["pages"] += 1
+        summary["api_links"] += len(titles)
+        html_only = [link for link in load["links"] if link["title"] not in titles]
+        api_only = sorted(titles - {link["title"] for link in load["links"]})
+        summary["html_only_links"] += len(html_only)
+        summary["api_only_links"] += len(api_only)
+        if html_only or api_only:
+            differences.append({"title": load["title"], "html_only": html_only, "api_only": api_only})
+    for title, titles in api.items():
+        summary["api_only_pages"] += 1
+        summary["api_links"] += len(titles)
+        summary["api_only_links"] += len(titles)
+        differences.append({"title": title, "html_only": [], "api_only": sorted(titles)})
+    return summary, differences
+
+
+def printLinkDiff(summary, differences, examples=10):
+    """
+    Print the summary of diffLinks and the most common kinds of links only found in the HTML.
+
+    Args:
+        summary (dict): Summary of diffLinks.
+        differences (list): Per-page differences of diffLinks.
+        examples (int): Number of example pages to print.
+    """
+    print(f"Pages in both: {summary['pages']}, only in HTML: {summary['html_only_pages']}, only in API: {summary['api_only_pages']}")
+    print(f"Links in HTML: {summary['html_links']}, in API: {summary['api_links']}")
+    print(f"Links only in HTML: {summary['html_only_links']}, only in API: {summary['api_only_links']}")
+    kinds = Counter()
+    for difference in differences:
+        for link in difference["html_only"]:
+            # e.g. 'Categorie' or 'Sjabloon' for links outside the main namespace
+            kinds[link["title"].split(":")[0] if ":" in link["title"] else "article"] += 1
+    if kinds:
+        print("Links only in HTML by namespace prefix: " + ", ".join(f"{kind} {count}" for kind, count in kinds.most_common()))
+    for difference in differences[:examples]:
+        print(f"  {difference['title']}: HTML only {[link['title'] for link in difference['html_only']]}, API only {difference['api_only']}")
 
 
 def main():
 
+    parser = argparse.ArgumentParser(description="Extract the related page links from the page contents")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes, 1 to extract in this process")
+    parser.add_argument("--parser", choices=["lxml", "bs4"], default="lxml", help="lxml.html (fast) or BeautifulSoup")
+    parser.add_argument("--api", action="store_true", help="get the links of all category members from the API instead of all_contents.txt")
+    parser.add_argument("--outfile", default="data/all_links.txt")
+    parser.add_argument("--diff", metavar="FILE", help="compare the output with the links in FILE (e.g. of the HTML path) and write data/links_diff.txt")
+    args = parser.parse_args()
+
     # define in- and output
     infile = "data/all_contents.txt"
-    outfile = 'data/all_links.txt'
+    outfile = args.outfile
 
-    # get data from file
-    data = getData(infile)
-
-    # get title and link of related pages from main page content
-    info = getInfo(data)
+    # get title and link of related pages from the API, or from main page content
+    if args.api:
+        info = iterApiLinks()
+    elif args.workers > 1:
+        info = iterInfoParallel(getData(infile), args.workers, parser=args.parser)
+    else:
+        info = iterInfo(getData(infile), args.parser)
 
     # write data to file
     writeData(outfile, info)
+    if args.api:
+        http_cache.printStats()
+
+    # report the links that differ between both files
+    if args.diff:
+        summary, differences = diffLinks(getData(args.diff), getData(outfile))
+        printLinkDiff(summary, differences)
+        writeData("data/links_diff.txt", differences)
 
 if __name__ == "__main__":
     main()
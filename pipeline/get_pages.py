@@ -2,6 +2,8 @@
 
 import requests
 import os
+import http_cache
+import record_io
 from dotenv import load_dotenv
 
 
@@ -40,15 +42,13 @@ def startSession(username, password):
 
 def writeData(file, data):
     """
-    Write each item in a list to a new line in a file.
+    Write each record in a list to a file, as JSON lines unless the extension says otherwise.
 
     Args:
-        file: Path to the output file.
-        data: List of items to write (will be stringified).
+        file: Path to the output file (.txt/.jsonl, .zst, .parquet or .arrow).
+        data: Iterable of record dicts to write.
     """
-    with open(file, 'w') as f:
-        for line in data:
-            f.write(f"{line}\n")
+    record_io.writeRecords(file, data)
 
 
 def getDisambiguation():
@@ -58,6 +58,16 @@ def getDisambiguation():
     Returns:
         A list of page dictionaries as returned by the API.
     """
+    return list(iterDisambiguation())
+
+
+def iterDisambiguation():
+    """
+    Yield the Dutch Wikipedia disambiguation pages in the specified category one at a time.
+
+    Yields:
+        Page dictionaries as returned by the API.
+    """
     URL_NL = 'https://nl.wikipedia.org/w/api.php'
     PARAMS_NL = {
         "action": "query",
@@ -67,8 +77,6 @@ def getDisambiguation():
         "cmlimit": 500
     }
 
-    i = 0
-    all_pages = []
     cmcontinue = None
     while True:
         if cmcontinue:
@@ -76,16 +84,15 @@ def getDisambiguation():
         else:
             PARAMS_NL.pop("cmcontinue", None)
         
-        R = requests.get(url=URL_NL, params=PARAMS_NL)
+        R = http_cache.getSession().get(url=URL_NL, params=PARAMS_NL)
         data = R.json()
 
         if "query" in data:
-            all_pages.extend(data["query"]["categorymembers"])
+            yield from data["query"]["categorymembers"]
         cmcontinue = data.get("continue", {}).get("cmcontinue")
 
         if not cmcontinue:
             break
-    return all_pages
 
 
 def main():
@@ -111,6 +118,7 @@ def main():
 
     # write data to file
     writeData(outfile, pages)
+    http_cache.printStats()
 
 if __name__ == "__main__":
     main()
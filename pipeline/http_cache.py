@@ -0,0 +1,256 @@
+#!/usr/bin/python3
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+import requests
+
+
+DAY = 24 * 60 * 60
+WEEK = 7 * DAY
+
+# hits only refresh the last access time of an entry when it is older than
+# this, so most hits do not write; eviction is least recently used to the hour
+ACCESS_RESOLUTION = 60 * 60
+
+# parameters that do not change the response and are left out of the cache key
+IGNORED_PARAMS = ("maxlag",)
+
+
+def cacheKey(url, params):
+    """
+    Build the cache key of a request from its endpoint and parameters.
+
+    Args:
+        url (str): API endpoint.
+        params (dict): Query parameters.
+
+    Returns:
+        str: Canonical key string.
+    """
+    params = {k: str(v) for k, v in (params or {}).items() if k not in IGNORED_PARAMS}
+    return url + "?" + json.dumps(params, sort_keys=True, ensure_ascii=False)
+
+
+def endpointName(url, params):
+    """
+    Name the kind of request, used for TTLs and statistics.
+
+    Args:
+        url (str): API endpoint.
+        params (dict): Query parameters.
+
+    Returns:
+        str: One of 'pageviews', 'categorymembers', 'parse', 'wbgetentities',
+             'query' or 'other'.
+    """
+    params = params or {}
+    if "pageviews" in str(params.get("prop", "")).split("|"):
+        return "pageviews"
+    if params.get("list") == "categorymembers":
+        return "categorymembers"
+    if params.get("action") in ("parse", "wbgetentities", "query"):
+        return params["action"]
+    return "other"
+
+
+# time to live in seconds per kind of request
+TTLS = {
+    "pageviews": DAY,
+    "categorymembers": DAY,
+    "parse": WEEK,
+    "wbgetentities": WEEK,
+    "query": WEEK,
+    "other": WEEK,
+}
+
+
+class CachedResponse:
+    """
+    Minimal stand-in for requests.Response for responses served from the cache.
+    """
+
+    status_code = 200
+    from_cache = True
+
+    def __init__(self, body):
+        self.text = body
+        self.headers = {}
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class ResponseCache:
+    """
+    Persistent SQLite cache of API responses keyed on endpoint and parameters.
+
+    Entries expire after the TTL of their kind of request. When the total size
+    of the stored responses exceeds 'max_bytes', the least recently used
+    entries are evicted; the last access time of an entry is updated at most
+    once per ACCESS_RESOLUTION, so a hit is usually a single read. Hits and misses are counted per kind of request.
+    """
+
+    def __init__(self, file, max_bytes=2 * 1024 ** 3, ttls=None):
+        self.file = file
+        self.max_bytes = max_bytes
+        self.ttls = {**TTLS, **(ttls or {})}
+        self.hits = Counter()
+        self.misses = Counter()
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(file, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, endpoint TEXT, body TEXT, size INTEGER, created REAL, accessed REAL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self.db.commit()
+        self.total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, url, params):
+        """
+        Look up a cached response.
+
+        Args:
+            url (str): API endpoint.
+            params (dict): Query parameters.
+
+        Returns:
+            str: The cached response body, or None if missing or expired.
+        """
+        key = cacheKey(url, params)
+        endpoint = endpointName(url, params)
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT body, created, accessed FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttls[endpoint]:
+                self.misses[endpoint] += 1
+                return None
+            if now - row[2] > ACCESS_RESOLUTION:
+                self.db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                self.db.commit()
+            self.hits[endpoint] += 1
+            return row[0]
+
+    def put(self, url, params, body):
+        """
+        Store a response body and evict least recently used entries if needed.
+
+        Args:
+            url (str): API endpoint.
+            params (dict): Query parameters.
+            body (str): The response body.
+        """
+        key = cacheKey(url, params)
+        now = time.time()
+        size = len(body.encode("utf-8"))
+        with self.lock:
+            old = self.db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if old is not None:
+                self.total -= old[0]
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, endpointName(url, params), body, size, now, now),
+            )
+            self.total += size
+            if self.total > self.max_bytes:
+                evicted = []
+                for old_key, old_size in self.db.execute("SELECT key, size FROM responses ORDER BY accessed"):
+                    if self.total <= self.max_bytes:
+                        break
+                    evicted.append((old_key,))
+                    self.total -= old_size
+                self.db.executemany("DELETE FROM responses WHERE key = ?", evicted)
+            self.db.commit()
+
+    def stats(self):
+        """
+        Summarise hits and misses per kind of request.
+
+        Returns:
+            str: One line per kind of request with hit, miss and hit rate.
+        """
+        lines = []
+        for endpoint in sorted(set(self.hits) | set(self.misses)):
+            hits = self.hits[endpoint]
+            misses = self.misses[endpoint]
+            lines.append(f"{endpoint}: {hits} hits, {misses} misses ({hits / (hits + misses):.1%} hit rate)")
+        return "\n".join(lines)
+
+
+class CachedSession:
+    """
+    requests.Session wrapper that answers GET requests from a ResponseCache.
+
+    Only successful JSON responses without an API error are stored.
+    """
+
+    def __init__(self, cache, session=None):
+        self.cache = cache
+        self.session = session or requests.Session()
+
+    def get(self, url=None, params=None, **kwargs):
+        body = self.cache.get(url, params)
+        if body is not None:
+            return CachedResponse(body)
+        r = self.session.get(url=url, params=params, **kwargs)
+        if r.status_code == 200:
+            try:
+                data = r.json()
+            except ValueError:
+                return r
+            if isinstance(data, dict) and "error" not in data:
+                self.cache.put(url, params, r.text)
+        return r
+
+    def post(self, *args, **kwargs):
+        return self.session.post(*args, **kwargs)
+
+
+_cache = None
+_session = None
+_lock = threading.Lock()
+
+
+def getCache():
+    """
+    Return the process-wide response cache.
+
+    The database location is read from the HTTP_CACHE environment variable
+    and defaults to data/http_cache.sqlite.
+
+    Returns:
+        ResponseCache: The shared cache.
+    """
+    global _cache
+    with _lock:
+        if _cache is None:
+            _cache = ResponseCache(os.getenv("HTTP_CACHE", "data/http_cache.sqlite"))
+        return _cache
+
+
+def getSession():
+    """
+    Return the process-wide cached session.
+
+    Returns:
+        CachedSession: Session that serves GET requests from the shared cache.
+    """
+    global _session
+    cache = getCache()
+    with _lock:
+        if _session is None:
+            _session = CachedSession(cache)
+        return _session
+
+
+def printStats():
+    """
+    Print the hit and miss counters of the process-wide cache, if it was used.
+    """
+    if _cache is not None:
+        print(f"HTTP cache ({_cache.file}):\n{_cache.stats()}")
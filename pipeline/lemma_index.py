@@ -0,0 +1,127 @@
+#!/usr/bin/python3
+
+import hashlib
+import mmap
+import os
+import unicodedata
+import xml.etree.ElementTree as ET
+
+
+INDEX_HEADER = b"ODWN-LEMMA-INDEX 1\n"
+
+
+def normalise(word):
+    """
+    Case-fold a word and strip its accents, e.g. 'Café' -> 'cafe'.
+
+    Args:
+        word (str): The word to normalise.
+
+    Returns:
+        str: The normalised word.
+    """
+    decomposed = unicodedata.normalize("NFKD", word.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def parseLemmas(file):
+    """
+    Stream-parse an Open Dutch WordNet XML file and collect its lemmas.
+
+    Args:
+        file (str): Path to the Open Dutch WordNet XML file.
+
+    Returns:
+        set: The lowercased "writtenForm" values of all Lemma elements.
+    """
+    lemmas = set()
+    for _, element in ET.iterparse(file, events=("end",)):
+        if element.tag == "Lemma":
+            word = element.get("writtenForm")
+            if word is not None:
+                lemmas.add(word.lower())
+        element.clear()
+    return lemmas
+
+
+class LemmaIndex:
+    """
+    Hash-set index of Open Dutch WordNet lemmas with O(1) lookups.
+
+    'word in index' matches the lowercased word exactly, like the original
+    filter. containsNormalised also ignores case and accents.
+    """
+
+    def __init__(self, lemmas, normalised=None):
+        self.lemmas = frozenset(lemmas)
+        if normalised is None:
+            normalised = (normalise(word) for word in self.lemmas)
+        self.normalised = frozenset(normalised)
+
+    def __contains__(self, word):
+        return word.lower() in self.lemmas
+
+    def __len__(self):
+        return len(self.lemmas)
+
+    def containsNormalised(self, word):
+        """Return whether the word matches a lemma ignoring case and accents."""
+        return normalise(word) in self.normalised
+
+    def save(self, file):
+        """
+        Write the index as sorted, newline-separated sections of lemmas and normalised lemmas.
+
+        Args:
+            file (str): Path to the index file.
+        """
+        tmp = file + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(INDEX_HEADER)
+            f.write(f"{len(self.lemmas)}\n".encode("utf-8"))
+            f.write("\n".join(sorted(self.lemmas)).encode("utf-8") + b"\n")
+            f.write("\n".join(sorted(self.normalised)).encode("utf-8"))
+        os.replace(tmp, file)
+
+    @classmethod
+    def load(cls, file):
+        """
+        Load an index file written by save through a memory map.
+
+        Args:
+            file (str): Path to the index file.
+
+        Returns:
+            LemmaIndex: The loaded index.
+        """
+        with open(file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            if m[:len(INDEX_HEADER)] != INDEX_HEADER:
+                raise ValueError(f"Not a lemma index: {file}")
+            lines = m[len(INDEX_HEADER):].decode("utf-8").split("\n")
+        count = int(lines[0])
+        return cls(lines[1:count + 1], lines[count + 1:])
+
+
+def loadIndex(file, cache_dir="data"):
+    """
+    Load the lemma index of an Open Dutch WordNet XML file, building it if needed.
+
+    The index is cached in 'cache_dir' under a name containing the SHA-256 of
+    the XML file, so a changed XML file is indexed again automatically.
+
+    Args:
+        file (str): Path to the Open Dutch WordNet XML file.
+        cache_dir (str): Directory of the cached index files.
+
+    Returns:
+        LemmaIndex: The lemma index.
+    """
+    with open(file, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    cache_file = os.path.join(cache_dir, f"odwn-lemmas-{digest[:16]}.idx")
+    if os.path.exists(cache_file):
+        return LemmaIndex.load(cache_file)
+    index = LemmaIndex(parseLemmas(file))
+    os.makedirs(cache_dir, exist_ok=True)
+    index.save(cache_file)
+    return index
@@ -0,0 +1,261 @@
+#!/usr/bin/python3
+
+import argparse
+import datetime
+import gzip
+import os
+import re
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from dump_ingest import parallelMap
+from wikidata_index import iterBlocks
+
+
+DAILY_DIR = "data/pageviews"
+
+# hourly dump files, e.g. pageviews-20250601-130000.gz (or pageviews-20250601-13.gz)
+HOURLY_FILE = re.compile(r"pageviews-(\d{8})-(\d{2})(?:\d{4})?\.gz$")
+DAILY_FILE = re.compile(r"nl-(\d{8})\.tsv\.gz$")
+
+# lines of nl.wikipedia (desktop 'nl' and mobile 'nl.m'): domain, title, [page ID, access,] views, response size
+NL_LINE = re.compile(rb"^nl(?:\.m|\.wikipedia)? (\S+) (?:\S+ )*?(\d+) \d+$", re.M)
+
+
+def findHourlyFiles(directory):
+    """
+    Find the hourly pageview dump files in a directory and its subdirectories.
+
+    Args:
+        directory (str): Directory of the downloaded pageviews-YYYYMMDD-HH*.gz files.
+
+    Returns:
+        dict: Mapping of date (YYYYMMDD) to a dict of hour to file path.
+    """
+    days = {}
+    for root, _, files in os.walk(directory):
+        for file in files:
+            match = HOURLY_FILE.search(file)
+            if match:
+                days.setdefault(match.group(1), {})[match.group(2)] = os.path.join(root, file)
+    return days
+
+
+def countHour(file):
+    """
+    Count the views per nl.wikipedia title in one hourly dump file.
+
+    The decompressed file is scanned in blocks with a single regex, so the
+    lines of the other wikis are never split or decoded.
+
+    Args:
+        file (str): Path to a pageviews-YYYYMMDD-HH*.gz file.
+
+    Returns:
+        Counter: Views per title, with spaces instead of underscores.
+    """
+    counts = Counter()
+    with gzip.open(file, "rb") as f:
+        for block in iterBlocks(f):
+            for title, views in NL_LINE.findall(block):
+                counts[title] += int(views)
+    return Counter({title.decode("utf-8", "replace").replace("_", " "): views for title, views in counts.items()})
+
+
+def dailyFile(directory, date):
+    return os.path.join(directory, f"nl-{date}.tsv.gz")
+
+
+def writeDay(file, counts):
+    """
+    Write the views of one day as gzipped, title-sorted 'title<TAB>views' lines.
+
+    Args:
+        file (str): Path of the daily file.
+        counts (dict): Views per title.
+    """
+    tmp = file + ".tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        f.writelines(f"{title}\t{counts[title]}\n" for title in sorted(counts))
+    os.replace(tmp, file)
+
+
+def readDay(file):
+    """
+    Read a daily file written by writeDay.
+
+    Args:
+        file (str): Path of the daily file.
+
+    Returns:
+        dict: Views per title.
+    """
+    with gzip.open(file, "rt", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    counts = {}
+    for line in lines:
+        title, _, views = line.rpartition("\t")
+        counts[title] = int(views)
+    return counts
+
+
+def ingest(dumps, directory=DAILY_DIR, workers=1):
+    """
+    Aggregate every complete day of hourly dump files that has not been aggregated yet.
+
+    Each day is summed over its 24 hourly files, which are read in a pool of
+    worker processes, and written to its own daily file. Days that are
+    already in 'directory' are skipped, so downloading the files of a new
+    day and running this again only adds that day. Days with missing hours
+    are left out until they are complete.
+
+    Args:
+        dumps (str): Directory of the hourly pageviews-YYYYMMDD-HH*.gz files.
+        directory (str): Directory of the daily files.
+        workers (int): Number of worker processes.
+
+    Returns:
+        list[str]: The dates (YYYYMMDD) that were added.
+    """
+    os.makedirs(directory, exist_ok=True)
+    added = []
+    for date, hours in sorted(findHourlyFiles(dumps).items()):
+        if os.path.exists(dailyFile(directory, date)):
+            continue
+        if len(hours) < 24:
+            print(f"Skipping {date}: only {len(hours)} of 24 hourly files")
+            continue
+        start = time.monotonic()
+        counts = Counter()
+        for hour in parallelMap(countHour, [hours[hour] for hour in sorted(hours)], workers):
+            counts.update(hour)
+        writeDay(dailyFile(directory, date), counts)
+        added.append(date)
+        print(f"{date}: {sum(counts.values())} views of {len(counts)} pages ({time.monotonic() - start:.0f}s)")
+    return added
+
+
+class PageviewIndex:
+    """
+    Page views of nl.wikipedia titles per day, summed over any window of days.
+
+    The daily files written by ingest are only read when a window needs them.
+    The totals of each window are kept in a dict, so a count is one lookup.
+    """
+
+    def __init__(self, directory=DAILY_DIR):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.dates = sorted(match.group(1) for match in map(DAILY_FILE.search, os.listdir(directory)) if match)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def windowDates(self, days, end=None):
+        """
+        Return the dates of a window of days.
+
+        Args:
+            days (int): Number of days in the window.
+            end (str): Last date (YYYYMMDD) of the window, by default the last ingested day.
+
+        Returns:
+            list[str]: The dates of the window, including those that have not been ingested.
+        """
+        last = datetime.datetime.strptime(end or self.dates[-1], "%Y%m%d").date()
+        return [(last - datetime.timedelta(days=i)).strftime("%Y%m%d") for i in reversed(range(days))]
+
+    @lru_cache(maxsize=None)
+    def totals(self, days, end=None):
+        """
+        Sum the views per title over a window of days.
+
+        Args:
+            days (int): Number of days in the window.
+            end (str): Last date (YYYYMMDD) of the window, by default the last ingested day.
+
+        Returns:
+            dict: Views per title over the ingested days of the window.
+        """
+        dates = self.windowDates(days, end)
+        missing = [date for date in dates if date not in self.dates]
+        if missing:
+            print(f"No page views of {len(missing)} of the {days} days up to {dates[-1]}: {', '.join(missing)}")
+        totals = Counter()
+        for date in dates:
+            if date not in missing:
+                totals.update(readDay(dailyFile(self.directory, date)))
+        return dict(totals)
+
+    def count(self, title, days, end=None):
+        """
+        Get the views of a page over a window of days like get_aspects.getRelatedPageViewCount.
+
+        Args:
+            title (str): Title of the page, with spaces.
+            days (int): Number of days in the window.
+            end (str): Last date (YYYYMMDD) of the window, by default the last ingested day.
+
+        Returns:
+            int: Total views over the window, or 0 if the page has none.
+        """
+        with self.lock:
+            totals = self.totals(days, end)
+        return totals.get(title, 0)
+
+
+_index = None
+_checked = False
+_lock = threading.Lock()
+
+
+def getIndex():
+    """
+    Return the process-wide pageview index, if any days have been ingested.
+
+    The directory of the daily files is read from the PAGEVIEWS environment
+    variable and defaults to data/pageviews. A missing or empty directory is
+    only checked once per process.
+
+    Returns:
+        PageviewIndex: The shared index, or None.
+    """
+    global _index, _checked
+    with _lock:
+        if not _checked:
+            _checked = True
+            directory = os.getenv("PAGEVIEWS", DAILY_DIR)
+            if not os.path.isdir(directory):
+                return None
+            index = PageviewIndex(directory)
+            if not len(index):
+                return None
+            _index = index
+        return _index
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Aggregate hourly pageview dumps of nl.wikipedia per day and count views over a window")
+    parser.add_argument("--directory", default=os.getenv("PAGEVIEWS", DAILY_DIR), help="directory of the daily files")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    ingest_parser = subparsers.add_parser("ingest", help="aggregate the complete days that have not been aggregated yet")
+    ingest_parser.add_argument("dumps", help="directory of the pageviews-YYYYMMDD-HH*.gz files, e.g. dumps/pageviews")
+    ingest_parser.add_argument("--workers", type=int, default=os.cpu_count())
+    count_parser = subparsers.add_parser("count", help="print the views of pages over a window")
+    count_parser.add_argument("titles", nargs="+")
+    count_parser.add_argument("--days", type=int, default=30)
+    count_parser.add_argument("--end", help="last day of the window (YYYYMMDD), by default the last ingested day")
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        added = ingest(args.dumps, args.directory, args.workers)
+        print(f"Added {len(added)} days to {args.directory}")
+    else:
+        index = PageviewIndex(args.directory)
+        for title in args.titles:
+            print(f"{title}: {index.count(title, args.days, args.end)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/python3
+
+import ast
+import io
+import json
+import sys
+
+
+# link fields of the link and aspect tables, in column order
+LINK_FIELDS = ("title", "link", "description", "categories", "count")
+
+
+def parseRecord(line):
+    """
+    Parse a record line written as JSON or as a legacy Python dict repr.
+
+    Args:
+        line (str | dict): A line from a record file, or an already parsed record.
+
+    Returns:
+        dict: The parsed record.
+    """
+    if isinstance(line, dict):
+        return line
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError:
+        return ast.literal_eval(line)
+
+
+def openText(file, mode):
+    """
+    Open a text file, transparently (de)compressing files ending in .zst.
+
+    Args:
+        file (str): Path to the file.
+        mode (str): 'r' or 'w'.
+
+    Returns:
+        A text file object.
+    """
+    if not file.endswith(".zst"):
+        return open(file, mode, encoding="utf-8")
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstandard is required for .zst files: pip install zstandard")
+    if mode == "r":
+        stream = zstandard.ZstdDecompressor().stream_reader(open(file, "rb"), closefd=True)
+    else:
+        stream = zstandard.ZstdCompressor(level=10).stream_writer(open(file, "wb"), closefd=True)
+    return io.TextIOWrapper(stream, encoding="utf-8")
+
+
+def isTable(file):
+    """Return whether a file is written as a Parquet or Arrow table."""
+    return file.endswith((".parquet", ".arrow"))
+
+
+def readRecords(file):
+    """
+    Lazily read records from a JSONL, legacy .txt, .zst, Parquet or Arrow file.
+
+    Args:
+        file (str): Path to the input file.
+
+    Yields:
+        dict: One record at a time.
+    """
+    if isTable(file):
+        yield from readTable(file)
+        return
+    with openText(file, "r") as f:
+        for line in f:
+            if line.strip():
+                yield parseRecord(line)
+
+
+def writeRecords(file, records):
+    """
+    Write records to a JSONL (optionally .zst compressed), Parquet or Arrow file.
+
+    Records are written one at a time, so 'records' can be a generator.
+
+    Args:
+        file (str): Path to the output file. The format follows from the extension;
+                    any other extension (e.g. .txt) is written as JSON lines.
+        records (iterable[dict]): The records to write.
+    """
+    if isTable(file):
+        writeTable(file, records)
+        return
+    with openText(file, "w") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def tapRecords(file, records):
+    """
+    Pass records through unchanged while writing each one to a JSONL file.
+
+    Used to keep optional debug copies of intermediate steps in streaming mode.
+
+    Args:
+        file (str): Path to the output file (JSON lines, .zst compressed if it ends in .zst).
+        records (iterable[dict]): The records to pass through.
+
+    Yields:
+        dict: The records of 'records'.
+    """
+    with openText(file, "w") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            yield record
+
+
+def tableSchema():
+    """Return the Arrow schema of the link and aspect tables, one row per link."""
+    import pyarrow as pa
+    return pa.schema([
+        ("page", pa.int64()),
+        ("number", pa.int64()),
+        ("page_title", pa.string()),
+        ("title", pa.string()),
+        ("link", pa.string()),
+        ("description", pa.string()),
+        ("categories", pa.list_(pa.string())),
+        ("count", pa.int64()),
+    ])
+
+
+def writeTable(file, records, batch_size=10000):
+    """
+    Write link or aspect records as a flat table with one row per link.
+
+    Pages without links are kept as a single row with empty link columns.
+    The page order and the link fields that were present are stored so that
+    readTable can restore the original records.
+
+    Args:
+        file (str): Path to the .parquet or .arrow output file.
+        records (iterable[dict]): Page records with 'title' and 'links'.
+        batch_size (int): Number of rows per written batch.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("pyarrow is required for Parquet/Arrow files: pip install pyarrow")
+
+    schema = tableSchema()
+    columns = {name: [] for name in schema.names}
+    present = []
+    writer = None
+
+    def flush():
+        nonlocal schema, writer
+        if writer is None:
+            schema = schema.with_metadata({"link_fields": json.dumps(present)})
+            if file.endswith(".parquet"):
+                writer = pq.ParquetWriter(file, schema)
+            else:
+                writer = pa.ipc.new_file(file, schema)
+        writer.write_table(pa.table(columns, schema=schema))
+        for values in columns.values():
+            values.clear()
+
+    for page, record in enumerate(records):
+        links = record["links"] or [None]
+        for link in links:
+            columns["page"].append(page)
+            columns["number"].append(record.get("number"))
+            columns["page_title"].append(record["title"])
+            for name in LINK_FIELDS:
+                columns[name].append(link.get(name) if link else None)
+            if link:
+                for name in LINK_FIELDS:
+                    if name in link and name not in present:
+                        present.append(name)
+        if len(columns["page"]) >= batch_size:
+            flush()
+    flush()
+    writer.close()
+
+
+def readTable(file):
+    """
+    Lazily read page records back from a table written by writeTable.
+
+    Args:
+        file (str): Path to the .parquet or .arrow file.
+
+    Yields:
+        dict: One page record at a time.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("pyarrow is required for Parquet/Arrow files: pip install pyarrow")
+
+    if file.endswith(".parquet"):
+        parquet = pq.ParquetFile(file)
+        fields = json.loads(parquet.schema_arrow.metadata[b"link_fields"])
+        batches = parquet.iter_batches()
+    else:
+        reader = pa.ipc.open_file(file)
+        fields = json.loads(reader.schema.metadata[b"link_fields"])
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+
+    record = None
+    page = None
+    for batch in batches:
+        for row in batch.to_pylist():
+            if row["page"] != page:
+                if record is not None:
+                    yield record
+                page = row["page"]
+                record = {"title": row["page_title"], "links": []}
+                if row["number"] is not None:
+                    record = {"number": row["number"], **record}
+            if row["title"] is not None:
+                record["links"].append({name: row[name] for name in fields})
+    if record is not None:
+        yield record
+
+
+def convertLegacy(infile, outfile):
+    """
+    Convert a legacy file with one Python dict repr per line to another record format.
+
+    Args:
+        infile (str): Path to the legacy .txt file.
+        outfile (str): Path to the output file (.jsonl, .jsonl.zst, .parquet or .arrow).
+    """
+    writeRecords(outfile, readRecords(infile))
+
+
+def main():
+
+    # convert a legacy file, e.g. python3 record_io.py data/all_aspects.txt data/all_aspects.parquet
+    if len(sys.argv) != 3:
+        raise SystemExit("Usage: python3 record_io.py <infile> <outfile>")
+    convertLegacy(sys.argv[1], sys.argv[2])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+
+import json
+import re
+from functools import lru_cache
+
+
+RULES_FILE = "dependencies/filter_rules.json"
+
+
+def compileAlternation(patterns):
+    """
+    Compile a list of literal substrings into one alternation regex.
+
+    Args:
+        patterns (list[str]): Literal substrings to search for.
+
+    Returns:
+        re.Pattern: Pattern whose search() finds any of the substrings in one pass.
+    """
+    # longest first, so overlapping patterns do not shadow each other
+    ordered = sorted(set(patterns), key=len, reverse=True)
+    return re.compile("|".join(re.escape(pattern) for pattern in ordered))
+
+
+class Rules:
+    """
+    Compiled description and category rules of filter2.
+
+    The exact descriptions are kept in a set and every substring list is
+    compiled once into a single regex, so each check is one pass over the
+    description or category regardless of the number of patterns.
+    """
+
+    def __init__(self, rules):
+        self.exact = frozenset(rules["description_exact"])
+        self.partial = compileAlternation(rules["description_partial"])
+        self.demonyms = compileAlternation(rules["demonyms"])
+        self.categories = compileAlternation([category.lower() for category in rules["excluded_categories"]])
+        with open(rules["country_names"], "r", encoding="utf-8") as f:
+            self.countries = frozenset(f.read().splitlines())
+
+    def isExactDescription(self, description):
+        """Return whether the description is one of the non-informative descriptions."""
+        return description in self.exact
+
+    def hasPartialDescription(self, description):
+        """Return whether the description contains one of the partial patterns."""
+        return self.partial.search((description + ".").lower()) is not None
+
+    def hasDemonym(self, description):
+        """Return whether the description mentions one of the demonyms."""
+        return self.demonyms.search(description.lower()) is not None
+
+    def hasExcludedCategory(self, categories):
+        """Return whether any of the categories contains an excluded category name."""
+        return any(self.categories.search(category.lower()) for category in categories)
+
+
+@lru_cache(maxsize=None)
+def loadRules(file=RULES_FILE):
+    """
+    Load and compile the filter rules from a JSON file, once per file.
+
+    The file contains the lists 'description_exact', 'description_partial',
+    'demonyms' and 'excluded_categories', and the path of the country names
+    file under 'country_names'.
+
+    Args:
+        file (str): Path to the JSON rules file.
+
+    Returns:
+        Rules: The compiled rules.
+    """
+    with open(file, "r", encoding="utf-8") as f:
+        return Rules(json.load(f))
@@ -1,4 +1,6 @@
 #!/usr/bin/env python3
+import argparse
+import os
 import subprocess
 import sys
 import time
@@ -8,6 +10,7 @@ STEP_DESCRIPTIONS = {
 "get_pages.py": "Getting pages",
 "get_contents.py": "Getting content",
 "get_links.py": "Getting links",
+"dump_ingest.py": "Reading dumps",
 "filter1.py": "Filtering pages",
 "get_aspects.py": "Getting aspects",
 "filter2.py": "Filtering aspects",
@@ -16,12 +19,12 @@ STEP_DESCRIPTIONS = {
 "create_puzzles.py": "Creating puzzles",
 }
 
-def run_script(script, step=None, total=None):
+def run_script(script, step=None, total=None, args=()):
     description = STEP_DESCRIPTIONS.get(script, script)
     prefix = f"[Step {step}/{total}] " if step and total else ""
     start_time = time.time()
     print(f"\n{prefix}{description} started at {time.strftime('%Y-%m-%d %H:%M:%S')}")
-    result = subprocess.run([sys.executable, script], capture_output=True, text=True)
+    result = subprocess.run([sys.executable, script, *args], capture_output=True, text=True)
     elapsed = time.time() - start_time
     if result.returncode != 0:
         print(f"Error during {description}: return code {result.returncode}")
@@ -32,7 +35,7 @@ def run_script(script, step=None, total=None):
     print(f"{prefix}{description} completed in {elapsed:.2f} seconds at {time.strftime('%Y-%m-%d %H:%M:%S')}")
 
 
-def run_initial():
+def run_initial(api_links=False, dumps=None):
     initial_scripts = [
         "get_pages.py",
         "get_contents.py",
@@ -42,10 +45,85 @@ def run_initial():
         "filter2.py",
         "annotations_out.py",
     ]
+    args = {}
+    if dumps:
+        # dump_ingest.py writes all_pages.txt and all_links.txt from local dumps
+        initial_scripts = ["dump_ingest.py"] + initial_scripts[3:]
+        args["dump_ingest.py"] = ["--dumps", dumps]
+    elif api_links:
+        # get_links.py requests the links of all category members itself
+        initial_scripts = initial_scripts[2:]
+        args["get_links.py"] = ["--api"]
     total = len(initial_scripts)
     print("\n=== Starting full pipeline run ===")
     for idx, script in enumerate(initial_scripts, start=1):
-        run_script(script, step=idx, total=total)
+        run_script(script, step=idx, total=total, args=args.get(script, ()))
+    input("\nPlease perform annotations now and save the output. Exit or press Enter to continue...\n")
+
+
+def run_streaming(taps=False, api_links=False, dumps=None):
+    """
+    Run the initial steps in-process, streaming each page through all steps.
+
+    The steps are chained as generators (pages -> contents -> links -> filter1
+    -> aspects -> filter2), so intermediate files like all_contents.txt are not
+    needed and only a few pages are held in memory at a time. With 'taps', the
+    intermediate records are also written to their usual files for debugging.
+    all_filtered2.txt and the annotations file are always written.
+
+    Args:
+        taps (bool): Whether to write the intermediate files.
+        api_links (bool): Get the links straight from the API instead of
+                          fetching and parsing the HTML of every page.
+        dumps (str): Directory with local nlwiki dumps to read the pages and
+                     links from instead of the API, or None.
+    """
+    # imported here so the subprocess mode does not need the step dependencies
+    from dotenv import load_dotenv
+    import annotations_out
+    import dump_ingest
+    import filter1
+    import filter2
+    import get_aspects
+    import get_contents
+    import get_links
+    import get_pages
+    import http_cache
+    import record_io
+
+    def tap(records, file):
+        return record_io.tapRecords(file, records) if taps else records
+
+    # define API credentials
+    load_dotenv()
+    username = os.getenv("USERNAME")
+    password = os.getenv("PASSWORD")
+
+    if not username or not password:
+        raise EnvironmentError("USERNAME and PASSWORD must be set in .env file")
+
+    # start session
+    get_pages.startSession(username, password)
+
+    print("\n=== Starting streaming pipeline run ===")
+    start_time = time.time()
+    if dumps:
+        _, links = dump_ingest.ingestDumps(dump_ingest.findDumps(dumps), workers=os.cpu_count())
+        links = tap(links, "data/all_links.txt")
+    elif api_links:
+        links = tap(get_links.iterApiLinks(), "data/all_links.txt")
+    else:
+        pages = tap(get_pages.iterDisambiguation(), "data/all_pages.txt")
+        contents = tap(get_contents.iterContent(pages), "data/all_contents.txt")
+        links = tap(get_links.iterInfo(contents), "data/all_links.txt")
+    filtered = tap(filter1.iterFilter(links, "dependencies/odwn-lemmas-unique.xml"), "data/all_filtered1.txt")
+    aspects = tap(get_aspects.enrichPages(filtered), "data/all_aspects.txt")
+    filtered = record_io.tapRecords("data/all_filtered2.txt", filter2.iterFilter(aspects))
+    annotations_out.write_tsv(filtered, "data/all_annotations_out.tsv")
+
+    elapsed = time.time() - start_time
+    print(f"Streaming pipeline completed in {elapsed:.2f} seconds at {time.strftime('%Y-%m-%d %H:%M:%S')}")
+    http_cache.printStats()
     input("\nPlease perform annotations now and save the output. Exit or press Enter to continue...\n")
 
 
@@ -63,12 +141,23 @@ def run_post_annotations():
 
 def main():
 
+    parser = argparse.ArgumentParser(description="Run the data pipeline")
+    parser.add_argument("--stream", action="store_true", help="run the initial steps in-process as a stream")
+    parser.add_argument("--taps", action="store_true", help="in streaming mode, also write the intermediate files")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--api-links", action="store_true", help="get the links from the API instead of the page HTML")
+    source.add_argument("--dumps", metavar="DIR", help="get the pages and links from the nlwiki dumps in DIR instead of the API")
+    args = parser.parse_args()
+
     print(f"Experiment Runner initiated at {time.strftime('%Y-%m-%d %H:%M:%S')}")
     first_choice = input("Run only post-annotation scripts? (y/N): ").strip().lower()
     if first_choice == 'y':
         run_post_annotations()
+    elif args.stream:
+        run_streaming(args.taps, args.api_links, args.dumps)
+        run_post_annotations()
     else:
-        run_initial()
+        run_initial(args.api_links, args.dumps)
         run_post_annotations()
 
 if __name__ == "__main__":
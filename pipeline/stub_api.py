@@ -0,0 +1,137 @@
+#!/usr/bin/python3
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qsl
+
+
+IGNORED_PARAMS = ("maxlag",)
+
+
+def fixtureKey(params):
+    """
+    Build the lookup key of a request from its query parameters.
+
+    Args:
+        params (dict): Query parameters of the request.
+
+    Returns:
+        str: Canonical JSON string of the parameters, without volatile ones like maxlag.
+    """
+    params = {k: str(v) for k, v in params.items() if k not in IGNORED_PARAMS}
+    return json.dumps(params, sort_keys=True)
+
+
+def loadFixtures(file):
+    """
+    Load canned API responses from a JSON file.
+
+    Args:
+        file (str): Path to a JSON list of {"params": {...}, "response": {...}} entries.
+
+    Returns:
+        dict: Mapping of request key to canned response.
+    """
+    with open(file, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    return {fixtureKey(entry["params"]): entry["response"] for entry in entries}
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    Local HTTP server that replays canned MediaWiki API responses.
+
+    The first 'fail_first' requests are answered with HTTP 429 and the next
+    'maxlag_first' with a maxlag error, both with a Retry-After header, so that
+    rate limiting and retries can be exercised. 'delay' adds latency to every
+    response.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, fixtures, delay=0.0, fail_first=0, maxlag_first=0, retry_after=1):
+        super().__init__(address, StubHandler)
+        self.fixtures = fixtures
+        self.delay = delay
+        self.fail_first = fail_first
+        self.maxlag_first = maxlag_first
+        self.retry_after = retry_after
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def nextRequest(self):
+        with self.lock:
+            self.requests += 1
+            return self.requests
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        number = server.nextRequest()
+        time.sleep(server.delay)
+        if number <= server.fail_first:
+            self.reply(429, {"error": {"code": "ratelimited"}}, retry_after=True)
+            return
+        if number <= server.fail_first + server.maxlag_first:
+            self.reply(200, {"error": {"code": "maxlag", "info": "Waiting for a database server"}}, retry_after=True)
+            return
+        params = dict(parse_qsl(urlparse(self.path).query))
+        response = server.fixtures.get(fixtureKey(params))
+        if response is None:
+            self.reply(404, {"error": {"code": "nofixture", "info": fixtureKey(params)}})
+        else:
+            self.reply(200, response)
+
+    def reply(self, status, body, retry_after=False):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        if retry_after:
+            self.send_header("Retry-After", str(self.server.retry_after))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def startServer(fixtures, port=0, **kwargs):
+    """
+    Start a stub server in a background thread.
+
+    Args:
+        fixtures (dict): Mapping of request key to canned response (see loadFixtures).
+        port (int): Port to listen on, 0 for any free port.
+        **kwargs: Fault injection options passed to StubServer.
+
+    Returns:
+        StubServer: The running server; its API endpoint is http://127.0.0.1:<port>/w/api.php.
+    """
+    server = StubServer(("127.0.0.1", port), fixtures, **kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Replay canned MediaWiki API responses")
+    parser.add_argument("fixtures", help="JSON file with canned responses")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--delay", type=float, default=0.0)
+    parser.add_argument("--fail-first", type=int, default=0)
+    parser.add_argument("--maxlag-first", type=int, default=0)
+    args = parser.parse_args()
+
+    server = StubServer(("127.0.0.1", args.port), loadFixtures(args.fixtures), args.delay, args.fail_first, args.maxlag_first)
+    print(f"Serving {len(server.fixtures)} fixtures at http://127.0.0.1:{args.port}/w/api.php")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+#!/usr/bin/python3
+
+import argparse
+import bz2
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+from dump_ingest import parallelMap
+
+
+INDEX_FILE = "data/wikidata_nl.sqlite"
+
+# bytes of the decompressed dump per task of a worker process
+BLOCK_SIZE = 8 * 1024 ** 2
+
+
+def openDump(file):
+    """
+    Open a Wikidata JSON dump for reading bytes, decompressing .gz and .bz2 files.
+
+    Args:
+        file (str): Path to the dump, e.g. latest-all.json.gz.
+
+    Returns:
+        A binary file object over the decompressed dump.
+    """
+    if file.endswith(".gz"):
+        return gzip.open(file, "rb")
+    if file.endswith(".bz2"):
+        return bz2.open(file, "rb")
+    return open(file, "rb")
+
+
+def iterBlocks(f, block_size=BLOCK_SIZE):
+    """
+    Read a dump in blocks of whole lines.
+
+    Args:
+        f: Binary file object over the decompressed dump.
+        block_size (int): Approximate number of bytes per block.
+
+    Yields:
+        bytes: A block ending with a newline (or at the end of the dump).
+    """
+    rest = b""
+    while True:
+        data = f.read(block_size)
+        if not data:
+            break
+        data = rest + data
+        end = data.rfind(b"\n") + 1
+        rest = data[end:]
+        if end:
+            yield data[:end]
+    if rest:
+        yield rest
+
+
+def extractEntities(block):
+    """
+    Project the entities of a block of the dump onto their nlwiki title and Dutch description.
+
+    The dump has one entity per line. Lines without an nlwiki sitelink, by far
+    most of them, are skipped without being decoded.
+
+    Args:
+        block (bytes): Whole lines of the dump.
+
+    Returns:
+        list[tuple]: (title, item ID, description or None) per entity with an nlwiki article.
+    """
+    entities = []
+    for line in block.split(b"\n"):
+        if b'"nlwiki"' not in line:
+            continue
+        line = line.strip().rstrip(b",")
+        if not line.startswith(b"{"):
+            continue
+        entity = json.loads(line)
+        sitelink = entity.get("sitelinks", {}).get("nlwiki")
+        if sitelink is None:
+            continue
+        description = entity.get("descriptions", {}).get("nl")
+        entities.append((sitelink["title"], entity["id"], description["value"] if description else None))
+    return entities
+
+
+class DescriptionIndex:
+    """
+    On-disk SQLite index of nlwiki titles, their Wikidata items and Dutch descriptions.
+
+    Built once from a Wikidata JSON dump with build, after which getDescription
+    and getBatchDescriptions of get_aspects are answered without any request.
+    A build can be interrupted and resumed: every block of the dump is
+    committed together with the position in the dump after it.
+    """
+
+    def __init__(self, file=INDEX_FILE):
+        self.file = file
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(file, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS items (title TEXT PRIMARY KEY, id TEXT, description TEXT)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS items_id ON items (id)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.db.commit()
+
+    def meta(self, key, default=None):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def complete(self):
+        """Return whether a build has run to the end of its dump."""
+        return self.meta("complete") == "1"
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+    def build(self, dump, workers=1, rebuild=False, block_size=BLOCK_SIZE):
+        """
+        Build the index from a Wikidata JSON dump, resuming an interrupted build of the same dump.
+
+        The decompressed dump is read in blocks of whole lines, which are
+        decoded and projected in a process pool. A compressed dump cannot
+        seek, so resuming a .gz or .bz2 dump decompresses (without decoding)
+        everything before the position it stopped at; an uncompressed dump
+        resumes at once.
+
+        Args:
+            dump (str): Path to the dump (latest-all.json.gz, .bz2 or uncompressed).
+            workers (int): Number of worker processes.
+            rebuild (bool): Start over even if the index holds (part of) a build.
+            block_size (int): Approximate number of bytes per task.
+        """
+        stat = os.stat(dump)
+        source = json.dumps([os.path.basename(dump), stat.st_size, stat.st_mtime_ns])
+        offset = int(self.meta("offset", 0))
+        if rebuild or self.meta("source") != source:
+            if self.meta("source") is not None and not rebuild:
+                raise ValueError(f"{self.file} was built from another dump, use rebuild to start over")
+            self.db.execute("DELETE FROM items")
+            self.db.execute("DELETE FROM meta")
+            self.db.execute("INSERT INTO meta VALUES ('source', ?)", (source,))
+            self.db.commit()
+            offset = 0
+        elif self.complete():
+            return
+
+        start = time.monotonic()
+        items = len(self)
+        with openDump(dump) as f:
+            if offset:
+                print(f"Resuming at byte {offset} of the decompressed dump")
+                f.seek(offset)
+            blocks = iterBlocks(f, block_size)
+            sizes = []
+
+            def sized():
+                for block in blocks:
+                    sizes.append(len(block))
+                    yield block
+
+            for entities in parallelMap(extractEntities, sized(), workers):
+                offset += sizes.pop(0)
+                items += len(entities)
+                with self.lock:
+                    self.db.executemany("INSERT OR REPLACE INTO items VALUES (?, ?, ?)", entities)
+                    self.db.execute("INSERT OR REPLACE INTO meta VALUES ('offset', ?)", (str(offset),))
+                    self.db.commit()
+                elapsed = time.monotonic() - start
+                print(f"{offset / 1024 ** 3:.1f} GiB read, {items} items ({elapsed:.0f}s)", end="\r")
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES ('complete', '1')")
+        self.db.commit()
+        print()
+
+    def lookup(self, title):
+        """
+        Look up the Wikidata item and Dutch description of an nlwiki article.
+
+        Args:
+            title (str): Title of the article.
+
+        Returns:
+            tuple: (item ID, description or None), or None if the title has no item.
+        """
+        with self.lock:
+            return self.db.execute("SELECT id, description FROM items WHERE title = ?", (title,)).fetchone()
+
+    def description(self, title):
+        """
+        Get the Dutch description of an nlwiki article like get_aspects.getDescription.
+
+        Args:
+            title (str): Title of the article.
+
+        Returns:
+            str: The description, or 'No description' if the article or its description is missing.
+        """
+        row = self.lookup(title)
+        if row is None or row[1] is None:
+            return "No description"
+        return row[1]
+
+    def descriptions(self, ids):
+        """
+        Get the Dutch descriptions of Wikidata items like get_aspects.getBatchDescriptions.
+
+        Args:
+            ids (list[str]): Wikidata item IDs.
+
+        Returns:
+            dict: Mapping of item ID to its Dutch description. Items without one are left out.
+        """
+        found = {}
+        with self.lock:
+            # stay below SQLite's limit on the number of query parameters
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                query = f"SELECT id, description FROM items WHERE id IN ({','.join('?' * len(batch))})"
+                for id, description in self.db.execute(query, batch):
+                    if description is not None:
+                        found[id] = description
+        return found
+
+
+_index = None
+_checked = False
+_lock = threading.Lock()
+
+
+def getIndex():
+    """
+    Return the process-wide description index, if one has been built.
+
+    The index location is read from the WIKIDATA_INDEX environment variable
+    and defaults to data/wikidata_nl.sqlite. An index whose build has not
+    finished is not used, and is only checked once per process.
+
+    Returns:
+        DescriptionIndex: The shared index, or None.
+    """
+    global _index, _checked
+    with _lock:
+        if not _checked:
+            _checked = True
+            file = os.getenv("WIKIDATA_INDEX", INDEX_FILE)
+            if not os.path.exists(file):
+                return None
+            index = DescriptionIndex(file)
+            if not index.complete():
+                print(f"Wikidata index {file} is not complete, using the API")
+                index.close()
+                return None
+            _index = index
+        return _index
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Build or query the index of Dutch Wikidata descriptions")
+    parser.add_argument("--index", default=os.getenv("WIKIDATA_INDEX", INDEX_FILE), help="path of the SQLite index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="build the index from a Wikidata JSON dump (resumes an interrupted build)")
+    build.add_argument("dump", help="e.g. dumps/latest-all.json.gz")
+    build.add_argument("--workers", type=int, default=os.cpu_count())
+    build.add_argument("--rebuild", action="store_true", help="start over")
+    lookup = subparsers.add_parser("lookup", help="print the item and description of article titles")
+    lookup.add_argument("titles", nargs="+")
+    args = parser.parse_args()
+
+    index = DescriptionIndex(args.index)
+    if args.command == "build":
+        index.build(args.dump, args.workers, args.rebuild)
+        print(f"{len(index)} nlwiki articles in {args.index}")
+    else:
+        for title in args.titles:
+            print(f"{title}: {index.lookup(title)}")
+
+if __name__ == "__main__":
+    main()